@@ -2,28 +2,390 @@ __author__ = 'Viktor Kerkez <alefnula@gmail.com>'
 __date__ = '20 October 2010'
 __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 
-import boto3
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import tracing
 
 
-def client(service, config):
+# Process wide registry of sessions, clients and resources. Building a client
+# loads the botocore service model and creates a new connection pool, so we
+# build each one only once per (service, credentials, region, profile,
+# endpoint).
+# boto3 itself is imported only when the first session is built, so commands
+# that don't talk to AWS don't pay for it.
+_lock = threading.RLock()
+_sessions = {}
+_clients = {}
+_resources = {}
+
+# Operations that are not in the family given by their name prefix. EC2
+# throttles API calls per family, with separate token buckets for reads,
+# writes and resource intensive calls.
+FAMILIES = {
+    'RunInstances': 'run',
+    'StartInstances': 'run',
+    'RequestSpotInstances': 'run',
+    'RequestSpotFleet': 'run',
+    'CreateFleet': 'run',
+    'CreateTags': 'tags',
+    'DeleteTags': 'tags',
+}
+# Token buckets shared by all clients, per (service, region, family)
+_buckets = {}
+
+
+class TokenBucket(object):
+    """Thread safe token bucket rate limiter.
+
+    The bucket holds up to `burst` tokens and is refilled with `rate` tokens
+    per second. Every call takes one token. Calls that find the bucket empty
+    reserve a future token and wait for it, so waiting callers are served in
+    order at exactly the refill rate.
+    """
+
+    def __init__(self, rate, burst):
+        """
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Bucket size
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token and return the seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._time) * self.rate
+            )
+            self._time = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def family(operation):
+    """Returns the throttling family of an operation.
+
+    Args:
+        operation (str): Operation name, for example `DescribeInstances`
+    """
+    if operation in FAMILIES:
+        return FAMILIES[operation]
+    if operation.startswith(('Describe', 'Get', 'List')):
+        return 'describe'
+    return 'mutate'
+
+
+def rate_limits(config):
+    """Parse the `rate_limits` configuration value.
+
+    The value is a comma separated list of `family=rate/burst` entries, for
+    example `describe=10/50,mutate=5/50`. Families that are not listed are
+    not limited.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+
+    Returns:
+        dict: Family to `(rate, burst)`
+    """
+    limits = {}
+    for entry in (config.rate_limits or '').split(','):
+        if entry.strip():
+            name, _, value = entry.partition('=')
+            rate, _, burst = value.partition('/')
+            limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+def _bucket(service, region, name, limit):
+    """Returns the shared bucket of an operation family.
+
+    Args:
+        service (str): Service name
+        region (str): Region
+        name (str): Family name
+        limit (tuple): `(rate, burst)` of the family
+    """
+    key = (service, region, name)
+    with _lock:
+        bucket = _buckets.get(key)
+        if bucket is None or (bucket.rate, bucket.burst) != limit:
+            bucket = _buckets[key] = TokenBucket(*limit)
+        return bucket
+
+
+def client_config(config, async_client=False):
+    """Returns the botocore client configuration.
+
+    Retries use the configured retry mode, by default `adaptive`, which also
+    slows down the client when it's throttled.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        async_client (bool): Build an aiobotocore configuration
+    """
+    if async_client:
+        from aiobotocore.config import AioConfig as Config
+    else:
+        from botocore.config import Config
+    return Config(retries={
+        'mode': config.retry_mode or 'adaptive',
+        'max_attempts': int(config.max_attempts or 10)
+    })
+
+
+def _limit(service, c, config, region=None, async_client=False):
+    """Rate limit every request attempt of a client.
+
+    Every attempt, including retries, takes a token from the bucket of its
+    operation family before it's sent.
+
+    Args:
+        service (str): Service name
+        c: Client
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
+        async_client (bool): The client is an aiobotocore client
+    """
+    limits = rate_limits(config)
+    if not limits:
+        return
+    region = region or config.region
+    # Look the shared buckets up once, so requests don't take the registry
+    # lock
+    buckets = {name: _bucket(service, region, name, limit)
+               for name, limit in limits.items()}
+
+    def delay(event_name):
+        bucket = buckets.get(family(event_name.rsplit('.', 1)[-1]))
+        return 0.0 if bucket is None else bucket.reserve()
+
+    def before_send(event_name, **kwargs):
+        wait = delay(event_name)
+        if wait > 0:
+            tracing.sleep(wait, 'throttle')
+
+    async def async_before_send(event_name, **kwargs):
+        wait = delay(event_name)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            tracing.span('throttle', wait)
+
+    c.meta.events.register(
+        f'before-send.{c.meta.service_model.service_id.hyphenize()}',
+        async_before_send if async_client else before_send
+    )
+
+
+def _key(config, region=None):
+    """Returns the registry key for a configuration.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
+    """
+    return (config.aws_access_key_id, config.aws_secret_access_key,
+            region or config.region, config.profile, config.endpoint_url)
+
+
+def session(config, region=None):
+    """Returns a boto3 session for the configuration credentials and region.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
+    """
+    key = _key(config, region)
+    with _lock:
+        s = _sessions.get(key)
+        if s is None:
+            import boto3.session
+            s = boto3.session.Session(
+                aws_access_key_id=config.aws_access_key_id,
+                aws_secret_access_key=config.aws_secret_access_key,
+                region_name=region or config.region
+            )
+            _sessions[key] = s
+        return s
+
+
+def _hooks(service, c, config, region=None):
+    """Hook a newly built client into the rate limiter, the tracer and the
+    local inventory.
+
+    Args:
+        service (str): Service name
+        c: Client
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
+    """
+    _limit(service, c, config, region)
+    tracing.watch(service, c)
+    if service == 'ec2':
+        from aws_ml_helper import inventory
+        inventory.watch(c, config, region)
+
+
+def client(service, config, region=None):
     """Returns a client for a specific service.
 
+    If the service also has a resource interface, the client of that resource
+    is returned, so only one client is ever built per service.
+
     Args:
         service (str): Service name
         config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
     """
-    return boto3.client(service, aws_access_key_id=config.aws_access_key_id,
-                        aws_secret_access_key=config.aws_secret_access_key,
-                        region_name=config.region)
+    key = (service,) + _key(config, region)
+    with _lock:
+        c = _clients.get(key)
+        if c is None:
+            s = session(config, region)
+            if service in s.get_available_resources():
+                c = resource(service, config, region).meta.client
+            else:
+                c = s.client(service,
+                             endpoint_url=config.endpoint_url or None,
+                             config=client_config(config))
+                _hooks(service, c, config, region)
+            _clients[key] = c
+        return c
 
 
-def resource(service, config):
+def resource(service, config, region=None):
     """Returns a resource for a specific service.
 
-        Args:
-            service (str): Service name
-            config (aws_ml_helper.config.Config): Configuration
-        """
-    return boto3.resource(service, aws_access_key_id=config.aws_access_key_id,
-                          aws_secret_access_key=config.aws_secret_access_key,
-                          region_name=config.region)
+    Args:
+        service (str): Service name
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Region. Default: from configuration
+    """
+    key = (service,) + _key(config, region)
+    with _lock:
+        r = _resources.get(key)
+        if r is None:
+            r = session(config, region).resource(
+                service, endpoint_url=config.endpoint_url or None,
+                config=client_config(config)
+            )
+            _hooks(service, r.meta.client, config, region)
+            _resources[key] = r
+        return r
+
+
+def invalidate(config=None):
+    """Drop cached sessions, clients and resources.
+
+    Args:
+        config (aws_ml_helper.config.Config): If provided, drop only the
+            objects built for this configuration (in any region), otherwise
+            drop everything.
+    """
+    def matches(key):
+        return key[:2] == _key(config)[:2] and key[3] == config.profile
+
+    with _lock:
+        if config is None:
+            _sessions.clear()
+            _clients.clear()
+            _resources.clear()
+            return
+        for k in [k for k in _sessions if matches(k)]:
+            del _sessions[k]
+        for registry in (_clients, _resources):
+            for k in [k for k in registry if matches(k[1:])]:
+                del registry[k]
+
+
+def regions(config):
+    """Returns the names of the regions enabled for the account.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+    """
+    response = client('ec2', config).describe_regions()
+    return sorted(r['RegionName'] for r in response['Regions'])
+
+
+def _pages(c, operation, kwargs):
+    """Returns all response pages of an operation with a blocking client."""
+    if c.can_paginate(operation):
+        return list(c.get_paginator(operation).paginate(**kwargs))
+    return [getattr(c, operation)(**kwargs)]
+
+
+async def _async_pages(session, service, config, region, operation, kwargs):
+    """Returns all response pages of an operation with an async client."""
+    async with session.create_client(
+        service, region_name=region,
+        aws_access_key_id=config.aws_access_key_id or None,
+        aws_secret_access_key=config.aws_secret_access_key or None,
+        endpoint_url=config.endpoint_url or None,
+        config=client_config(config, async_client=True)
+    ) as c:
+        _limit(service, c, config, region, async_client=True)
+        tracing.watch(service, c)
+        if c.can_paginate(operation):
+            return [page async for page in
+                    c.get_paginator(operation).paginate(**kwargs)]
+        return [await getattr(c, operation)(**kwargs)]
+
+
+async def _async_regions(service, config, regions, operation, kwargs):
+    from aiobotocore.session import get_session
+    session = get_session()
+    results = await asyncio.gather(*[
+        _async_pages(session, service, config, region, operation, kwargs)
+        for region in regions
+    ])
+    return dict(zip(regions, results))
+
+
+def paginate_regions(service, config, regions, operation, backend=None,
+                     **kwargs):
+    """Call an operation in several regions concurrently.
+
+    With the `async` backend all regions are fetched on one asyncio event
+    loop with aiobotocore clients. With the `threads` backend every region
+    is fetched in its own thread with the registry clients. Either way the
+    wall time is close to that of the slowest region.
+
+    Args:
+        service (str): Service name
+        config (aws_ml_helper.config.Config): Configuration
+        regions (list of str): Region names
+        operation (str): Client method name, for example `describe_volumes`
+        backend (str): `async` or `threads`. Default: `async` if aiobotocore
+            is installed, otherwise `threads`.
+        kwargs: Operation arguments
+
+    Returns:
+        dict: Region to the list of all response pages
+    """
+    if backend is None:
+        try:
+            import aiobotocore  # noqa: F401
+            backend = 'async'
+        except ImportError:
+            backend = 'threads'
+    if backend == 'async':
+        return asyncio.run(
+            _async_regions(service, config, regions, operation, kwargs)
+        )
+    with ThreadPoolExecutor(max_workers=max(len(regions), 1)) as executor:
+        results = executor.map(
+            lambda region: _pages(client(service, config, region), operation,
+                                  kwargs),
+            regions
+        )
+        return dict(zip(regions, results))
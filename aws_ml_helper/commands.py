@@ -4,7 +4,6 @@ __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 
 import os
 import click
-import webbrowser
 from aws_ml_helper.config import Config, ConfigError, DEFAULT_CONFIG_PATH
 
 
@@ -13,8 +12,23 @@ from aws_ml_helper.config import Config, ConfigError, DEFAULT_CONFIG_PATH
               help='Path to the alternative configuration file.')
 @click.option('--profile', default='default', envvar='AML_PROFILE',
               help='Configuration file profile.')
+@click.option('--cached', is_flag=True, default=False,
+              help='Answer listings and name lookups from the local '
+                   'inventory, whatever its age.')
+@click.option('--max-age', type=float,
+              help='Answer listings and name lookups from the local '
+                   'inventory if it is at most this many seconds old.')
+@click.option('--trace', is_flag=True, default=False,
+              help='Print API calls, latencies, transfers and waits of the '
+                   'command when it finishes.')
+@click.option('--trace-json', type=click.Path(dir_okay=False),
+              help='Also save the trace summary as JSON. Implies --trace.')
 @click.pass_context
-def cli(ctx, config, profile):
+def cli(ctx, config, profile, cached, max_age, trace, trace_json):
+    if trace or trace_json:
+        from aws_ml_helper import tracing
+        tracer = tracing.enable()
+        ctx.call_on_close(lambda: tracer.report(trace_json))
     if config is None:
         config = os.path.expanduser(DEFAULT_CONFIG_PATH)
         if not os.path.isfile(config) and ctx.invoked_subcommand != 'config':
@@ -24,6 +38,38 @@ def cli(ctx, config, profile):
     ctx.obj = {
         'config': Config(config, profile)
     }
+    _max_age(ctx, cached, max_age)
+
+
+def _max_age(ctx, cached, max_age):
+    """Set the inventory max age of this run from --cached or --max-age."""
+    if cached:
+        ctx.obj['config'].max_age = float('inf')
+    elif max_age is not None:
+        ctx.obj['config'].max_age = max_age
+
+
+def listing_options(f):
+    """Common options of the listing commands."""
+    f = click.option(
+        '--max-age', type=float, expose_value=False,
+        callback=lambda ctx, param, value: _max_age(ctx, False, value),
+        help='Use the local inventory if it is at most this many seconds '
+             'old. Otherwise fetch and store it.'
+    )(f)
+    f = click.option(
+        '--cached', is_flag=True, default=False, expose_value=False,
+        callback=lambda ctx, param, value: _max_age(ctx, value, None),
+        help='Use the local inventory, whatever its age.'
+    )(f)
+    f = click.option('--page-size', type=int, default=100,
+                     help='Number of items requested per call. '
+                          'Default: 100')(f)
+    f = click.option('--output', default='table',
+                     type=click.Choice(['table', 'stream', 'jsonl']),
+                     help='Output format. `stream` and `jsonl` print rows '
+                          'as they arrive. Default: table')(f)
+    return f
 
 
 # VPC Commands
@@ -42,22 +88,38 @@ def cli(ctx, config, profile):
     '--key-dir', type=click.Path(resolve_path=True),
     help='Path to the directory where the access key should be saved'
 )
+@click.option('--workers', type=int, default=8,
+              help='Maximal number of parallel setup steps. Default: 8')
 @click.pass_context
-def setup_vpc(ctx, name, network_range, allowed_ip, key_dir):
+def setup_vpc(ctx, name, network_range, allowed_ip, key_dir, workers):
     """Setup VPC on Amazon AWS."""
-    from aws_ml_helper.vpc import create_vpc, create_efs, generate_key_pair
+    from aws_ml_helper.vpc import setup_vpc
     config = ctx.obj['config']
-    create_vpc(config, name, network_range, allowed_ip,
-               config.availability_zone)
-    generate_key_pair(config, key_dir)
-    create_efs(config)
+    setup_vpc(config, name, network_range, allowed_ip,
+              config.availability_zone, key_dir, workers)
+
+
+@cli.command('teardown-vpc')
+@click.option('--name', help='VPC name. Default: from configuration')
+@click.option('--yes', is_flag=True, default=False,
+              help='Don\'t ask for confirmation')
+@click.pass_context
+def teardown_vpc(ctx, name, yes):
+    """Delete everything created by setup-vpc."""
+    from aws_ml_helper.vpc import teardown_vpc
+    config = ctx.obj['config']
+    name = name or config.vpc_name
+    if not yes:
+        click.confirm(f'Delete VPC "{name}" and all its resources?',
+                      abort=True)
+    teardown_vpc(config, name)
 
 
 # Spot instance
 
 @cli.command('spot-start')
 @click.argument('name', required=True)
-@click.option('--price', type=float, required=True,
+@click.option('--price', type=float,
               help='Bidding price for the instance')
 @click.option('--ami',
               help='AMI id. If not provided use from configuration')
@@ -67,37 +129,134 @@ def setup_vpc(ctx, name, network_range, allowed_ip, key_dir):
               help='Name of the snapshot from which the attached volume will '
                    'be created')
 @click.option('--mount-point', help='Where the volume should be mounted')
+@click.option('--auto-bid', is_flag=True, default=False,
+              help='Calculate the bid from the spot price history')
+@click.option('--auto-az', is_flag=True, default=False,
+              help='Pick the availability zone from the spot price history')
+@click.option('--percentile', type=float,
+              help='Price history percentile used as the bid. '
+                   'Default: from configuration')
+@click.option('--headroom', type=float,
+              help='Relative headroom over the percentile price, e.g. 0.1. '
+                   'Default: from configuration')
+@click.option('--days', type=int, default=30,
+              help='Price history period for --auto-bid and --auto-az. '
+                   'Default: 30')
+@click.option('--count', type=int, default=1,
+              help='Number of instances. Use a name pattern like '
+                   'worker-{i} to name them. Default: 1')
+@click.option('--volume', 'volumes', multiple=True,
+              help='Volume to mount on every instance as '
+                   'NAME:MOUNT_POINT[:SNAPSHOT]. Can be repeated. The name '
+                   'can be a pattern like data-{i}. Default: a volume named '
+                   'after the instance on --mount-point')
 @click.pass_context
-def spot_start(ctx, name, price, ami, instance_type, snapshot, mount_point):
-    """Starts a spot instance."""
-    from aws_ml_helper.spot import start_spot_instance
+def spot_start(ctx, name, price, ami, instance_type, snapshot, mount_point,
+               auto_bid, auto_az, percentile, headroom, days, count,
+               volumes):
+    """Starts spot instances."""
+    from aws_ml_helper.spot import start_spot_instance, Volume
+    if price is None and not auto_bid:
+        raise click.UsageError('Either --price or --auto-bid is required')
+    parsed = []
+    for volume in volumes:
+        parts = volume.split(':')
+        if len(parts) not in (2, 3) or not all(parts[:2]):
+            raise click.UsageError(
+                f'Invalid volume "{volume}", expected '
+                f'NAME:MOUNT_POINT[:SNAPSHOT]'
+            )
+        parsed.append(Volume(parts[0], parts[1],
+                             parts[2] if len(parts) == 3 else None))
     start_spot_instance(ctx.obj['config'], name, price, ami, instance_type,
-                        snapshot, mount_point)
+                        snapshot, mount_point, auto_bid, auto_az, percentile,
+                        headroom, days, count, parsed)
 
 
 @cli.command('spot-price')
 @click.option('--days', type=int, default=7,
               help='Show information for the last n days. Default: 7')
-@click.option('--instance-type',
-              help='Choose instance type. Default: from configuration')
+@click.option('--instance-type', multiple=True,
+              help='Choose instance type. Can be repeated to compare '
+                   'instance types. Default: from configuration')
+@click.option('--region', 'regions', multiple=True,
+              help='Region. Can be repeated to compare regions. '
+                   'Default: from configuration')
+@click.option('--rank-by', default='mean',
+              type=click.Choice(['mean', 'gpu', 'vcpu']),
+              help='Rank a comparison by mean price, price per GPU or price '
+                   'per vCPU. Default: mean')
+@click.option('--workers', type=int, default=8,
+              help='Number of concurrent fetches. Default: 8')
 @click.option('--value', default='all',
-              type=click.Choice(['all', 'min', 'max', 'mean', 'median']),
+              type=click.Choice(['all', 'min', 'max', 'mean', 'median',
+                                 'volatility']),
               help='Pick the value you want to see. Default: all')
+@click.option('--availability-zone',
+              help='Show only this availability zone. Default: all')
+@click.option('--product',
+              help='Show only this product, e.g. Linux/UNIX. Default: all')
+@click.option('--bid', type=float,
+              help='Show the share of time the price was under the bid')
+@click.option('--percentile', type=float, default=90,
+              help='Additional percentile to show. Default: 90')
+@click.option('--offline', is_flag=True, default=False,
+              help='Use only the locally stored price history')
 @click.pass_context
-def spot_price(ctx, days=7, instance_type=None, value='all'):
-    """Show information about spot instance prices."""
+def spot_price(ctx, days=7, instance_type=(), regions=(), rank_by='mean',
+               workers=8, value='all', availability_zone=None, product=None,
+               bid=None, percentile=90, offline=False):
+    """Show information about spot instance prices.
+
+    With several instance types or regions the prices are compared in one
+    table. --bid adds the share of time under the bid to it.
+    """
     from aws_ml_helper.spot import spot_price
-    spot_price(ctx.obj['config'], days, instance_type, value)
+    if value != 'all' and (len(instance_type) > 1 or len(regions) > 1):
+        raise click.UsageError('--value can only be used with a single '
+                               'instance type and region')
+    if availability_zone and len(regions) > 1:
+        raise click.UsageError('--availability-zone can only be used with a '
+                               'single region')
+    spot_price(ctx.obj['config'], days, instance_type, value,
+               availability_zone, product, bid, percentile, offline,
+               regions, rank_by, workers)
+
+
+# Inventory
+
+@cli.command()
+@click.option('--kind', 'kinds', multiple=True,
+              type=click.Choice(['instance', 'volume', 'snapshot', 'image']),
+              help='Refresh only this kind. Can be repeated. Default: all')
+@click.option('--workers', type=int, default=4,
+              help='Number of concurrent fetches. Default: 4')
+@click.option('--background', is_flag=True, default=False,
+              help='Refresh in a detached process and return immediately')
+@click.pass_context
+def refresh(ctx, kinds, workers, background):
+    """Refresh the local resource inventory."""
+    from aws_ml_helper.inventory import refresh, refresh_in_background
+    config = ctx.obj['config']
+    if background:
+        refresh_in_background(config, kinds)
+        click.echo('Inventory refresh started.')
+        return
+    for kind, count in refresh(config, kinds, workers).items():
+        click.echo(f'{kind}: {count}')
 
 
 # Instance commands
 
 @cli.command()
+@listing_options
+@click.option('--all-regions', is_flag=True, default=False,
+              help='List instances in all enabled regions')
 @click.pass_context
-def instances(ctx):
+def instances(ctx, output, page_size, all_regions):
     """Lists instances."""
     from aws_ml_helper.instance import instances
-    instances(ctx.obj['config'])
+    instances(ctx.obj['config'], output, page_size, all_regions)
 
 
 @cli.command()
@@ -108,11 +267,14 @@ def instances(ctx):
               help='Instance type. If not provided use from configuration.')
 @click.option('--ebs-size', type=int, default=128,
               help='Size of the EBS Volume in GB')
+@click.option('--count', type=int, default=1,
+              help='Number of instances. Use a name pattern like '
+                   'worker-{i} to name them. Default: 1')
 @click.pass_context
-def start(ctx, name, ami, instance_type, ebs_size):
-    """Starts an instance."""
+def start(ctx, name, ami, instance_type, ebs_size, count):
+    """Starts instances."""
     from aws_ml_helper.instance import start
-    start(ctx.obj['config'], name, ami, instance_type, ebs_size)
+    start(ctx.obj['config'], name, ami, instance_type, ebs_size, count)
 
 
 @cli.command()
@@ -143,21 +305,57 @@ def login(ctx, name):
 
 
 @cli.command()
-@click.argument('name', required=True)
+@click.argument('names', nargs=-1)
 @click.argument('command', required=True)
+@click.option('--tag', 'tags', multiple=True,
+              help='Select instances by tag in KEY=VALUE format')
+@click.option('--workers', type=int, default=10,
+              help='Maximal number of concurrent SSH sessions. Default: 10')
+@click.option('--timeout', type=float,
+              help='Per instance timeout in seconds')
 @click.pass_context
-def run(ctx, name, command):
-    """Runs a command on a selected instance."""
-    from aws_ml_helper.instance import run
-    run(ctx.obj['config'], name, command)
+def run(ctx, names, command, tags, workers, timeout):
+    """Runs a command on selected instances.
+
+    Instances can be selected by name, glob pattern or tag::
+
+    \b
+        aml run worker-1 "nvidia-smi"
+        aml run worker-1 worker-2 "nvidia-smi"
+        aml run "worker-*" "nvidia-smi"
+        aml run --tag project=detector "nvidia-smi"
+    """
+    from aws_ml_helper.instance import run, run_many, select_instances
+    config = ctx.obj['config']
+    if len(names) == 1 and len(tags) == 0 and not any(
+            c in names[0] for c in '*?['):
+        result = run(config, names[0], command)
+        ctx.exit(1 if result is None else result.exit_status)
+    selected = select_instances(config, names, tags)
+    if len(selected) == 0:
+        click.secho('No running instances selected', fg='red')
+        ctx.exit(1)
+    results = run_many(config, selected, command, workers, timeout)
+    # Fail if the command failed or didn't run on any of the instances
+    ctx.exit(int(any(code != 0 for code in results.values())))
 
 
 @cli.command()
 @click.argument('source', required=True)
 @click.argument('destination', required=True)
+@click.option('--workers', type=int, default=4,
+              help='Number of files transferred in parallel. Default: 4')
+@click.option('--chunk-size', type=int, default=1024,
+              help='Size of the read blocks in KB. Default: 1024')
+@click.option('--no-resume', is_flag=True, default=False,
+              help='Do not resume partially transferred files')
+@click.option('--compare', default='mtime',
+              type=click.Choice(['size', 'mtime', 'hash']),
+              help='How to detect identical files that are skipped. '
+                   'Default: mtime')
 @click.pass_context
-def cp(ctx, source, destination):
-    """Copy file to instance or from instance.
+def cp(ctx, source, destination, workers, chunk_size, no_resume, compare):
+    """Copy file or directory to instance or from instance.
 
     To copy a file to instance use the following command::
 
@@ -167,7 +365,43 @@ def cp(ctx, source, destination):
         aml cp {instance_name}:/remote/path /local/path
     """
     from aws_ml_helper.instance import cp
-    cp(ctx.obj['config'], source, destination)
+    stats = cp(ctx.obj['config'], source, destination, workers,
+               chunk_size * 1024, not no_resume, compare)
+    if stats is None:
+        ctx.exit(1)
+
+
+@cli.command()
+@click.argument('source', required=True)
+@click.argument('destination', required=True)
+@click.option('--workers', type=int, default=4,
+              help='Number of parallel transfers. Default: 4')
+@click.option('--compress', is_flag=True, default=False,
+              help='Transfer files as compressed tar streams')
+@click.option('--full', is_flag=True, default=False,
+              help='Ignore the cached manifest and walk the destination. '
+                   'Use it when the destination was changed outside of '
+                   'aml sync.')
+@click.pass_context
+def sync(ctx, source, destination, workers, compress, full):
+    """Synchronize a directory to or from an instance.
+
+    Only new or changed files are transferred::
+
+    \b
+        aml sync /local/path {instance_name}:/remote/path
+        aml sync {instance_name}:/remote/path /local/path
+
+    The destination manifest of the last sync is reused for
+    `sync_cache_ttl` seconds (default: 3600), so files changed or deleted
+    on the destination in any other way are only noticed after that or with
+    --full.
+    """
+    from aws_ml_helper.sync import sync
+    stats = sync(ctx.obj['config'], source, destination, workers, compress,
+                 full)
+    if stats is None:
+        ctx.exit(1)
 
 
 @cli.command()
@@ -202,11 +436,12 @@ def umount(local, delete):
 # Image commands
 
 @cli.command()
+@listing_options
 @click.pass_context
-def images(ctx):
+def images(ctx, output, page_size):
     """List AMI images."""
     from aws_ml_helper.image import images
-    images(ctx.obj['config'])
+    images(ctx.obj['config'], output, page_size)
 
 
 @cli.command('image-create')
@@ -232,11 +467,14 @@ def image_delete(ctx, image_name):
 # Volume commands
 
 @cli.command()
+@listing_options
+@click.option('--all-regions', is_flag=True, default=False,
+              help='List volumes in all enabled regions')
 @click.pass_context
-def volumes(ctx):
+def volumes(ctx, output, page_size, all_regions):
     """List all volumes"""
     from aws_ml_helper.volume import volumes
-    volumes(ctx.obj['config'])
+    volumes(ctx.obj['config'], output, page_size, all_regions)
 
 
 @cli.command('volume-create')
@@ -288,11 +526,14 @@ def volume_delete(ctx, volume_name):
 # Snapshot commands
 
 @cli.command()
+@listing_options
+@click.option('--all-regions', is_flag=True, default=False,
+              help='List snapshots in all enabled regions')
 @click.pass_context
-def snapshots(ctx):
+def snapshots(ctx, output, page_size, all_regions):
     """List all snapshots"""
     from aws_ml_helper.snapshot import snapshots
-    snapshots(ctx.obj['config'])
+    snapshots(ctx.obj['config'], output, page_size, all_regions)
 
 
 @cli.command('snapshot-create')
@@ -405,5 +646,6 @@ def shell(ctx):
 @click.pass_context
 def console(ctx):
     """Open amazon web console."""
+    import webbrowser
     account = ctx.obj['config'].account
     webbrowser.open_new_tab(f'https://{account}.signin.aws.amazon.com/console')
@@ -5,10 +5,13 @@ __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 import io
 import os
 import click
+import threading
 from configparser import ConfigParser
 
 
 DEFAULT_CONFIG_PATH = '~/.aws-ml-helper/config.ini'
+# Serializes the first read of configuration files shared by threads
+_load_lock = threading.Lock()
 
 
 class ConfigError(Exception):
@@ -21,8 +24,15 @@ class Config(object):
         'region', 'availability_zone', 'vpc_name', 'vpc_id', 'subnet_id',
         'ec2_security_group_id', 'efs_security_group_id', 'access_key',
         'efs_id', 'ami_id', 'ami_username', 'instance_type', 'mount_point',
-        'snapshot_id', 'table_format'
+        'snapshot_id', 'table_format', 'name_cache_ttl',
+        'ssh_control_persist', 'spot_percentile', 'spot_headroom',
+        'inventory_max_age', 'endpoint_url', 'retry_mode', 'max_attempts',
+        'rate_limits', 'sync_cache_ttl'
     ]
+    # Keys that change the AWS session, cached clients depend on them
+    SESSION_KEYS = ['aws_access_key_id', 'aws_secret_access_key', 'region',
+                    'endpoint_url', 'retry_mode', 'max_attempts',
+                    'rate_limits']
 
     def __init__(self, config=None, profile='default'):
         """
@@ -32,13 +42,36 @@ class Config(object):
         """
         self.config = config or os.path.expanduser(DEFAULT_CONFIG_PATH)
         self.profile = profile
-
+        # The file is parsed on the first access to a key, so commands that
+        # fail early or only print help don't pay for it.
+        self._loaded = False
+        # Inventory max age for this run only, set by --cached and
+        # --max-age. It overrides inventory_max_age and is never saved.
+        self.max_age = None
+
+    def __getattr__(self, name):
+        # Called only for attributes that are not set yet
+        if name not in self.KEYS or self.__dict__.get('_loaded', True):
+            raise AttributeError(name)
+        with _load_lock:
+            if not self._loaded:
+                self._load()
+        return self.__dict__[name]
+
+    def _load(self):
+        """Read the profile keys from the configuration file.
+
+        Keys assigned before the file was read keep their values. The file is
+        marked as loaded only after all keys are set, so other threads wait
+        for the lock instead of seeing a half loaded configuration.
+        """
+        assigned = {k: v for k, v in self.__dict__.items() if k in self.KEYS}
         if not os.path.isfile(self.config):
             data = {}
         else:
             cp = ConfigParser()
             cp.read(self.config)
-            data = cp[profile]
+            data = cp[self.profile]
 
         self.account = data.get('account')
         self.aws_access_key_id = data.get('aws_access_key_id', '')
@@ -58,6 +91,20 @@ class Config(object):
         self.mount_point = data.get('mount_point', '')
         self.snapshot_id = data.get('snapshot_id', '')
         self.table_format = data.get('table_format', 'fancy_grid')
+        self.name_cache_ttl = data.get('name_cache_ttl', '3600')
+        self.ssh_control_persist = data.get('ssh_control_persist', '600')
+        self.spot_percentile = data.get('spot_percentile', '90')
+        self.spot_headroom = data.get('spot_headroom', '0.1')
+        self.inventory_max_age = data.get('inventory_max_age', '0')
+        self.endpoint_url = data.get('endpoint_url', '')
+        self.retry_mode = data.get('retry_mode', 'adaptive')
+        self.max_attempts = data.get('max_attempts', '10')
+        self.rate_limits = data.get(
+            'rate_limits', 'describe=10/50,mutate=5/50,run=2/20,tags=5/50'
+        )
+        self.sync_cache_ttl = data.get('sync_cache_ttl', '3600')
+        self.__dict__.update(assigned)
+        self._loaded = True
 
     def __str__(self):
         return f'Config({self.config}, {self.profile})'
@@ -65,6 +112,8 @@ class Config(object):
     __repr__ = __str__
 
     def configure(self):
+        from aws_ml_helper import boto
+        boto.invalidate(self)
         self.account = click.prompt('AWS Account ID')
         self.aws_access_key_id = click.prompt('AWS Access Key ID')
         self.aws_secret_access_key = click.prompt('AWS Secret Access Key')
@@ -82,6 +131,9 @@ class Config(object):
     def set(self, key, value):
         if key not in self.KEYS:
             raise ConfigError(f'Unknown key "{key}"')
+        if key in self.SESSION_KEYS and getattr(self, key) != value:
+            from aws_ml_helper import boto
+            boto.invalidate(self)
         setattr(self, key, value)
 
     def save(self):
@@ -108,6 +160,16 @@ class Config(object):
         cp[self.profile]['mount_point'] = self.mount_point
         cp[self.profile]['snapshot_id'] = self.snapshot_id
         cp[self.profile]['table_format'] = self.table_format
+        cp[self.profile]['name_cache_ttl'] = self.name_cache_ttl
+        cp[self.profile]['ssh_control_persist'] = self.ssh_control_persist
+        cp[self.profile]['spot_percentile'] = self.spot_percentile
+        cp[self.profile]['spot_headroom'] = self.spot_headroom
+        cp[self.profile]['inventory_max_age'] = self.inventory_max_age
+        cp[self.profile]['endpoint_url'] = self.endpoint_url
+        cp[self.profile]['retry_mode'] = self.retry_mode
+        cp[self.profile]['max_attempts'] = self.max_attempts
+        cp[self.profile]['rate_limits'] = self.rate_limits
+        cp[self.profile]['sync_cache_ttl'] = self.sync_cache_ttl
         if not os.path.isdir(os.path.dirname(self.config)):
             os.makedirs(os.path.dirname(self.config))
         with io.open(self.config, 'w') as f:
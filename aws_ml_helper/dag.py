@@ -0,0 +1,104 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import time
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+Step = collections.namedtuple('Step', ['func', 'requires'])
+
+
+def _required(steps, targets):
+    """Returns the names of the targets and all steps they depend on.
+
+    Args:
+        steps (dict): Step name to `Step`
+        targets (list of str): Target step names
+    """
+    needed = set()
+    stack = list(targets)
+    while stack:
+        name = stack.pop()
+        if name not in needed:
+            needed.add(name)
+            stack.extend(steps[name].requires)
+    return needed
+
+
+def run(steps, workers=8, targets=None, progress=None):
+    """Run steps as soon as the steps they require are done.
+
+    Every step function is called with the results of the steps it requires
+    as keyword arguments named after those steps. Independent steps run in
+    parallel.
+
+    Args:
+        steps (dict): Step name to `Step`
+        workers (int): Maximal number of steps running at the same time. With
+            one worker the steps run one by one in the calling thread, in
+            the same order every time.
+        targets (list of str): Run only these steps and the steps they
+            require. Default: all steps
+        progress (callable): Called with `(name, elapsed)` when a step is
+            done, where elapsed is the step duration in seconds.
+
+    Returns:
+        dict: Step name to step result
+
+    Raises:
+        ValueError: If the steps have cyclic or unknown requirements
+    """
+    remaining = _required(steps, targets or list(steps))
+    for name in remaining:
+        unknown = set(steps[name].requires) - set(steps)
+        if unknown:
+            raise ValueError(f'Step "{name}" requires unknown steps: '
+                             f'{", ".join(sorted(unknown))}')
+    results = {}
+    running = {}
+
+    def call(name):
+        start = time.monotonic()
+        step = steps[name]
+        result = step.func(**{r: results[r] for r in step.requires})
+        if progress is not None:
+            progress(name, time.monotonic() - start)
+        return result
+
+    def ready():
+        return sorted(name for name in remaining
+                      if all(r in results for r in steps[name].requires))
+
+    if workers <= 1:
+        # One step at a time in a fixed order, so runs are reproducible
+        while remaining:
+            names = ready()
+            if not names:
+                raise ValueError(f'Cyclic step requirements: '
+                                 f'{", ".join(sorted(remaining))}')
+            for name in names:
+                remaining.discard(name)
+                results[name] = call(name)
+        return results
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while remaining or running:
+            for name in ready():
+                remaining.discard(name)
+                running[executor.submit(call, name)] = name
+            if not running:
+                raise ValueError(f'Cyclic step requirements: '
+                                 f'{", ".join(sorted(remaining))}')
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                error = future.exception()
+                if error is not None:
+                    # Don't start anything new, let running steps finish
+                    remaining.clear()
+                    wait(running)
+                    raise error
+                results[name] = future.result()
+    return results
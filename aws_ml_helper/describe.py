@@ -0,0 +1,148 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+from aws_ml_helper import boto
+from aws_ml_helper.utils import name_from_tags
+
+
+# Kind: (operation, response key, id key, resource class)
+KINDS = {
+    'instance': ('describe_instances', 'Reservations', 'InstanceId',
+                 'Instance'),
+    'volume': ('describe_volumes', 'Volumes', 'VolumeId', 'Volume'),
+    'snapshot': ('describe_snapshots', 'Snapshots', 'SnapshotId', 'Snapshot'),
+    'image': ('describe_images', 'Images', 'ImageId', 'Image'),
+}
+
+
+def _page_items(kind, response):
+    """Returns the raw items of a Describe response page."""
+    key = KINDS[kind][1]
+    if kind == 'instance':
+        return [i for r in response[key] for i in r['Instances']]
+    return response[key]
+
+
+def pages(config, kind, page_size=None, **kwargs):
+    """Iterate over raw Describe response pages.
+
+    Exactly one request is made per page and no resource objects are built,
+    so reading attributes never triggers additional `load()` calls.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        page_size (int): Number of items requested per call. Must be `None`
+            when filtering by ids.
+        kwargs: Describe call arguments
+
+    Yields:
+        list of dict: Raw items of one page
+    """
+    operation = KINDS[kind][0]
+    ec2 = boto.client('ec2', config)
+    if ec2.can_paginate(operation):
+        pagination = {} if page_size is None else {'PageSize': page_size}
+        responses = ec2.get_paginator(operation).paginate(
+            PaginationConfig=pagination, **kwargs
+        )
+    else:
+        responses = [getattr(ec2, operation)(**kwargs)]
+    for response in responses:
+        yield _page_items(kind, response)
+
+
+def items(config, kind, page_size=None, **kwargs):
+    """Iterate over raw Describe items of all pages.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        page_size (int): Number of items requested per call
+        kwargs: Describe call arguments
+    """
+    for page in pages(config, kind, page_size, **kwargs):
+        yield from page
+
+
+def regional_items(config, kind, regions, page_size=None, backend=None,
+                   **kwargs):
+    """Returns raw Describe items of several regions fetched concurrently.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        regions (list of str): Region names
+        page_size (int): Number of items requested per call
+        backend (str): Backend passed to `aws_ml_helper.boto.paginate_regions`
+        kwargs: Describe call arguments
+
+    Returns:
+        dict: Region to the list of raw items
+    """
+    if page_size is not None:
+        kwargs['PaginationConfig'] = {'PageSize': page_size}
+    responses = boto.paginate_regions('ec2', config, regions, KINDS[kind][0],
+                                      backend, **kwargs)
+    return {
+        region: [item for page in region_pages
+                 for item in _page_items(kind, page)]
+        for region, region_pages in responses.items()
+    }
+
+
+def account_args(config, kind):
+    """Describe arguments that select only the resources of the account.
+
+    Without them snapshots and images describe all public resources too.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+    """
+    if kind == 'snapshot':
+        return {'OwnerIds': [config.account]}
+    if kind == 'image':
+        return {'Owners': [config.account]}
+    return {}
+
+
+def name_of(kind, item):
+    """Returns the name of a raw Describe item.
+
+    Args:
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        item (dict): Raw Describe item
+    """
+    if kind == 'image':
+        return item.get('Name', '')
+    return name_from_tags(item.get('Tags'))
+
+
+def state_of(kind, item):
+    """Returns the state of a raw Describe item.
+
+    Args:
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        item (dict): Raw Describe item
+    """
+    if kind == 'instance':
+        return item['State']['Name']
+    return item['State']
+
+
+def hydrate(config, kind, item):
+    """Build a boto3 resource object from a raw Describe item.
+
+    The resource is populated with the item data, so it is not loaded again.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        item (dict): Raw Describe item
+    """
+    _, _, id_key, cls = KINDS[kind]
+    resource = getattr(boto.resource('ec2', config), cls)(item[id_key])
+    resource.meta.data = item
+    return resource
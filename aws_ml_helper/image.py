@@ -2,54 +2,73 @@ __author__ = 'Viktor Kerkez <alefnula@gmail.com>'
 __date__ = '16 March 2018'
 __copyright__ = 'Copyright (c)  2018 Viktor Kerkez'
 
-import time
 import click
-from tabulate import tabulate
-from aws_ml_helper import boto
+from aws_ml_helper import describe, inventory
+from aws_ml_helper.utils import print_rows, PAGE_SIZE
 from aws_ml_helper.instance import get_instance
+from aws_ml_helper.names import NameCache, resolve
+from aws_ml_helper.wait import all_ready, report
+
+
+def get_images(config, names):
+    """Returns image objects for several names with a single describe call.
+
+    Names that are not found or that match several images are reported and
+    mapped to `None`.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Image names
+
+    Returns:
+        dict: Image name to image or None
+    """
+    def by_ids(image_ids):
+        return [
+            describe.hydrate(config, 'image', i)
+            for i in describe.items(config, 'image', ImageIds=image_ids)
+        ]
+
+    def by_names(names):
+        return [
+            describe.hydrate(config, 'image', i)
+            for i in describe.items(
+                config, 'image', Owners=[config.account],
+                Filters=[{'Name': 'name', 'Values': names}]
+            )
+        ]
+
+    return resolve(config, 'image', names, by_ids, by_names,
+                   lambda i: i.name)
 
 
 def get_image(config, name):
     """Returns an image object with selected name or returns `None` if the
-        image is not found.
-
-        Args:
-            config (aws_ml_helper.config.Config): Configuration
-            name (str): Volume name
-
-        Returns:
-            Volume if found or None
-        """
-    ec2 = boto.resource('ec2', config)
-    image_list = ec2.images.filter(
-        Owners=[config.account],
-        Filters=[{'Name': 'Name', 'Values': [name]}]
-    )
-    if len(image_list) == 0:
-        click.secho(f'Volume "{name}" not found')
-        return None
-    elif len(image_list) > 1:
-        click.secho(f'Multiple volumes with name "{name}" found.')
-        return None
-    return image_list[0]
+    image is not found.
 
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        name (str): Image name
 
-def images(config):
-    """List instances and their state
+    Returns:
+        Image if found or None
+    """
+    return get_images(config, [name])[name]
+
+
+def images(config, output='table', page_size=PAGE_SIZE):
+    """List images and their state
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
+        output (str): Output format, one of `aws_ml_helper.utils.OUTPUTS`
+        page_size (int): Number of images requested per call
     """
-    ec2 = boto.resource('ec2', config)
-    data = []
-    for i in ec2.images.filter(Owners=[config.account]):
-        data.append([
-            i.name,
-            i.id,
-            i.state,
-        ])
-
-    print(tabulate(data, ['name', 'id', 'state'], config.table_format))
+    rows = (
+        (i.get('Name', ''), i['ImageId'], i['State'])
+        for i in inventory.items(config, 'image', page_size)
+    )
+    print_rows(rows, ['name', 'id', 'state'], config, output, [40, 22, 12])
 
 
 def image_create(config, instance_name, image_name, wait):
@@ -64,11 +83,12 @@ def image_create(config, instance_name, image_name, wait):
     """
     instance = get_instance(config, instance_name)
     image = instance.create_image(Name=image_name)
+    NameCache(config).set('image', image_name, image.id)
     click.echo(f'Image ID: {image.id}')
     if wait:
-        while image.state != 'available':
-            time.sleep(0.5)
-            image.reload()
+        all_ready(config, 'image', [image.id], {'available'},
+                  failed={'invalid', 'deregistered', 'failed', 'error'},
+                  timeout=3600, progress=report(f'Image {image_name}'))
 
 
 def image_delete(config, image_name):
@@ -81,3 +101,4 @@ def image_delete(config, image_name):
     image = get_image(config, image_name)
     if image:
         image.deregister()
+        NameCache(config).delete('image', image_name)
@@ -4,31 +4,97 @@ __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 
 import os
 import click
-import paramiko
-from tabulate import tabulate
-from aws_ml_helper import boto
-from aws_ml_helper.utils import name_from_tags
-
-
-def instances(config):
+import socket
+import fnmatch
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import boto, describe, inventory, ssh, transfer, wait
+from aws_ml_helper.utils import (
+    name_from_tags, expand_names, print_rows, PAGE_SIZE
+)
+from aws_ml_helper.names import NameCache, resolve
+
+
+# Instance states of instances that still exist, terminated ones are ignored
+# when names are resolved
+LIVE = {'Name': 'instance-state-name',
+        'Values': ['pending', 'running', 'shutting-down', 'stopping',
+                   'stopped']}
+
+
+def instances(config, output='table', page_size=PAGE_SIZE,
+              all_regions=False):
     """List instances and their state
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
+        output (str): Output format, one of `aws_ml_helper.utils.OUTPUTS`
+        page_size (int): Number of instances requested per call
+        all_regions (bool): List instances in all enabled regions, fetched
+            concurrently, with their region and type.
     """
-    ec2 = boto.resource('ec2', config)
-    data = []
-    for i in ec2.instances.all():
-        data.append([
-            name_from_tags(i.tags),
-            i.id,
-            i.state['Name'],
-            i.public_ip_address or 'no ip'
-        ])
+    if all_regions:
+        rows = (
+            (
+                region,
+                name_from_tags(i.get('Tags')),
+                i['InstanceId'],
+                i['InstanceType'],
+                i['State']['Name'],
+                i.get('PublicIpAddress') or 'no ip'
+            )
+            for region, i in inventory.all_regions(config, 'instance',
+                                                   page_size)
+        )
+        print_rows(rows, ['region', 'name', 'id', 'type', 'state',
+                          'public ip'],
+                   config, output, [16, 30, 20, 14, 14, 16])
+        return
+    rows = (
+        (
+            name_from_tags(i.get('Tags')),
+            i['InstanceId'],
+            i['State']['Name'],
+            i.get('PublicIpAddress') or 'no ip'
+        )
+        for i in inventory.items(config, 'instance', page_size)
+    )
+    print_rows(rows, ['name', 'id', 'state', 'public ip'], config, output,
+               [30, 20, 14, 16])
 
-    print(tabulate(
-        data, ['name', 'id', 'state', 'public ip'], config.table_format
-    ))
+
+def get_instances(config, names, quiet=False):
+    """Returns instance objects for several names with a single describe call.
+
+    Names that are not found or that match several instances are reported and
+    mapped to `None`.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Instance names
+        quiet (bool): Don't report names that are not found
+
+    Returns:
+        dict: Instance name to instance or None
+    """
+    def by_ids(instance_ids):
+        return [
+            describe.hydrate(config, 'instance', i)
+            for i in describe.items(config, 'instance',
+                                    InstanceIds=instance_ids, Filters=[LIVE])
+        ]
+
+    def by_names(names):
+        return [
+            describe.hydrate(config, 'instance', i)
+            for i in describe.items(
+                config, 'instance',
+                Filters=[{'Name': 'tag:Name', 'Values': names}, LIVE]
+            )
+        ]
+
+    return resolve(config, 'instance', names, by_ids, by_names,
+                   lambda i: name_from_tags(i.tags), quiet)
 
 
 def get_instance(config, name):
@@ -42,46 +108,155 @@ def get_instance(config, name):
     Returns:
         Instance if found or None
     """
-    ec2 = boto.resource('ec2', config)
-    instance_list = list(ec2.instances.filter(
-        Filters=[{'Name': 'tag:Name', 'Values': [name]}]
-    ))
-    if len(instance_list) == 0:
-        click.secho(f'Instance "{name}" not found')
-        return None
-    elif len(instance_list) > 1:
-        click.secho(f'Multiple instances with name "{name}" found.')
-        return None
-    return instance_list[0]
+    return get_instances(config, [name])[name]
+
+
+def select_instances(config, names=(), tags=()):
+    """Select running instances by name, name glob pattern or tag.
+
+    Exact names are resolved with `get_instances`, named instances that are
+    not running are reported and skipped. Glob patterns and `KEY=VALUE` tag
+    selectors are sent as filters of a single describe call, or applied to
+    the local inventory if it's fresh enough. EC2 filters only understand
+    `*` and `?`, so patterns with `[...]` are matched only locally.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Instance names or glob patterns
+        tags (list of str): Tag selectors in `KEY=VALUE` format
+
+    Returns:
+        list: Selected instances
+    """
+    patterns = [n for n in names if any(c in n for c in '*?[')]
+    exact = [n for n in names if n not in patterns]
+    selected = []
+    for name, instance in get_instances(config, exact).items():
+        if instance is None:
+            continue
+        if instance.state['Name'] != 'running':
+            click.secho(f'Instance "{name}" is {instance.state["Name"]}, '
+                        f'skipped', fg='red')
+            continue
+        selected.append(instance)
+    if len(patterns) == 0 and len(tags) == 0:
+        return selected
+
+    tags = [tag.partition('=')[::2] for tag in tags]
+    store = inventory.stored(config, 'instance')
+    if store is not None:
+        with store:
+            candidates = [
+                describe.hydrate(config, 'instance', i)
+                for i in store.items('instance', states=['running'],
+                                     tags=tags)
+            ]
+    else:
+        filters = [{'Name': 'instance-state-name', 'Values': ['running']}]
+        if len(patterns) > 0 and not any('[' in p for p in patterns):
+            filters.append({'Name': 'tag:Name', 'Values': patterns})
+        for key, value in tags:
+            filters.append({'Name': f'tag:{key}', 'Values': [value]})
+        candidates = [
+            describe.hydrate(config, 'instance', i)
+            for i in describe.items(config, 'instance', Filters=filters)
+        ]
+    ids = {i.id for i in selected}
+    for i in candidates:
+        # EC2 wildcards are not exactly shell globs, check them again
+        name = name_from_tags(i.tags)
+        if i.id not in ids and (
+                len(patterns) == 0 or
+                any(fnmatch.fnmatchcase(name, p) for p in patterns)):
+            selected.append(i)
+            ids.add(i.id)
+    return selected
+
+
+def tag_names(config, names):
+    """Set the Name tag of several resources.
+
+    EC2 applies the same tags to all resources in a `create_tags` call, so
+    the calls for different names are made concurrently.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (dict): Resource name to resource id
+    """
+    ec2 = boto.client('ec2', config)
+
+    def tag(item):
+        name, resource_id = item
+        ec2.create_tags(Resources=[resource_id],
+                        Tags=[{'Key': 'Name', 'Value': name}])
+
+    with ThreadPoolExecutor(max_workers=min(len(names), 16) or 1) as e:
+        list(e.map(tag, names.items()))
+
 
+def _launch_tags(pattern, names):
+    """Returns the tags set by a launch request.
 
-def start(config, name, ami_id, instance_type, ebs_size=128):
-    """Start an instance.
+    A single instance gets its name. A batch of instances gets a `Group` tag
+    with the name pattern, the names are set afterwards.
+    """
+    if len(names) == 1:
+        return [{'Key': 'Name', 'Value': names[0]}]
+    return [{'Key': 'Group', 'Value': pattern}]
+
+
+def start(config, name, ami_id, instance_type, ebs_size=128, count=1):
+    """Start one or more instances.
 
     If an instance with this name already exists and it's stopped, it will just
-    start the instance. If the instance does not exist, it will start it.
+    start the instance. If it's still stopping, it's started once it's
+    stopped. If the instance does not exist, it will start it.
 
+    All missing instances are launched with a single request, all stopped
+    ones are started with a single request and all of them are waited on
+    with one batched waiter.
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
-        name (str): Instance name
+        name (str): Instance name or name pattern, for example `worker-{i}`
         ami_id (str): AMI id to use. If not provided, value form the
             configuration will be used
         instance_type (str): Instance type to use. If not provided, value from
             the configuration will be used.
         ebs_size (int): Size of the EBS Volume in GB
+        count (int): Number of instances
     """
-    ec2 = boto.resource('ec2', config)
-    instance = get_instance(config, name)
-
-    if instance is None:
-        # Create an instance
+    names = expand_names(name, count)
+    existing = {
+        n: i for n, i in get_instances(config, names, quiet=True).items()
+        if i is not None and i.state['Name'] not in ('shutting-down',
+                                                     'terminated')
+    }
+    missing = [n for n in names if n not in existing]
+    ids = {n: i.id for n, i in existing.items()}
+
+    # Instances that are still stopping can be started only once stopped
+    stopping = [i.id for i in existing.values()
+                if i.state['Name'] == 'stopping']
+    if stopping:
+        wait.all_ready(config, 'instance', stopping, {'stopped'},
+                       failed={'shutting-down', 'terminated'},
+                       progress=wait.report('Instance'))
+    stopped = stopping + [i.id for i in existing.values()
+                          if i.state['Name'] == 'stopped']
+    if stopped:
+        # Start the instances
+        boto.client('ec2', config).start_instances(InstanceIds=stopped)
+
+    if missing:
+        # Create the instances
+        ec2 = boto.resource('ec2', config)
         instance_list = ec2.create_instances(
             ImageId=ami_id or config.ami_id,
             InstanceType=instance_type or config.instance_type,
             KeyName=f'access-key-{config.vpc_name}',
-            MinCount=1,
-            MaxCount=1,
+            MinCount=len(missing),
+            MaxCount=len(missing),
             BlockDeviceMappings=[
                 {
                     'DeviceName': '/dev/sda1',
@@ -108,17 +283,30 @@ def start(config, name, ami_id, instance_type, ebs_size=128):
             TagSpecifications=[
                 {
                     'ResourceType': 'instance',
-                    'Tags': [{'Key': 'Name', 'Value': name}]
+                    'Tags': _launch_tags(name, missing)
                 },
             ],
         )
-        instance = instance_list[0]
-    else:
-        # Start an instance
-        instance.start()
-    # Wait for the instance
-    instance.wait_until_running()
-    print(f'Instance ID: {instance.id}')
+        created = dict(zip(missing, [i.id for i in instance_list]))
+        if len(missing) > 1:
+            tag_names(config, created)
+        NameCache(config).update('instance', created)
+        ids.update(created)
+
+    # Wait for the instances
+    running = wait.all_ready(config, 'instance', list(ids.values()),
+                             {'running'},
+                             failed={'shutting-down', 'terminated'},
+                             progress=wait.report('Instance'))
+    if len(names) == 1:
+        print(f'Instance ID: {ids[names[0]]}')
+        return
+    from tabulate import tabulate
+    print(tabulate(
+        [[n, ids[n], running[ids[n]].get('PublicIpAddress', '')]
+         for n in names],
+        ['name', 'id', 'ip'], config.table_format
+    ))
 
 
 def stop(config, name):
@@ -143,6 +331,7 @@ def terminate(config, name):
     instance = get_instance(config, name)
     if instance is not None:
         instance.terminate()
+        NameCache(config).delete('instance', name)
 
 
 def login(config, name):
@@ -155,40 +344,124 @@ def login(config, name):
     instance = get_instance(config, name)
     if instance is not None:
         os.system(
-            f'ssh -o "StrictHostKeyChecking no" -i "{config.access_key}" '
+            f'ssh {ssh.ssh_options(config)} -i "{config.access_key}" '
             f'"{config.ami_username}@{instance.public_ip_address}"'
         )
 
 
-def run(config, name, command, silent=False):
+def _public_ip(instance):
+    """Returns the public IP address of an instance to connect to.
+
+    Paramiko connects to localhost when the address is `None`, so instances
+    that are not running or have no public IP address are rejected.
+
+    Returns:
+        tuple: `(address, error)` where the address is `None` and the error
+            describes why if the instance can't be reached.
+    """
+    state = instance.state['Name']
+    if state != 'running':
+        return None, f'instance is {state}'
+    if not instance.public_ip_address:
+        return None, 'no public ip'
+    return instance.public_ip_address, ''
+
+
+def run(config, name, command, silent=False, max_lines=ssh.MAX_LINES):
     """Run command on the selected instance
 
+    Output is printed line by line as it arrives.
+
     Args:
         config (aws_ml_helper.config.Config): Configuration
         name (str): Name of the instance
         command (str): Command to run
         silent (bool): Should it print out the results or not
+        max_lines (int): Number of the last output lines to return
+
+    Returns:
+        aws_ml_helper.ssh.Result: `(out, err, exit_status)` where `out` and
+            `err` contain the last `max_lines` lines of the output, or `None`
+            if the instance is not found or can't be reached.
     """
     instance = get_instance(config, name)
     if instance is not None:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(instance.public_ip_address,
-                    username=config.ami_username,
-                    key_filename=config.access_key)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        out = stdout.read().decode('utf-8')
-        err = stderr.read().decode('utf-8')
-        if not silent:
-            if out.strip() != '':
-                click.echo(out)
-            if err.strip() != '':
-                click.secho(err, fg='red')
-        return out, err
-
-
-def cp(config, source, destination):
-    """Copy file to instance or from instance.
+        address, error = _public_ip(instance)
+        if address is None:
+            click.secho(f'Instance "{name}": {error}', fg='red')
+            return None
+        with ssh.connect(config, address) as client:
+            if silent:
+                return ssh.execute(client, command, max_lines=max_lines)
+            return ssh.execute(
+                client, command,
+                on_out=click.echo,
+                on_err=lambda line: click.secho(line, fg='red'),
+                max_lines=max_lines
+            )
+
+
+def run_many(config, instances, command, workers=10, timeout=None):
+    """Run command on several instances concurrently.
+
+    Output lines are printed as they arrive prefixed with the instance name,
+    and an exit code summary table is printed at the end.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        instances (list): Instance objects
+        command (str): Command to run
+        workers (int): Maximal number of concurrent SSH sessions
+        timeout (float): Per instance timeout in seconds
+
+    Returns:
+        dict: Instance name to exit code, or `None` if the command failed to
+            run, timed out or the instance has no public IP address.
+    """
+    import paramiko
+    from tabulate import tabulate
+    lock = threading.Lock()
+
+    def echo(prefix, line, **kwargs):
+        with lock:
+            click.secho(f'[{prefix}] {line}', **kwargs)
+
+    def task(instance):
+        prefix = name_from_tags(instance.tags) or instance.id
+        address, error = _public_ip(instance)
+        if address is None:
+            echo(prefix, error, fg='red')
+            return prefix, None, error
+        try:
+            with ssh.connect(config, address, timeout) as client:
+                result = ssh.execute(
+                    client, command,
+                    on_out=lambda line: echo(prefix, line),
+                    on_err=lambda line: echo(prefix, line, fg='red'),
+                    timeout=timeout, max_lines=0
+                )
+            return prefix, result.exit_status, ''
+        except socket.timeout:
+            echo(prefix, 'timed out', fg='red')
+            return prefix, None, 'timeout'
+        except (paramiko.SSHException, OSError) as e:
+            echo(prefix, str(e), fg='red')
+            return prefix, None, str(e)
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        results = list(executor.map(task, instances))
+
+    print(tabulate(
+        [[name, '' if code is None else code, error]
+         for name, code, error in results],
+        ['name', 'exit code', 'error'], config.table_format
+    ))
+    return {name: code for name, code, _ in results}
+
+
+def cp(config, source, destination, workers=4,
+       chunk_size=transfer.CHUNK_SIZE, resume=True, compare='mtime'):
+    """Copy file or directory to instance or from instance.
 
     To copy a file to instance use the following command::
 
@@ -198,31 +471,48 @@ def cp(config, source, destination):
 
         aml cp {instance_name}:/remote/path /local/path
 
+    Directories are copied recursively, files that are already identical are
+    skipped and interrupted transfers are resumed.
+
     Args:
         config (aws_ml_helper.config.Config): Configuration
-        source (str): Source file
-        destination (src): Destination file
+        source (str): Source file or directory
+        destination (src): Destination file or directory
+        workers (int): Number of files transferred in parallel
+        chunk_size (int): Size of the blocks read from the source
+        resume (bool): Resume partially transferred files
+        compare (str): Skip files that are identical by `size`, `mtime`
+            (size and modification time) or `hash` (size and SHA-256).
+
+    Returns:
+        aws_ml_helper.transfer.Stats: Transfer statistics or `None` if the
+            instance is not found or can't be reached.
     """
     if ':' in source or ':' in destination:
         if ':' in source:
-            instance_name, source = source.split(':')
+            instance_name, _, source = source.partition(':')
             from_instance = True
         else:
-            instance_name, destination = destination.split(':')
+            instance_name, _, destination = destination.partition(':')
             from_instance = False
 
         instance = get_instance(config, instance_name)
         if instance is not None:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(instance.public_ip_address,
-                        username=config.ami_username,
-                        key_filename=config.access_key)
-            sftp = paramiko.SFTPClient.from_transport(ssh.get_transport())
-            if from_instance:
-                sftp.get(source, destination)
-            else:
-                sftp.put(source, destination)
+            address, error = _public_ip(instance)
+            if address is None:
+                click.secho(f'Instance "{instance_name}": {error}', fg='red')
+                return None
+            with ssh.connect(config, address) as client:
+                if from_instance:
+                    stats = transfer.download(client, source, destination,
+                                              workers, chunk_size, resume,
+                                              compare)
+                else:
+                    stats = transfer.upload(client, source, destination,
+                                            workers, chunk_size, resume,
+                                            compare)
+            click.echo(str(stats))
+            return stats
     else:
         click.secho('Both paths are local paths.', fg='red')
 
@@ -248,7 +538,8 @@ def mount(config, remote, local):
     instance = get_instance(config, instance_name)
     os.system(
         f'sshfs "{config.ami_username}@{instance.public_ip_address}:{path}" '
-        f'"{local}" -o IdentityFile="{config.access_key}"'
+        f'"{local}" -o IdentityFile="{config.access_key}" '
+        f'{ssh.ssh_options(config)}'
     )
 
 
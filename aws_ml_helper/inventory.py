@@ -0,0 +1,410 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import boto, describe
+
+
+STORE_FILE = 'inventory.sqlite'
+KINDS = ['instance', 'volume', 'snapshot', 'image']
+
+# EC2 operations that change resources, and the kinds they change. Tag
+# operations change the kinds of the tagged resources.
+MUTATIONS = {
+    'RunInstances': ['instance'],
+    'StartInstances': ['instance'],
+    'StopInstances': ['instance'],
+    'RebootInstances': ['instance'],
+    'TerminateInstances': ['instance'],
+    'ModifyInstanceAttribute': ['instance'],
+    'CreateVolume': ['volume'],
+    'DeleteVolume': ['volume'],
+    'ModifyVolume': ['volume'],
+    'AttachVolume': ['instance', 'volume'],
+    'DetachVolume': ['instance', 'volume'],
+    'CreateSnapshot': ['snapshot'],
+    'CopySnapshot': ['snapshot'],
+    'DeleteSnapshot': ['snapshot'],
+    'CreateImage': ['image', 'snapshot'],
+    'CopyImage': ['image', 'snapshot'],
+    'RegisterImage': ['image'],
+    'DeregisterImage': ['image'],
+}
+TAG_OPERATIONS = ['CreateTags', 'DeleteTags']
+# Resource id prefix to kind
+PREFIXES = {'i-': 'instance', 'vol-': 'volume', 'snap-': 'snapshot',
+            'ami-': 'image'}
+
+
+class Inventory(object):
+    """Local SQLite snapshot of instances, volumes, snapshots and images.
+
+    Raw Describe items are stored per scope (profile and region) and kind,
+    indexed by name, state and tags. For every kind the store remembers when
+    it was last fetched completely. Mutating operations drop that time, so a
+    changed kind is never answered from the store.
+    """
+
+    def __init__(self, path, scope):
+        """
+        Args:
+            path (str): Path to the SQLite database
+            scope (str): Profile and region the items belong to
+        """
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self.scope = scope
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS items (
+                scope TEXT, kind TEXT, id TEXT, name TEXT, state TEXT,
+                data TEXT,
+                PRIMARY KEY (scope, kind, id)
+            );
+            CREATE INDEX IF NOT EXISTS items_name
+                ON items (scope, kind, name);
+            CREATE INDEX IF NOT EXISTS items_state
+                ON items (scope, kind, state);
+            CREATE TABLE IF NOT EXISTS tags (
+                scope TEXT, kind TEXT, id TEXT, key TEXT, value TEXT
+            );
+            CREATE INDEX IF NOT EXISTS tags_key
+                ON tags (scope, kind, key, value);
+            CREATE TABLE IF NOT EXISTS refreshed (
+                scope TEXT, kind TEXT, ts REAL,
+                PRIMARY KEY (scope, kind)
+            );
+        """)
+
+    @classmethod
+    def open(cls, config, region=None):
+        """Open the store next to the configuration file.
+
+        Args:
+            config (aws_ml_helper.config.Config): Configuration
+            region (str): Region. Default: from configuration
+        """
+        return cls(os.path.join(os.path.dirname(config.config), STORE_FILE),
+                   f'{config.profile}:{region or config.region}')
+
+    def age(self, kind):
+        """Returns the seconds since the kind was fetched or `None`.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+        """
+        with self._lock:
+            row = self.db.execute(
+                'SELECT ts FROM refreshed WHERE scope = ? AND kind = ?',
+                (self.scope, kind)
+            ).fetchone()
+        return None if row is None else time.time() - row[0]
+
+    def _rows(self, kind, items):
+        """Returns the item and tag rows of raw Describe items."""
+        id_key = describe.KINDS[kind][2]
+        rows, tags = [], []
+        for item in items:
+            rows.append((
+                self.scope, kind, item[id_key], describe.name_of(kind, item),
+                describe.state_of(kind, item), json.dumps(item, default=str)
+            ))
+            tags.extend(
+                (self.scope, kind, item[id_key], t['Key'], t['Value'])
+                for t in item.get('Tags') or []
+            )
+        return rows, tags
+
+    @contextlib.contextmanager
+    def replacing(self, kind):
+        """Replace all stored items of a kind with items stored page by page.
+
+        Pages are staged in temporary tables of this connection as they
+        arrive, so memory stays flat and the database is not locked while
+        fetching. When the block ends the stored items are replaced in one
+        transaction. If the block raises, or a listing is not read to the
+        end, the stored items are kept.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+
+        Yields:
+            callable: Takes a list of raw Describe items and stages them
+        """
+        key = (self.scope, kind)
+        with self._lock, self.db:
+            self.db.executescript("""
+                CREATE TEMP TABLE IF NOT EXISTS staged_items
+                    AS SELECT * FROM items WHERE 0;
+                CREATE TEMP TABLE IF NOT EXISTS staged_tags
+                    AS SELECT * FROM tags WHERE 0;
+            """)
+            self._unstage(key)
+
+        def stage(items):
+            rows, tags = self._rows(kind, items)
+            with self._lock, self.db:
+                self.db.executemany(
+                    'INSERT INTO staged_items VALUES (?, ?, ?, ?, ?, ?)', rows
+                )
+                self.db.executemany(
+                    'INSERT INTO staged_tags VALUES (?, ?, ?, ?, ?)', tags
+                )
+
+        try:
+            yield stage
+        except BaseException:
+            with self._lock, self.db:
+                self._unstage(key)
+            raise
+        with self._lock, self.db:
+            for table in ('items', 'tags'):
+                self.db.execute(
+                    f'DELETE FROM {table} WHERE scope = ? AND kind = ?', key
+                )
+                self.db.execute(
+                    f'INSERT INTO {table} SELECT * FROM staged_{table} '
+                    f'WHERE scope = ? AND kind = ? ORDER BY rowid', key
+                )
+            self._unstage(key)
+            self.db.execute(
+                'INSERT OR REPLACE INTO refreshed VALUES (?, ?, ?)',
+                key + (time.time(),)
+            )
+
+    def _unstage(self, key):
+        for table in ('staged_items', 'staged_tags'):
+            self.db.execute(
+                f'DELETE FROM {table} WHERE scope = ? AND kind = ?', key
+            )
+
+    def replace(self, kind, items):
+        """Replace all stored items of a kind with freshly fetched ones.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            items (list of dict): Raw Describe items
+        """
+        with self.replacing(kind) as stage:
+            stage(items)
+
+    def invalidate(self, kinds=None):
+        """Mark kinds as changed, so they are fetched again.
+
+        Args:
+            kinds (list of str): Resource kinds. Default: all kinds
+        """
+        kinds = kinds or KINDS
+        with self._lock, self.db:
+            self.db.executemany(
+                'DELETE FROM refreshed WHERE scope = ? AND kind = ?',
+                [(self.scope, kind) for kind in kinds]
+            )
+
+    def items(self, kind, names=None, states=None, tags=None):
+        """Returns the stored raw items that match all conditions.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            names (list of str): Select items with one of these names
+            states (list of str): Select items in one of these states
+            tags (list of tuple): Select items with all these
+                `(key, value)` tags
+
+        Returns:
+            list of dict: Raw Describe items
+        """
+        query = 'SELECT data FROM items WHERE scope = ? AND kind = ?'
+        args = [self.scope, kind]
+        for column, values in (('name', names), ('state', states)):
+            if values is not None:
+                query += (f' AND {column} IN '
+                          f'({", ".join("?" * len(values))})')
+                args.extend(values)
+        for key, value in tags or []:
+            query += (' AND id IN (SELECT id FROM tags WHERE scope = ? AND '
+                      'kind = ? AND key = ? AND value = ?)')
+            args.extend([self.scope, kind, key, value])
+        with self._lock:
+            rows = self.db.execute(query + ' ORDER BY rowid', args).fetchall()
+        return [json.loads(data) for data, in rows]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def max_age(config):
+    """Returns the maximal inventory age used by this run or `None`.
+
+    `config.max_age` is set for a single run by the `--cached` and
+    `--max-age` options, otherwise `inventory_max_age` from the
+    configuration is used. Zero or less disables the inventory.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+    """
+    value = config.max_age
+    if value is None:
+        value = float(config.inventory_max_age or 0)
+    return value if value > 0 else None
+
+
+def stored(config, kind):
+    """Returns the stored inventory if it's fresh enough for this run.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+
+    Returns:
+        Inventory: The store or `None` if the inventory is disabled or the
+            kind is too old. The caller closes the store.
+    """
+    age_limit = max_age(config)
+    if age_limit is None:
+        return None
+    inventory = Inventory.open(config)
+    age = inventory.age(kind)
+    if age is None or age > age_limit:
+        inventory.close()
+        return None
+    return inventory
+
+
+def items(config, kind, page_size=None):
+    """Iterate over the raw items of all resources of a kind.
+
+    Items are read from the inventory if it's fresh enough. Otherwise they
+    are fetched, and if the inventory is enabled also stored in it page by
+    page. The stored items are replaced once all pages are read. With the
+    inventory disabled nothing is written, `aml refresh` still fills it.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        page_size (int): Number of items requested per call
+    """
+    pages = describe.pages(config, kind, page_size,
+                           **describe.account_args(config, kind))
+    if max_age(config) is None:
+        for page in pages:
+            yield from page
+        return
+    inventory = stored(config, kind)
+    if inventory is not None:
+        with inventory:
+            yield from inventory.items(kind)
+        return
+    with Inventory.open(config) as inventory, \
+            inventory.replacing(kind) as stage:
+        for page in pages:
+            stage(page)
+            yield from page
+
+
+def all_regions(config, kind, page_size=None):
+    """Iterate over the raw items of a kind in all enabled regions.
+
+    The regions are fetched concurrently and, if the inventory is enabled,
+    stored in the inventory of every region.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        page_size (int): Number of items requested per call
+
+    Yields:
+        tuple: `(region, item)`
+    """
+    fetched = describe.regional_items(config, kind, boto.regions(config),
+                                      page_size,
+                                      **describe.account_args(config, kind))
+    enabled = max_age(config) is not None
+    for region, region_items in sorted(fetched.items()):
+        if enabled:
+            with Inventory.open(config, region) as inventory:
+                inventory.replace(kind, region_items)
+        for item in region_items:
+            yield region, item
+
+
+def refresh(config, kinds=None, workers=4):
+    """Fetch the kinds concurrently and store them in the inventory.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kinds (list of str): Resource kinds. Default: all kinds
+        workers (int): Number of concurrent fetches
+
+    Returns:
+        dict: Kind to number of stored items
+    """
+    def fetch(kind):
+        count = 0
+        with inventory.replacing(kind) as stage:
+            for page in describe.pages(config, kind,
+                                       **describe.account_args(config, kind)):
+                stage(page)
+                count += len(page)
+        return kind, count
+
+    with Inventory.open(config) as inventory, \
+            ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return dict(executor.map(fetch, kinds or KINDS))
+
+
+def refresh_in_background(config, kinds=None):
+    """Start `aml refresh` in a detached process.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kinds (list of str): Resource kinds. Default: all kinds
+    """
+    command = [sys.executable, '-m', 'aws_ml_helper',
+               '--config', config.config, '--profile', config.profile,
+               'refresh']
+    for kind in kinds or []:
+        command.extend(['--kind', kind])
+    subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def watch(client, config, region=None):
+    """Invalidate the inventory when a client changes resources.
+
+    Args:
+        client: EC2 client
+        config (aws_ml_helper.config.Config): Configuration
+        region (str): Client region. Default: from configuration
+    """
+    def changed(params, model, **kwargs):
+        kinds = MUTATIONS.get(model.name)
+        if model.name in TAG_OPERATIONS:
+            kinds = sorted({
+                kind for resource_id in params.get('Resources', [])
+                for prefix, kind in PREFIXES.items()
+                if resource_id.startswith(prefix)
+            })
+        if kinds:
+            with Inventory.open(config, region) as inventory:
+                inventory.invalidate(kinds)
+
+    client.meta.events.register('before-parameter-build.ec2', changed)
@@ -0,0 +1,118 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import os
+import json
+import threading
+
+
+JOURNAL_DIR = 'journal'
+
+
+class Journal(object):
+    """Record of the resources created by a multi step operation.
+
+    For every step the journal keeps the id of the resource it created, as
+    soon as it's created, and the step result once the step is done::
+
+        {"created": {"vpc": "vpc-..."}, "done": {"vpc": "vpc-..."}}
+
+    It's written to disk after every change, so an interrupted operation can
+    be resumed or torn down. Journals are stored next to the configuration
+    file, one per profile, region, kind and name.
+    """
+
+    def __init__(self, config, kind, name):
+        """
+        Args:
+            config (aws_ml_helper.config.Config): Configuration
+            kind (str): Operation kind, for example `vpc`
+            name (str): Name of the created object
+        """
+        self.path = os.path.join(
+            os.path.dirname(config.config), JOURNAL_DIR,
+            f'{config.profile}-{config.region}-{kind}-{name}.json'
+        )
+        self._lock = threading.Lock()
+        self._data = {'created': {}, 'done': {}}
+        if os.path.isfile(self.path):
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                self._data.update(json.load(f))
+
+    def __bool__(self):
+        return bool(self._data['created'] or self._data['done'])
+
+    def created(self, step, resource_id):
+        """Record the id of a resource created by a step.
+
+        Args:
+            step (str): Step name
+            resource_id (str): Resource id
+        """
+        with self._lock:
+            self._data['created'][step] = resource_id
+            self._save()
+
+    def resource(self, step):
+        """Returns the id of the resource created by a step or `None`.
+
+        Args:
+            step (str): Step name
+        """
+        return self._data['created'].get(step)
+
+    def done(self, step):
+        """Is the step done?
+
+        Args:
+            step (str): Step name
+        """
+        return step in self._data['done']
+
+    def get(self, step, default=None):
+        """Returns the result of a done step.
+
+        Args:
+            step (str): Step name
+            default: Value returned if the step is not done
+        """
+        return self._data['done'].get(step, default)
+
+    def record(self, step, value):
+        """Mark a step as done.
+
+        Args:
+            step (str): Step name
+            value: JSON serializable step result
+        """
+        with self._lock:
+            self._data['done'][step] = value
+            self._save()
+
+    def delete(self, step):
+        """Forget a step.
+
+        Args:
+            step (str): Step name
+        """
+        with self._lock:
+            self._data['created'].pop(step, None)
+            self._data['done'].pop(step, None)
+            self._save()
+
+    def remove(self):
+        """Remove the journal file."""
+        with self._lock:
+            self._data = {'created': {}, 'done': {}}
+            if os.path.isfile(self.path):
+                os.remove(self.path)
+
+    def _save(self):
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with io.open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
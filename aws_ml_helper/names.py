@@ -0,0 +1,225 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import os
+import json
+import time
+import click
+import tempfile
+import threading
+import contextlib
+from botocore.exceptions import ClientError
+from aws_ml_helper import describe, inventory
+
+
+CACHE_FILE = 'names.json'
+
+# Serializes updates of the cache file between the threads of this process.
+# Other processes are kept out with a lock file where `fcntl` is available.
+_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def _locked(path):
+    """Hold the process and file lock of the cache file at `path`."""
+    with _lock:
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+        with io.open(f'{path}.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class NameCache(object):
+    """Name to resource id cache stored next to the configuration file.
+
+    Entries are kept per profile and region::
+
+        {"default:us-east-1": {"instance": {"name": ["i-...", 1521234567]}}}
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config (aws_ml_helper.config.Config): Configuration
+        """
+        self.path = os.path.join(os.path.dirname(config.config), CACHE_FILE)
+        self.section = f'{config.profile}:{config.region}'
+        self.ttl = int(config.name_cache_ttl or 0)
+        self._data = None
+
+    def _load(self):
+        if self._data is None:
+            self._data = {}
+            if os.path.isfile(self.path):
+                try:
+                    with io.open(self.path, 'r', encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except ValueError:
+                    pass
+        return self._data
+
+    def _save(self, data):
+        # Every save writes its own temporary file, so concurrent saves from
+        # several threads never interleave
+        with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=os.path.dirname(self.path),
+                prefix=f'{CACHE_FILE}.', suffix='.tmp', delete=False) as f:
+            json.dump(data, f)
+        os.replace(f.name, self.path)
+
+    def get(self, kind, name):
+        """Returns cached resource id or `None` if missing or expired.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            name (str): Resource name
+        """
+        if self.ttl <= 0:
+            return None
+        entry = self._load().get(self.section, {}).get(kind, {}).get(name)
+        if entry is None or time.time() - entry[1] > self.ttl:
+            return None
+        return entry[0]
+
+    def set(self, kind, name, resource_id):
+        """Store a name to id mapping.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            name (str): Resource name
+            resource_id (str): Resource id
+        """
+        self.update(kind, {name: resource_id})
+
+    def delete(self, kind, name):
+        """Remove a cached mapping.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            name (str): Resource name
+        """
+        self.update(kind, {name: None})
+
+    def update(self, kind, mapping):
+        """Store or remove several mappings with a single write.
+
+        Args:
+            kind (str): Resource kind (instance, volume, snapshot, image)
+            mapping (dict): Name to resource id. `None` removes the name.
+        """
+        if self.ttl <= 0 and all(v is not None for v in mapping.values()):
+            return
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        # Load, modify and save under the lock and from the file, so
+        # concurrent updates don't drop each other's entries
+        with _locked(self.path):
+            self._data = None
+            data = self._load()
+            entries = data.setdefault(self.section, {}).setdefault(kind, {})
+            now = int(time.time())
+            changed = False
+            for name, resource_id in mapping.items():
+                if resource_id is None:
+                    changed = entries.pop(name, None) is not None or changed
+                elif self.ttl > 0:
+                    entries[name] = [resource_id, now]
+                    changed = True
+            if changed:
+                self._save(data)
+
+
+def _stored(config, store, kind, names):
+    """Returns a `by_names` function that answers from the local inventory.
+
+    The items of all names are read right away and the store is closed.
+    Terminated instances are skipped, like in the describe calls.
+    """
+    with store:
+        items = [item for item in store.items(kind, names=names)
+                 if describe.state_of(kind, item) != 'terminated']
+
+    def by_names(missing):
+        return [describe.hydrate(config, kind, item) for item in items
+                if describe.name_of(kind, item) in missing]
+    return by_names
+
+
+def resolve(config, kind, names, by_ids, by_names, name_of, quiet=False):
+    """Resolve several resources by name using the name cache.
+
+    Cached ids are verified with a single describe by ids. Names that are not
+    cached, or whose cached resource is gone or renamed, are resolved with a
+    single tag scan for all of them. Names that are not found or that match
+    several resources are reported and resolved to `None`.
+
+    If the local inventory is enabled and fresh enough, all names are
+    resolved from it without any API calls.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        names (list of str): Resource names
+        by_ids (callable): Takes a list of ids and returns the list of
+            resources that still exist.
+        by_names (callable): Takes a list of names and returns the list of
+            resources with any of those names.
+        name_of (callable): Returns the name of a resource.
+        quiet (bool): Don't report names that are not found
+
+    Returns:
+        dict: Name to resource or None
+    """
+    cache = NameCache(config)
+    names = list(dict.fromkeys(names))
+    found = {}
+    store = inventory.stored(config, kind)
+    if store is not None:
+        by_names = _stored(config, store, kind, names)
+
+    cached = {}
+    for name in names if store is None else []:
+        resource_id = cache.get(kind, name)
+        if resource_id is not None:
+            cached[name] = resource_id
+    if len(cached) > 0:
+        try:
+            existing = {r.id: r for r in by_ids(list(cached.values()))}
+        except ClientError:
+            existing = {}
+        for name, resource_id in cached.items():
+            resource = existing.get(resource_id)
+            if resource is not None and name_of(resource) == name:
+                found[name] = resource
+
+    missing = [name for name in names if name not in found]
+    if len(missing) > 0:
+        groups = {name: [] for name in missing}
+        for resource in by_names(missing):
+            name = name_of(resource)
+            if name in groups:
+                groups[name].append(resource)
+        for name, resource_list in groups.items():
+            if len(resource_list) == 0:
+                if not quiet:
+                    click.secho(f'{kind.capitalize()} "{name}" not found')
+                found[name] = None
+            elif len(resource_list) > 1:
+                click.secho(f'Multiple {kind}s with name "{name}" found.')
+                found[name] = None
+            else:
+                found[name] = resource_list[0]
+        cache.update(kind, {
+            name: found[name] and found[name].id for name in missing
+        })
+
+    return {name: found[name] for name in names}
@@ -0,0 +1,426 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import sqlite3
+import threading
+import collections
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from aws_ml_helper import boto
+
+
+STORE_FILE = 'spot-prices.sqlite'
+# Don't refresh the stored history if it is newer than this many seconds
+MIN_REFRESH = 60
+
+
+Key = collections.namedtuple(
+    'Key', ['region', 'availability_zone', 'product', 'instance_type']
+)
+
+
+def fetch(config, instance_types, start, end, products=None,
+          availability_zone=None, region=None):
+    """Fetch the full spot price history following all result pages.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        instance_types (list of str): Instance types
+        start (datetime.datetime): Start of the period
+        end (datetime.datetime): End of the period
+        products (list of str): Product descriptions, for example
+            `Linux/UNIX`. Default: all
+        availability_zone (str): Availability zone. Default: all
+        region (str): Region. Default: from configuration
+
+    Yields:
+        dict: Raw spot price history items
+    """
+    ec2 = boto.client('ec2', config, region)
+    kwargs = {
+        'StartTime': start,
+        'EndTime': end,
+        'InstanceTypes': list(instance_types),
+    }
+    if products:
+        kwargs['ProductDescriptions'] = list(products)
+    if availability_zone:
+        kwargs['AvailabilityZone'] = availability_zone
+    paginator = ec2.get_paginator('describe_spot_price_history')
+    for page in paginator.paginate(**kwargs):
+        yield from page['SpotPriceHistory']
+
+
+def series(region, items):
+    """Group raw history items into price series.
+
+    Args:
+        region (str): Region the items belong to
+        items (iterable): Raw spot price history items
+
+    Returns:
+        dict: `Key` to `(times, prices)` numpy arrays sorted by time, where
+            times are POSIX timestamps.
+    """
+    groups = collections.defaultdict(lambda: ([], []))
+    for item in items:
+        times, prices = groups[Key(
+            region, item['AvailabilityZone'], item['ProductDescription'],
+            item['InstanceType']
+        )]
+        times.append(item['Timestamp'].timestamp())
+        prices.append(float(item['SpotPrice']))
+
+    result = {}
+    for key, (times, prices) in groups.items():
+        times = np.array(times, dtype=np.float64)
+        prices = np.array(prices, dtype=np.float64)
+        order = np.argsort(times, kind='stable')
+        result[key] = (times[order], prices[order])
+    return result
+
+
+class PriceStore(object):
+    """Local SQLite store of the spot price history.
+
+    Prices are stored per region, instance type, availability zone and
+    product. For every region and instance type the store remembers the
+    period that was already fetched, so only the missing part of a period has
+    to be downloaded.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the SQLite database
+        """
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS prices (
+                region TEXT, instance_type TEXT, zone TEXT, product TEXT,
+                ts REAL, price REAL,
+                PRIMARY KEY (region, instance_type, zone, product, ts)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS coverage (
+                region TEXT, instance_type TEXT, start_ts REAL, end_ts REAL,
+                PRIMARY KEY (region, instance_type)
+            );
+        """)
+
+    @classmethod
+    def open(cls, config):
+        """Open the store next to the configuration file.
+
+        Args:
+            config (aws_ml_helper.config.Config): Configuration
+        """
+        return cls(os.path.join(os.path.dirname(config.config), STORE_FILE))
+
+    def coverage(self, region, instance_type):
+        """Returns the stored `(start, end)` period or `None`.
+
+        Args:
+            region (str): Region
+            instance_type (str): Instance type
+        """
+        with self._lock:
+            return self.db.execute(
+                'SELECT start_ts, end_ts FROM coverage '
+                'WHERE region = ? AND instance_type = ?',
+                (region, instance_type)
+            ).fetchone()
+
+    def add(self, region, instance_type, start, end, items):
+        """Store fetched history items and extend the stored period.
+
+        Args:
+            region (str): Region
+            instance_type (str): Instance type
+            start (float): Start of the fetched period as POSIX timestamp
+            end (float): End of the fetched period as POSIX timestamp
+            items (iterable): Raw spot price history items
+        """
+        rows = [
+            (region, instance_type, item['AvailabilityZone'],
+             item['ProductDescription'], item['Timestamp'].timestamp(),
+             float(item['SpotPrice']))
+            for item in items
+        ]
+        with self._lock, self.db:
+            self.db.executemany(
+                'INSERT OR IGNORE INTO prices VALUES (?, ?, ?, ?, ?, ?)', rows
+            )
+            self.db.execute(
+                'INSERT INTO coverage VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (region, instance_type) DO UPDATE SET '
+                'start_ts = MIN(start_ts, excluded.start_ts), '
+                'end_ts = MAX(end_ts, excluded.end_ts)',
+                (region, instance_type, start, end)
+            )
+
+    def series(self, region, instance_types, start, end, products=None,
+               availability_zone=None):
+        """Load price series from the store.
+
+        Args:
+            region (str): Region
+            instance_types (list of str): Instance types
+            start (float): Start of the period as POSIX timestamp
+            end (float): End of the period as POSIX timestamp
+            products (list of str): Product descriptions. Default: all
+            availability_zone (str): Availability zone. Default: all
+
+        Returns:
+            dict: `Key` to `(times, prices)` as returned by `series`
+        """
+        result = {}
+        with self._lock:
+            for instance_type in instance_types:
+                # Include the prices in effect at `start`
+                row = self.db.execute(
+                    'SELECT MIN(ts) FROM (SELECT MAX(ts) AS ts FROM prices '
+                    'WHERE region = ? AND instance_type = ? AND ts <= ? '
+                    'GROUP BY zone, product)',
+                    (region, instance_type, start)
+                ).fetchone()
+                lower = start if row[0] is None else row[0]
+                rows = self.db.execute(
+                    'SELECT zone, product, ts, price FROM prices '
+                    'WHERE region = ? AND instance_type = ? '
+                    'AND ts >= ? AND ts <= ? ORDER BY zone, product, ts',
+                    (region, instance_type, lower, end)
+                ).fetchall()
+                groups = collections.defaultdict(list)
+                for zone, product, ts, price in rows:
+                    if ((products and product not in products) or
+                            (availability_zone and
+                             zone != availability_zone)):
+                        continue
+                    groups[zone, product].append((ts, price))
+                for (zone, product), values in groups.items():
+                    values = np.array(values, dtype=np.float64)
+                    key = Key(region, zone, product, instance_type)
+                    result[key] = (values[:, 0], values[:, 1])
+        return result
+
+
+def history(config, instance_types, start, end, products=None,
+            availability_zone=None, refresh=True, region=None, store=None):
+    """Returns price series using the local store.
+
+    Only the parts of the period that are not stored yet are fetched. The
+    store always keeps all zones and products, filters are applied when
+    loading.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        instance_types (list of str): Instance types
+        start (datetime.datetime): Start of the period
+        end (datetime.datetime): End of the period
+        products (list of str): Product descriptions. Default: all
+        availability_zone (str): Availability zone. Default: all
+        refresh (bool): Fetch the missing parts of the period. If `False`
+            answer only from the local store.
+        region (str): Region. Default: from configuration
+        store (PriceStore): Store to use. Default: open the default store
+
+    Returns:
+        dict: `Key` to `(times, prices)` as returned by `series`
+    """
+    region = region or config.region
+    store = store or PriceStore.open(config)
+    start_ts, end_ts = start.timestamp(), end.timestamp()
+    for instance_type in instance_types if refresh else []:
+        stored = store.coverage(region, instance_type)
+        if stored is None:
+            windows = [(start_ts, end_ts)]
+        else:
+            windows = [(start_ts, stored[0]), (stored[1], end_ts)]
+        for window_start, window_end in windows:
+            if window_end - window_start < MIN_REFRESH:
+                continue
+            items = fetch(
+                config, [instance_type],
+                datetime.fromtimestamp(window_start, timezone.utc),
+                datetime.fromtimestamp(window_end, timezone.utc),
+                region=region
+            )
+            store.add(region, instance_type, window_start, window_end, items)
+    return store.series(region, instance_types, start_ts, end_ts, products,
+                        availability_zone)
+
+
+def compare(config, instance_types, regions, start, end, products=None,
+            refresh=True, workers=8, availability_zone=None):
+    """Returns price series for many instance types and regions.
+
+    Every region and instance type pair is fetched concurrently into one
+    shared store, so the wall time is close to that of a single fetch.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        instance_types (list of str): Instance types
+        regions (list of str): Regions
+        start (datetime.datetime): Start of the period
+        end (datetime.datetime): End of the period
+        products (list of str): Product descriptions. Default: all
+        refresh (bool): Fetch the missing parts of the period
+        workers (int): Number of concurrent fetches
+        availability_zone (str): Availability zone. Default: all
+
+    Returns:
+        dict: `Key` to `(times, prices)` as returned by `series`
+    """
+    store = PriceStore.open(config)
+    # Build the clients up front, so the workers don't race to load the
+    # service model.
+    for region in regions:
+        boto.client('ec2', config, region)
+    result = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(history, config, [instance_type], start, end,
+                            products, availability_zone, refresh=refresh,
+                            region=region, store=store)
+            for region in regions for instance_type in instance_types
+        ]
+        for future in futures:
+            result.update(future.result())
+    return result
+
+
+def stats(times, prices, start, end, bid=None, percentile=90):
+    """Calculate price statistics of a step function price series.
+
+    Every price is in effect from its timestamp until the next one, so all
+    statistics are weighted by the time the price was in effect inside the
+    `[start, end]` period.
+
+    Args:
+        times (numpy.ndarray): Sorted POSIX timestamps
+        prices (numpy.ndarray): Prices
+        start (float): Start of the period as POSIX timestamp
+        end (float): End of the period as POSIX timestamp
+        bid (float): If provided, calculate the share of time the price was
+            at or under the bid.
+        percentile (float): Additional percentile to calculate
+
+    Returns:
+        dict: min, max, mean, median, `p{percentile}`, volatility (time
+            weighted standard deviation relative to the mean), samples,
+            under_bid, mean_under_bid (mean price while at or under the bid)
+            and interruptions (number of times the price rose above the
+            bid). The bid statistics are `None` if no bid is provided.
+    """
+    # The price in effect at `start` is the last one set before it
+    first = max(int(np.searchsorted(times, start, side='right')) - 1, 0)
+    times = np.clip(times[first:], start, end)
+    prices = prices[first:]
+    durations = np.diff(np.append(times, end))
+    total = durations.sum()
+    if total <= 0:
+        durations = np.ones_like(prices)
+        total = durations.sum()
+
+    mean = float((prices * durations).sum() / total)
+    std = float(np.sqrt((durations * (prices - mean) ** 2).sum() / total))
+    order = np.argsort(prices, kind='stable')
+    sorted_prices = prices[order]
+    cumulative = np.cumsum(durations[order]) / total
+
+    def weighted_percentile(q):
+        i = int(np.searchsorted(cumulative, q / 100.0))
+        return float(sorted_prices[min(i, len(sorted_prices) - 1)])
+
+    result = {
+        'min': float(sorted_prices[0]),
+        'max': float(sorted_prices[-1]),
+        'mean': mean,
+        'median': weighted_percentile(50),
+        f'p{percentile:g}': weighted_percentile(percentile),
+        'volatility': std / mean if mean else 0.0,
+        'samples': len(prices),
+        'under_bid': None,
+        'mean_under_bid': None,
+        'interruptions': None,
+    }
+    if bid is not None:
+        under = prices <= bid
+        running = durations[under].sum()
+        result['under_bid'] = float(running / total)
+        result['mean_under_bid'] = (
+            float((prices[under] * durations[under]).sum() / running)
+            if running > 0 else None
+        )
+        result['interruptions'] = int((under[:-1] & ~under[1:]).sum())
+    return result
+
+
+def advise(groups, start, end, bid=None, percentile=90, headroom=0.0):
+    """Rank price series by the expected price of a spot instance.
+
+    If no bid is given, the bid for every series is its time weighted
+    `percentile` price increased by `headroom`. For every series the share
+    of time the price was at or under the bid is the availability, and the
+    score is the mean price paid while running divided by the availability.
+    Zones that are cheap but often over the bid therefore rank lower.
+
+    Args:
+        groups (dict): `Key` to `(times, prices)` as returned by `series`
+        start (float): Start of the period as POSIX timestamp
+        end (float): End of the period as POSIX timestamp
+        bid (float): Fixed bid. Default: calculate one per series
+        percentile (float): Percentile used to calculate the bid
+        headroom (float): Relative headroom over the percentile price, for
+            example `0.1` for 10%
+
+    Returns:
+        list of dict: Candidates sorted from best to worst with key, bid,
+            price (expected price while running), availability,
+            interruptions (per day) and score.
+    """
+    days = max((end - start) / 86400, 1 / 24)
+    candidates = []
+    for key, (times, prices) in groups.items():
+        zone_bid = bid
+        if zone_bid is None:
+            s = stats(times, prices, start, end, percentile=percentile)
+            zone_bid = round(s[f'p{percentile:g}'] * (1 + headroom), 4)
+        s = stats(times, prices, start, end, zone_bid, percentile)
+        if not s['under_bid']:
+            continue
+        candidates.append({
+            'key': key,
+            'bid': zone_bid,
+            'price': s['mean_under_bid'],
+            'availability': s['under_bid'],
+            'interruptions': s['interruptions'] / days,
+            'score': s['mean_under_bid'] / s['under_bid'],
+        })
+    candidates.sort(key=lambda c: c['score'])
+    return candidates
+
+
+def summarize(groups, start, end, bid=None, percentile=90):
+    """Calculate statistics for many price series.
+
+    Args:
+        groups (dict): `Key` to `(times, prices)` as returned by `series`
+        start (float): Start of the period as POSIX timestamp
+        end (float): End of the period as POSIX timestamp
+        bid (float): Bid used for the `under_bid` statistic
+        percentile (float): Additional percentile to calculate
+
+    Returns:
+        dict: `Key` to statistics as returned by `stats`
+    """
+    return {
+        key: stats(times, prices, start, end, bid, percentile)
+        for key, (times, prices) in groups.items()
+    }
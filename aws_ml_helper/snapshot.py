@@ -2,48 +2,78 @@ __author__ = 'Viktor Kerkez <alefnula@gmail.com>'
 __date__ = '22 March 2018'
 __copyright__ = 'Copyright (c)  2018 Viktor Kerkez'
 
-import click
-from tabulate import tabulate
-from aws_ml_helper import boto
-from aws_ml_helper.utils import name_from_tags
-from botocore.exceptions import WaiterError
+from aws_ml_helper import describe, inventory
+from aws_ml_helper.utils import name_from_tags, print_rows, PAGE_SIZE
+from aws_ml_helper.names import NameCache, resolve
+from aws_ml_helper.wait import all_ready, report
+
+
+def get_snapshots(config, names):
+    """Get several snapshots by name with a single describe call.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Snapshot names
+
+    Returns:
+        dict: Snapshot name to snapshot or None
+    """
+    def by_ids(snapshot_ids):
+        return [
+            describe.hydrate(config, 'snapshot', s)
+            for s in describe.items(config, 'snapshot',
+                                    SnapshotIds=snapshot_ids)
+        ]
+
+    def by_names(names):
+        return [
+            describe.hydrate(config, 'snapshot', s)
+            for s in describe.items(
+                config, 'snapshot',
+                Filters=[{'Name': 'tag:Name', 'Values': names}]
+            )
+        ]
+
+    return resolve(config, 'snapshot', names, by_ids, by_names,
+                   lambda s: name_from_tags(s.tags))
 
 
 def get_snapshot(config, name):
     """Get snapshot by name"""
-    ec2 = boto.resource('ec2', config)
-    snapshot_list = list(ec2.snapshots.filter(
-        Filters=[{'Name': 'tag:Name', 'Values': [name]}]
-    ))
-    if len(snapshot_list) == 0:
-        click.secho(f'Snapshot "{name}" not found')
-        return None
-    elif len(snapshot_list) > 1:
-        click.secho(f'Multiple snapshots with name "{name}" found.')
-        return None
-    return snapshot_list[0]
-
-
-def snapshots(config):
+    return get_snapshots(config, [name])[name]
+
+
+def snapshots(config, output='table', page_size=PAGE_SIZE,
+              all_regions=False):
     """List all snapshots
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
+        output (str): Output format, one of `aws_ml_helper.utils.OUTPUTS`
+        page_size (int): Number of snapshots requested per call
+        all_regions (bool): List snapshots in all enabled regions, fetched
+            concurrently, with their region.
     """
-    ec2 = boto.resource('ec2', config)
-    data = []
-    for i in ec2.snapshots.filter(OwnerIds=[config.account]):
-        data.append([
-            name_from_tags(i.tags),
-            i.id,
-            i.state,
-            i.volume_size,
-            i.description
-        ])
-    print(tabulate(
-        data, ['name', 'id', 'state', 'size', 'description'],
-        config.table_format
-    ))
+    if all_regions:
+        items = inventory.all_regions(config, 'snapshot', page_size)
+    else:
+        items = ((None, s)
+                 for s in inventory.items(config, 'snapshot', page_size))
+    rows = (
+        ((region,) if all_regions else ()) + (
+            name_from_tags(s.get('Tags')),
+            s['SnapshotId'],
+            s['State'],
+            s['VolumeSize'],
+            s.get('Description', '')
+        )
+        for region, s in items
+    )
+    headers = ['name', 'id', 'state', 'size', 'description']
+    widths = [30, 22, 10, 6, 40]
+    if all_regions:
+        headers, widths = ['region'] + headers, [16] + widths
+    print_rows(rows, headers, config, output, widths)
 
 
 def snapshot_create(config, volume_name, snapshot_name, default=False,
@@ -67,13 +97,12 @@ def snapshot_create(config, volume_name, snapshot_name, default=False,
             'Tags': [{'Key': 'Name', 'Value': snapshot_name}]
         }]
     )
+    NameCache(config).set('snapshot', snapshot_name, snapshot.id)
     if wait:
-        while True:
-            try:
-                snapshot.wait_until_completed()
-                break
-            except WaiterError:
-                pass
+        # Snapshots of large volumes can take hours
+        all_ready(config, 'snapshot', [snapshot.id], {'completed'},
+                  failed={'error'}, timeout=None,
+                  progress=report(f'Snapshot {snapshot_name}'))
 
     if default:
         config.snapshot_id = snapshot.id
@@ -0,0 +1,82 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import collections
+
+
+Spec = collections.namedtuple(
+    'Spec', ['vcpus', 'gpus', 'memory', 'on_demand']
+)
+
+
+# Instance type: Spec(vCPUs, GPUs, memory in GiB, on-demand price)
+#
+# On-demand prices are Linux prices in USD per hour in us-east-1. They are
+# only used as a reference point for spot prices.
+INSTANCE_TYPES = {
+    'p2.xlarge': Spec(4, 1, 61, 0.9),
+    'p2.8xlarge': Spec(32, 8, 488, 7.2),
+    'p2.16xlarge': Spec(64, 16, 732, 14.4),
+    'p3.2xlarge': Spec(8, 1, 61, 3.06),
+    'p3.8xlarge': Spec(32, 4, 244, 12.24),
+    'p3.16xlarge': Spec(64, 8, 488, 24.48),
+    'p3dn.24xlarge': Spec(96, 8, 768, 31.212),
+    'p4d.24xlarge': Spec(96, 8, 1152, 32.7726),
+    'g3s.xlarge': Spec(4, 1, 30.5, 0.75),
+    'g3.4xlarge': Spec(16, 1, 122, 1.14),
+    'g3.8xlarge': Spec(32, 2, 244, 2.28),
+    'g3.16xlarge': Spec(64, 4, 488, 4.56),
+    'g4dn.xlarge': Spec(4, 1, 16, 0.526),
+    'g4dn.2xlarge': Spec(8, 1, 32, 0.752),
+    'g4dn.4xlarge': Spec(16, 1, 64, 1.204),
+    'g4dn.8xlarge': Spec(32, 1, 128, 2.176),
+    'g4dn.12xlarge': Spec(48, 4, 192, 3.912),
+    'g4dn.16xlarge': Spec(64, 1, 256, 4.352),
+    'g4dn.metal': Spec(96, 8, 384, 7.824),
+    'g5.xlarge': Spec(4, 1, 16, 1.006),
+    'g5.2xlarge': Spec(8, 1, 32, 1.212),
+    'g5.4xlarge': Spec(16, 1, 64, 1.624),
+    'g5.8xlarge': Spec(32, 1, 128, 2.448),
+    'g5.12xlarge': Spec(48, 4, 192, 5.672),
+    'g5.16xlarge': Spec(64, 1, 256, 4.096),
+    'g5.24xlarge': Spec(96, 4, 384, 8.144),
+    'g5.48xlarge': Spec(192, 8, 768, 16.288),
+    'c5.large': Spec(2, 0, 4, 0.085),
+    'c5.xlarge': Spec(4, 0, 8, 0.17),
+    'c5.2xlarge': Spec(8, 0, 16, 0.34),
+    'c5.4xlarge': Spec(16, 0, 32, 0.68),
+    'c5.9xlarge': Spec(36, 0, 72, 1.53),
+    'c5.18xlarge': Spec(72, 0, 144, 3.06),
+    'm5.large': Spec(2, 0, 8, 0.096),
+    'm5.xlarge': Spec(4, 0, 16, 0.192),
+    'm5.2xlarge': Spec(8, 0, 32, 0.384),
+    'm5.4xlarge': Spec(16, 0, 64, 0.768),
+    'm5.12xlarge': Spec(48, 0, 192, 2.304),
+    'm5.24xlarge': Spec(96, 0, 384, 4.608),
+}
+
+
+def per_unit(instance_type, price, unit):
+    """Returns the price per GPU or vCPU, or `None` if unknown.
+
+    Args:
+        instance_type (str): Instance type
+        price (float): Instance price
+        unit (str): `gpu` or `vcpu`
+    """
+    spec = INSTANCE_TYPES.get(instance_type)
+    count = spec and (spec.gpus if unit == 'gpu' else spec.vcpus)
+    if not count:
+        return None
+    return price / count
+
+
+def on_demand(instance_type):
+    """Returns the reference on-demand price or `None` if unknown.
+
+    Args:
+        instance_type (str): Instance type
+    """
+    spec = INSTANCE_TYPES.get(instance_type)
+    return spec and spec.on_demand
@@ -3,23 +3,381 @@ __date__ = '20 October 2010'
 __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 
 import click
-from tabulate import tabulate
-from aws_ml_helper import boto
-from datetime import datetime, timedelta
-from aws_ml_helper.instance import run
-from aws_ml_helper.utils import name_from_tags
-from aws_ml_helper.snapshot import get_snapshot
-from aws_ml_helper.volume import volume_attach, get_volume, volume_create
+import shlex
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import boto, specs, ssh, wait
+from datetime import datetime, timedelta, timezone
+from aws_ml_helper.instance import tag_names
+from aws_ml_helper.utils import name_from_tags, expand_names
+from aws_ml_helper.names import NameCache
+from aws_ml_helper.snapshot import get_snapshots
+from aws_ml_helper.volume import get_volumes
 
 
-def start_spot_instance(config, name, bid_price, ami_id=None,
+# Volume mounted on a spot instance. If it doesn't exist it's created from
+# the snapshot.
+Volume = collections.namedtuple('Volume', ['name', 'mount_point', 'snapshot'])
+
+# Device names used for the attached volumes, in order
+DEVICES = [f'xvd{c}' for c in 'hijklmnop']
+# Seconds to wait for an attached volume device to show up
+MOUNT_TIMEOUT = 120
+
+
+def _subnets(config):
+    """Returns a dictionary of availability zone to subnet id of the VPC.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+    """
+    ec2 = boto.client('ec2', config)
+    response = ec2.describe_subnets(
+        Filters=[{'Name': 'vpc-id', 'Values': [config.vpc_id]}]
+    )
+    subnets = {s['AvailabilityZone']: s['SubnetId']
+               for s in response['Subnets']}
+    # The configured subnet always wins for its zone
+    subnets[config.availability_zone] = config.subnet_id
+    return subnets
+
+
+def advise(config, instance_type=None, bid_price=None, zones=None, days=30,
+           percentile=None, headroom=None, product='Linux/UNIX'):
+    """Pick the availability zone and bid using the spot price history.
+
+    Candidates are ranked by `prices.advise` and printed together with the
+    expected cost compared with the on-demand price.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        instance_type (str): Instance type. Default: from configuration
+        bid_price (float): Fixed bid. Default: calculate it from the history
+        zones (list of str): Consider only these availability zones.
+            Default: all zones in the region.
+        days (int): Use the history of the last n days. Default: 30
+        percentile (float): Percentile of the price history used as the bid.
+            Default: from configuration
+        headroom (float): Relative headroom over the percentile price.
+            Default: from configuration
+        product (str): Product description. Default: Linux/UNIX
+
+    Returns:
+        tuple: `(availability zone, bid)` or `None` if there is no history.
+    """
+    from tabulate import tabulate
+    from aws_ml_helper import prices
+    instance_type = instance_type or config.instance_type
+    percentile = float(percentile or config.spot_percentile)
+    if headroom is None:
+        headroom = float(config.spot_headroom)
+    end_time = datetime.now(timezone.utc)
+    start_time = end_time - timedelta(days=days)
+    groups = prices.history(config, [instance_type], start_time, end_time,
+                            products=[product])
+    if zones is not None:
+        groups = {k: v for k, v in groups.items()
+                  if k.availability_zone in zones}
+    candidates = prices.advise(groups, start_time.timestamp(),
+                               end_time.timestamp(), bid_price, percentile,
+                               headroom)
+    if len(candidates) == 0:
+        click.secho('No usable spot price history found.', fg='red')
+        return None
+
+    on_demand = specs.on_demand(instance_type)
+    data = []
+    for c in candidates:
+        data.append([
+            c['key'].availability_zone, c['bid'], c['price'],
+            f'{c["availability"]:.1%}', c['interruptions'], c['score'],
+            on_demand and f'{1 - c["score"] / on_demand:.0%}'
+        ])
+    print(tabulate(
+        data, ['zone', 'bid', 'price', 'available', 'interrupts/day',
+               'expected', 'saving'],
+        config.table_format, floatfmt='.4f', missingval='-'
+    ))
+    best = candidates[0]
+    message = (f'Expected cost: ${best["score"]:.4f}/h in '
+               f'{best["key"].availability_zone} with bid ${best["bid"]}')
+    if on_demand:
+        message += f' (on-demand: ${on_demand:.4f}/h)'
+    click.echo(message)
+    return best['key'].availability_zone, best['bid']
+
+
+def _fulfilled(config, request_ids):
+    """Wait until all spot requests have an instance.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        request_ids (list of str): Spot instance request ids
+
+    Returns:
+        dict: Request id to instance id
+    """
+    ec2 = boto.client('ec2', config)
+
+    def fetch():
+        requests = ec2.describe_spot_instance_requests(
+            SpotInstanceRequestIds=request_ids
+        )['SpotInstanceRequests']
+        failed = [r for r in requests
+                  if r['State'] in ('failed', 'cancelled', 'closed')]
+        if failed:
+            raise wait.WaitError(', '.join(
+                f'{r["SpotInstanceRequestId"]}: {r["Status"]["Message"]}'
+                for r in failed
+            ))
+        return {r['SpotInstanceRequestId']: r.get('InstanceId')
+                for r in requests}
+
+    report = wait.report('Spot requests fulfilled')
+
+    def progress(instances, elapsed):
+        if instances is not None:
+            report(f'{sum(1 for i in instances.values() if i)}/'
+                   f'{len(request_ids)}', elapsed)
+
+    return wait.until(fetch, lambda instances: all(instances.values()),
+                      progress=progress, description='Spot requests')
+
+
+def _volume_plan(config, names, volumes, snapshot_name, mount_point):
+    """Returns the volumes that should be mounted on every instance.
+
+    Without explicit volumes every instance gets one volume with its own
+    name, mounted on the mount point. Volume names are expanded like
+    instance names, so in a fleet `data-{i}` is mounted on the i-th instance.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Instance names
+        volumes (list of Volume): Volumes for every instance
+        snapshot_name (str): Snapshot for the default volume
+        mount_point (str): Mount point for the default volume. Default: from
+            configuration
+
+    Returns:
+        dict: Instance name to list of `Volume`
+    """
+    if not volumes:
+        mount_point = mount_point or config.mount_point
+        if mount_point in ('', None):
+            # Mount point is not defined we don't know where to mount it
+            return {}
+        return {n: [Volume(n, mount_point, snapshot_name)] for n in names}
+    expanded = [expand_names(v.name, len(names)) for v in volumes]
+    return {
+        n: [Volume(e[i], v.mount_point, v.snapshot or snapshot_name)
+            for v, e in zip(volumes, expanded)]
+        for i, n in enumerate(names)
+    }
+
+
+def _volume_sources(config, plan, existing, availability_zone):
+    """Find the snapshots for the volumes that don't exist yet.
+
+    Volumes without a snapshot are removed from the plan.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        plan (dict): Instance name to list of `Volume`
+        existing (dict): Volume name to existing volume or `None`
+        availability_zone (str): Availability zone of the instances
+
+    Returns:
+        dict: Volume name to snapshot, or `None` if an existing volume is in
+            another availability zone or is not available.
+    """
+    for volume in existing.values():
+        if volume is None:
+            continue
+        if volume.availability_zone != availability_zone:
+            click.secho(f'Volume "{name_from_tags(volume.tags)}" is in '
+                        f'{volume.availability_zone}, not in '
+                        f'{availability_zone}.', fg='red')
+            return None
+        if volume.state != 'available':
+            click.secho(f'Volume "{name_from_tags(volume.tags)}" is '
+                        f'{volume.state}.', fg='red')
+            return None
+    missing = [v for vs in plan.values() for v in vs
+               if existing.get(v.name) is None]
+    snapshots = get_snapshots(
+        config, sorted({v.snapshot for v in missing if v.snapshot})
+    )
+    default = None
+    if config.snapshot_id not in ('', None):
+        default = boto.resource('ec2', config).Snapshot(config.snapshot_id)
+    sources = {}
+    for v in missing:
+        snapshot = snapshots[v.snapshot] if v.snapshot else default
+        if snapshot is None:
+            click.echo(f'No snapshot for volume "{v.name}" - not mounting')
+        else:
+            sources[v.name] = snapshot
+    for n, vs in plan.items():
+        plan[n] = [v for v in vs
+                   if existing.get(v.name) is not None or v.name in sources]
+    return sources
+
+
+def _create_volumes(config, sources, availability_zone):
+    """Start creating volumes from snapshots without waiting for them.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        sources (dict): Volume name to snapshot
+        availability_zone (str): Availability zone
+
+    Returns:
+        dict: Volume name to volume id
+    """
+    ec2 = boto.client('ec2', config)
+    ids = {}
+    for name, snapshot in sorted(sources.items()):
+        click.echo(f'Creating volume "{name}" from snapshot '
+                   f'"{name_from_tags(snapshot.tags) or snapshot.id}"')
+        ids[name] = ec2.create_volume(
+            AvailabilityZone=availability_zone,
+            Size=snapshot.volume_size,
+            SnapshotId=snapshot.id,
+            VolumeType='gp2',
+            TagSpecifications=[{
+                'ResourceType': 'volume',
+                'Tags': [{'Key': 'Name', 'Value': name}]
+            }]
+        )['VolumeId']
+    if ids:
+        NameCache(config).update('volume', ids)
+    return ids
+
+
+def _attachment_state(kind, item):
+    """Returns the attachment state of a raw volume item."""
+    attachments = item.get('Attachments') or [{}]
+    return attachments[0].get('State')
+
+
+def _mount_script(volume_id, device, mount_point, timeout=MOUNT_TIMEOUT):
+    """Returns a shell script that mounts a volume once its device appears.
+
+    On Nitro instances EBS volumes show up as NVMe devices and the requested
+    device name is only available as a link created by udev, so all names
+    are tried.
+
+    Args:
+        volume_id (str): Volume id
+        device (str): Requested device name, for example `xvdh`
+        mount_point (str): Mount point
+        timeout (int): Seconds to wait for the device
+    """
+    candidates = ' '.join([
+        f'/dev/{device}', f'/dev/sd{device[3:]}',
+        '/dev/disk/by-id/nvme-Amazon_Elastic_Block_Store_'
+        f'{volume_id.replace("-", "")}'
+    ])
+    mount_point = shlex.quote(mount_point)
+    return (
+        f'for _ in $(seq {timeout}); do '
+        f'for d in {candidates}; do '
+        f'if [ -b "$d" ]; then '
+        f'sudo mkdir -p {mount_point} && sudo mount "$d" {mount_point}; '
+        f'exit $?; fi; done; sleep 1; done; '
+        f'echo "Device for {volume_id} not found" >&2; exit 1'
+    )
+
+
+def _ssh_ready(config, ip, timeout=wait.TIMEOUT):
+    """Wait until the instance accepts SSH connections.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        ip (str): Instance IP address
+        timeout (float): Overall timeout in seconds
+    """
+    import paramiko
+
+    def fetch():
+        try:
+            with ssh.connect(config, ip, timeout=5):
+                return 'ready'
+        except (OSError, paramiko.SSHException):
+            return 'booting'
+
+    wait.until(fetch, {'ready'}, timeout=timeout, description=f'SSH on {ip}')
+
+
+def _mount_volumes(config, plan, volume_ids, instance_ids, running,
+                   workers=8):
+    """Attach the volumes and mount them when the devices appear.
+
+    Volumes still being created are waited on with one batched waiter, and
+    attached as soon as all of them are available. Mounting is gated on the
+    attachment state and on the device showing up on the instance. Instances
+    are mounted concurrently.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        plan (dict): Instance name to list of `Volume`
+        volume_ids (dict): Volume name to volume id
+        instance_ids (dict): Instance name to instance id
+        running (dict): Instance id to raw instance item
+        workers (int): Maximal number of concurrent SSH sessions
+    """
+    wait.all_ready(config, 'volume', sorted(set(volume_ids.values())),
+                   {'available'}, failed={'error'},
+                   progress=wait.report('Volume'))
+    ec2 = boto.client('ec2', config)
+    devices = {}
+    for n, vs in plan.items():
+        for v, device in zip(vs, DEVICES):
+            click.echo(f'Attaching volume "{v.name}" to "{n}"')
+            ec2.attach_volume(Device=device, InstanceId=instance_ids[n],
+                              VolumeId=volume_ids[v.name])
+            devices[v.name] = device
+    wait.all_ready(config, 'volume', sorted(set(volume_ids.values())),
+                   {'attached'}, timeout=300, state_of=_attachment_state,
+                   progress=wait.report('Volume'))
+
+    def mount(n):
+        ip = running[instance_ids[n]]['PublicIpAddress']
+        _ssh_ready(config, ip)
+        with ssh.connect(config, ip) as client:
+            for v in plan[n]:
+                result = ssh.execute(client, _mount_script(
+                    volume_ids[v.name], devices[v.name], v.mount_point
+                ))
+                if result.exit_status == 0:
+                    click.echo(f'Volume "{v.name}" mounted on '
+                               f'{n}:{v.mount_point}')
+                else:
+                    click.secho(f'Failed to mount volume "{v.name}" on '
+                                f'"{n}": {result.err.strip()}', fg='red')
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        list(executor.map(mount, [n for n, vs in plan.items() if vs]))
+
+
+def start_spot_instance(config, name, bid_price=None, ami_id=None,
                         instance_type=None, snapshot_name=None,
-                        mount_point=None):
-    """Starts a spot instance.
+                        mount_point=None, auto_bid=False, auto_az=False,
+                        percentile=None, headroom=None, days=30, count=1,
+                        volumes=None):
+    """Starts one or more spot instances.
+
+    All instances are requested with a single request and waited on with
+    one batched waiter. Volumes that don't exist yet are created from their
+    snapshots right after the request, so they are ready by the time the
+    instances are running. They are attached afterwards and mounted as soon
+    as their devices show up.
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
-        name (str): Spot instance name
+        name (str): Spot instance name or name pattern, for example
+            `worker-{i}`
         bid_price (int): Bidding price for the instance
         ami_id (str): AMI id to use. If not provided, value form the
             configuration will be used
@@ -28,10 +386,54 @@ def start_spot_instance(config, name, bid_price, ami_id=None,
         snapshot_name (str): Name of the snapshot from which the attached
             volume will be created
         mount_point (str): Path where the volume should be mounted
+        auto_bid (bool): Calculate the bid from the price history
+        auto_az (bool): Pick the availability zone from the price history.
+            Only zones that have a subnet in the VPC are considered.
+        percentile (float): Percentile used for the automatic bid
+        headroom (float): Headroom used for the automatic bid
+        days (int): Price history period used by the advisor. Default: 30
+        count (int): Number of instances
+        volumes (list of Volume): Volumes to mount on every instance instead
+            of the single volume named after the instance. Volume names can
+            be patterns like instance names.
     """
+    names = expand_names(name, count)
+    plan = _volume_plan(config, names, volumes, snapshot_name, mount_point)
+    existing = get_volumes(
+        config, sorted({v.name for vs in plan.values() for v in vs}),
+        quiet=True
+    )
+    availability_zone = config.availability_zone
+    subnet_id = config.subnet_id
+    if auto_bid or auto_az:
+        zones = [availability_zone]
+        if auto_az:
+            subnets = _subnets(config)
+            zones = list(subnets)
+            # Existing volumes can only be attached in their own zone
+            volume_zones = {v.availability_zone for v in existing.values()
+                            if v is not None}
+            if len(volume_zones) == 1 and volume_zones <= set(subnets):
+                zones = list(volume_zones)
+        advice = advise(
+            config, instance_type, None if auto_bid else bid_price,
+            zones=zones,
+            days=days, percentile=percentile, headroom=headroom
+        )
+        if advice is None:
+            return
+        if auto_az:
+            availability_zone = advice[0]
+            subnet_id = subnets[availability_zone]
+        if auto_bid:
+            bid_price = advice[1]
+    sources = _volume_sources(config, plan, existing, availability_zone)
+    if sources is None:
+        return
+
     ec2 = boto.client('ec2', config)
     response = ec2.request_spot_instances(
-        InstanceCount=1,
+        InstanceCount=len(names),
         Type='one-time',
         LaunchSpecification={
             'ImageId': ami_id or config.ami_id,
@@ -39,7 +441,7 @@ def start_spot_instance(config, name, bid_price, ami_id=None,
             'KeyName': f'access-key-{config.vpc_name}',
             'EbsOptimized': True,
             'Placement': {
-                'AvailabilityZone': config.availability_zone,
+                'AvailabilityZone': availability_zone,
             },
             # 'BlockDeviceMappings': [
             #     {
@@ -58,7 +460,7 @@ def start_spot_instance(config, name, bid_price, ami_id=None,
                     'DeviceIndex': 0,
                     'AssociatePublicIpAddress': True,
                     'Groups': [config.ec2_security_group_id],
-                    'SubnetId': config.subnet_id
+                    'SubnetId': subnet_id
                 },
             ],
         },
@@ -66,108 +468,148 @@ def start_spot_instance(config, name, bid_price, ami_id=None,
         InstanceInterruptionBehavior='terminate'
     )
     click.echo('Spot instance request created.')
-    request_id = response['SpotInstanceRequests'][0]['SpotInstanceRequestId']
-    waiter = ec2.get_waiter('spot_instance_request_fulfilled')
-    waiter.wait(SpotInstanceRequestIds=[request_id])
-    response = ec2.describe_spot_instance_requests(
-        SpotInstanceRequestIds=[request_id]
-    )
-    instance_id = response['SpotInstanceRequests'][0]['InstanceId']
-    waiter = ec2.get_waiter('instance_running')
-    waiter.wait(InstanceIds=[instance_id])
-    click.echo(f'Spot Instance ID: {instance_id}')
-    ec2.create_tags(Resources=[instance_id],
-                    Tags=[{'Key': 'Name', 'Value': name}])
-    response = ec2.describe_instances(
-        InstanceIds=[instance_id],
-        Filters=[{'Name': 'instance-state-name', 'Values': ['running']}]
-    )
-    instance_ip = (
-        response['Reservations'][0]['Instances'][0]['PublicIpAddress']
-    )
-    click.echo(f'Spot Instance IP: {instance_ip}')
-
-    mount_point = mount_point or config.mount_point
-    if mount_point in ('', None):
-        # Mount point is not defined we don't know where to mount the volume
-        return
-
-    ec2 = boto.resource('ec2', config)
-    # Search for a volume with the same name
-    volume = get_volume(config, name)
-    if volume is not None:
-        click.echo(f'Volume "{name}" found - attaching')
-        # Attach the volume
-        volume_attach(config, name, name, device='xvdh')
-        run(config, name, f'sudo mount /dev/xvdh {mount_point}')
+    volume_ids = {n: v.id for n, v in existing.items() if v is not None}
+    volume_ids.update(_create_volumes(config, sources, availability_zone))
+    request_ids = [r['SpotInstanceRequestId']
+                   for r in response['SpotInstanceRequests']]
+    instances = _fulfilled(config, request_ids)
+    ids = dict(zip(names, [instances[r] for r in request_ids]))
+    if len(names) == 1:
+        ec2.create_tags(Resources=list(ids.values()),
+                        Tags=[{'Key': 'Name', 'Value': names[0]}])
     else:
-        if snapshot_name is not None:
-            snapshot = get_snapshot(config, snapshot_name)
-        elif config.snapshot_id not in ('', None):
-            snapshot = ec2.Snapshot(config.snapshot_id)
-            snapshot_name = name_from_tags(snapshot.tags)
-        else:
-            # Snapshot not found return
-            return
-        click.echo(f'Creating volume "{name}" from snapshot "{snapshot_name}"')
-        volume_create(config, name, size=snapshot.volume_size,
-                      snapshot_name=snapshot_name, wait=True)
-        click.echo(f'Attaching volume "{name}"')
-        volume_attach(config, name, name, device='xvdh')
-        run(config, name, f'sudo mount /dev/xvdh {mount_point}')
-
-
-def median(l):
-    """Calculate median value of the list
-
-    Args:
-        l (list of float): List of numbers
-    """
-    length = len(l)
-    sorted_l = sorted(l)
-    index = (length - 1) // 2
-
-    if length % 2 == 0:
-        return (sorted_l[index] + sorted_l[index + 1]) / 2.0
+        ec2.create_tags(Resources=list(ids.values()),
+                        Tags=[{'Key': 'Group', 'Value': name}])
+        tag_names(config, ids)
+    NameCache(config).update('instance', ids)
+    running = wait.all_ready(config, 'instance', list(ids.values()),
+                             {'running'},
+                             failed={'shutting-down', 'terminated'},
+                             progress=wait.report('Spot Instance'))
+    if len(names) == 1:
+        instance_id = ids[names[0]]
+        click.echo(f'Spot Instance ID: {instance_id}')
+        click.echo(f'Spot Instance IP: '
+                   f'{running[instance_id]["PublicIpAddress"]}')
     else:
-        return sorted_l[index]
+        from tabulate import tabulate
+        print(tabulate(
+            [[n, ids[n], running[ids[n]].get('PublicIpAddress', '')]
+             for n in names],
+            ['name', 'id', 'ip'], config.table_format
+        ))
+    if volume_ids:
+        _mount_volumes(config, plan, volume_ids, ids, running)
 
 
-def spot_price(config, days=7, instance_type=None, value='all'):
+def spot_price(config, days=7, instance_type=None, value='all',
+               availability_zone=None, product=None, bid=None,
+               percentile=90, offline=False, regions=None, rank_by='mean',
+               workers=8):
     """Show information about spot instance prices in the last n days
 
+    The history is kept in a local store and only the part that is not
+    stored yet is fetched. The statistics are calculated per
+    availability zone, product and instance type. Prices are step functions,
+    so all statistics are weighted by the time a price was in effect.
+
+    If more than one instance type or region is selected, the histories are
+    fetched concurrently and a table ranked by `rank_by` is shown. The
+    comparison shows the mean and percentile prices, and the share of time
+    under the bid if a bid is given, so `value` must be `all`. A zone
+    belongs to one region, so `availability_zone` can't be used to compare
+    regions.
+
     Args:
         config (aws_ml_helper.config.Config): Configuration
         days (int): Show information for the last n days
-        instance_type (str): Select instance type. If not provided function
-            will use the value in the configuration.
+        instance_type (str or list of str): Select instance types. If not
+            provided function will use the value in the configuration.
         value (str): Pick which value to show. Default all.
+        availability_zone (str): Show only this availability zone.
+            Default: all zones in the region.
+        product (str): Show only this product, for example `Linux/UNIX`.
+            Default: all products.
+        bid (float): Show the share of time the price was under the bid.
+        percentile (float): Additional percentile to show. Default: 90
+        offline (bool): Use only the locally stored history
+        regions (list of str): Compare these regions. Default: the region
+            from the configuration.
+        rank_by (str): Rank the comparison by `mean` price, price per `gpu`
+            or price per `vcpu`. Default: mean
+        workers (int): Number of concurrent fetches when comparing
     """
-    end_time = datetime.now()
+    from tabulate import tabulate
+    from aws_ml_helper import prices
+    end_time = datetime.now(timezone.utc)
     start_time = end_time - timedelta(days=days)
+    if isinstance(instance_type, str):
+        instance_type = [instance_type]
+    instance_types = list(instance_type or [config.instance_type])
+    regions = list(regions or [config.region])
+    comparison = len(instance_types) > 1 or len(regions) > 1
 
-    ec2 = boto.client('ec2', config)
-
-    r = ec2.describe_spot_price_history(
-        StartTime=start_time,
-        EndTime=end_time,
-        InstanceTypes=[instance_type or config.instance_type],
-    )
+    if comparison:
+        groups = prices.compare(
+            config, instance_types, regions, start_time, end_time,
+            products=product and [product], refresh=not offline,
+            workers=workers, availability_zone=availability_zone
+        )
+    else:
+        groups = prices.history(
+            config, instance_types, start_time, end_time,
+            products=product and [product],
+            availability_zone=availability_zone, refresh=not offline,
+            region=regions[0]
+        )
+    if len(groups) == 0:
+        click.secho('No spot price history found.', fg='red')
+        return
+    summary = prices.summarize(groups, start_time.timestamp(),
+                               end_time.timestamp(), bid, percentile)
+    p = f'p{percentile:g}'
 
-    prices = [float(p['SpotPrice']) for p in r['SpotPriceHistory']]
+    if comparison:
+        headers = ['region', 'zone', 'product', 'type', 'mean', p, '$/GPU',
+                   '$/vCPU']
+        if bid is not None:
+            headers.append('under bid')
+        data = []
+        for key, s in summary.items():
+            row = [key.region, key.availability_zone, key.product,
+                   key.instance_type, s['mean'], s[p],
+                   specs.per_unit(key.instance_type, s['mean'], 'gpu'),
+                   specs.per_unit(key.instance_type, s['mean'], 'vcpu')]
+            if bid is not None:
+                row.append(f'{s["under_bid"]:.0%}')
+            rank = {'mean': row[4], 'gpu': row[6], 'vcpu': row[7]}[rank_by]
+            data.append((rank is None, rank, row))
+        data.sort(key=lambda r: r[:2])
+        print(tabulate(
+            [row for _, _, row in data], headers,
+            config.table_format, floatfmt='.4f', missingval='-'
+        ))
+        return
 
-    if value == 'all':
+    if value != 'all':
+        if len(summary) == 1:
+            print(list(summary.values())[0][value])
+            return
         print(tabulate([
-            ['Min', min(prices)],
-            ['Max', max(prices)],
-            ['Mean', sum(prices) / len(prices)],
-            ['Median', median(prices)]
-        ], tablefmt=config.table_format, floatfmt='.3f'))
-    elif value == 'min':
-        print(min(prices))
-    elif value == 'max':
-        print(max(prices))
-    elif value == 'mean':
-        print(sum(prices) / len(prices))
-    elif value == 'median':
-        print(median(prices))
+            [key.availability_zone, key.product, s[value]]
+            for key, s in sorted(summary.items())
+        ], ['zone', 'product', value], config.table_format, floatfmt='.3f'))
+        return
+
+    headers = ['zone', 'product', 'min', 'max', 'mean', 'median', p,
+               'volatility']
+    if bid is not None:
+        headers.append('under bid')
+    data = []
+    for key, s in sorted(summary.items()):
+        row = [key.availability_zone, key.product, s['min'], s['max'],
+               s['mean'], s['median'], s[p], s['volatility']]
+        if bid is not None:
+            row.append(f'{s["under_bid"]:.0%}')
+        data.append(row)
+    print(tabulate(data, headers, config.table_format, floatfmt='.3f'))
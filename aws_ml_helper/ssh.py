@@ -0,0 +1,270 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import time
+import atexit
+import select
+import socket
+import threading
+import contextlib
+import collections
+from aws_ml_helper import tracing
+
+
+CONTROL_PATH = '~/.aws-ml-helper/cm-%r@%h:%p'
+# Number of the last output lines kept in memory by `execute`
+MAX_LINES = 10000
+
+
+Result = collections.namedtuple('Result', ['out', 'err', 'exit_status'])
+
+
+class ConnectionPool(object):
+    """Cache of authenticated SSH connections.
+
+    Connections are kept per (host, username, key file) and reused as long
+    as their transport is alive. Each command or transfer opens a new channel
+    on the cached transport instead of doing a full handshake.
+
+    Connections are leased with `lease` and counted while they are in use.
+    Connections that are not in use and were released more than
+    `idle_timeout` seconds ago are closed.
+    """
+
+    def __init__(self, idle_timeout=300):
+        """
+        Args:
+            idle_timeout (float): Close connections idle for longer than this
+                many seconds.
+        """
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # Key to [client, last used, number of leases]
+        self._connections = {}
+
+    def get(self, host, username, key_filename, timeout=None):
+        """Returns a connected `paramiko.SSHClient` and marks it as in use.
+
+        Every `get` must be followed by a `release` of the client, `lease`
+        does both.
+
+        Args:
+            host (str): Host address
+            username (str): Username
+            key_filename (str): Path to the private key
+            timeout (float): TCP connect timeout in seconds
+        """
+        key = (host, username, key_filename)
+        self.evict()
+        with self._lock:
+            entry = self._connections.get(key)
+            if entry is not None:
+                ssh = entry[0]
+                transport = ssh.get_transport()
+                if transport is not None and transport.is_active():
+                    entry[2] += 1
+                    return ssh
+                ssh.close()
+                del self._connections[key]
+
+        import paramiko
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        with tracing.timed('ssh.connect'):
+            ssh.connect(host, username=username, key_filename=key_filename,
+                        timeout=timeout)
+        with self._lock:
+            # Another thread may have connected in the meantime
+            entry = self._connections.get(key)
+            if entry is not None:
+                ssh.close()
+                entry[2] += 1
+                return entry[0]
+            self._connections[key] = [ssh, time.time(), 1]
+        return ssh
+
+    def release(self, host, username, key_filename, ssh):
+        """Mark a connection returned by `get` as no longer in use.
+
+        Args:
+            host (str): Host address
+            username (str): Username
+            key_filename (str): Path to the private key
+            ssh (paramiko.SSHClient): The connection
+        """
+        with self._lock:
+            entry = self._connections.get((host, username, key_filename))
+            if entry is not None and entry[0] is ssh:
+                entry[1] = time.time()
+                entry[2] -= 1
+
+    @contextlib.contextmanager
+    def lease(self, host, username, key_filename, timeout=None):
+        """Use a connection for the duration of the block.
+
+        Args:
+            host (str): Host address
+            username (str): Username
+            key_filename (str): Path to the private key
+            timeout (float): TCP connect timeout in seconds
+        """
+        ssh = self.get(host, username, key_filename, timeout)
+        try:
+            yield ssh
+        finally:
+            self.release(host, username, key_filename, ssh)
+
+    def evict(self, max_idle=None):
+        """Close connections that are not in use and were released more than
+        `max_idle` seconds ago.
+
+        Args:
+            max_idle (float): Maximal idle time. Default: `idle_timeout`
+        """
+        max_idle = self.idle_timeout if max_idle is None else max_idle
+        now = time.time()
+        with self._lock:
+            for key, (ssh, last_used, leases) in list(
+                    self._connections.items()):
+                if leases <= 0 and now - last_used > max_idle:
+                    ssh.close()
+                    del self._connections[key]
+
+    def close_all(self):
+        """Close all connections, including the ones in use."""
+        with self._lock:
+            for ssh, _, _ in self._connections.values():
+                ssh.close()
+            self._connections.clear()
+
+
+pool = ConnectionPool()
+atexit.register(pool.close_all)
+
+
+def connect(config, host, timeout=None):
+    """Lease a pooled SSH connection to the host.
+
+    Use as a context manager, the connection stays in the pool and is not
+    closed as idle while the block runs::
+
+        with ssh.connect(config, host) as client:
+            ssh.execute(client, 'ls')
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        host (str): Host address
+        timeout (float): TCP connect timeout in seconds
+    """
+    return pool.lease(host, config.ami_username, config.access_key, timeout)
+
+
+def ssh_options(config):
+    """Returns OpenSSH options for commands that shell out to ssh or sshfs.
+
+    If `ssh_control_persist` is set, OpenSSH ControlMaster multiplexing is
+    enabled, so repeated logins and mounts to the same host reuse one master
+    connection that stays open for that many seconds.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+
+    Returns:
+        str: Options in `-o "Key=Value"` format
+    """
+    options = ['StrictHostKeyChecking=no']
+    persist = int(config.ssh_control_persist or 0)
+    if persist > 0:
+        control_path = os.path.expanduser(CONTROL_PATH)
+        if not os.path.isdir(os.path.dirname(control_path)):
+            os.makedirs(os.path.dirname(control_path))
+        options.extend([
+            'ControlMaster=auto',
+            f'ControlPath={control_path}',
+            f'ControlPersist={persist}',
+        ])
+    return ' '.join(f'-o "{option}"' for option in options)
+
+
+class _LineBuffer(object):
+    """Splits a byte stream into lines, passes complete lines to a callback
+    and keeps only the last `max_lines` lines in memory.
+    """
+
+    def __init__(self, callback, max_lines):
+        self.callback = callback
+        self.lines = collections.deque(maxlen=max_lines)
+        self.pending = b''
+
+    def feed(self, data):
+        *lines, self.pending = (self.pending + data).split(b'\n')
+        for line in lines:
+            self._emit(line + b'\n')
+
+    def flush(self):
+        if self.pending:
+            self._emit(self.pending)
+            self.pending = b''
+
+    def _emit(self, line):
+        line = line.decode('utf-8', 'replace')
+        self.lines.append(line)
+        if self.callback is not None:
+            self.callback(line.rstrip('\n'))
+
+    def value(self):
+        return ''.join(self.lines)
+
+
+def execute(client, command, on_out=None, on_err=None, timeout=None,
+            max_lines=MAX_LINES):
+    """Run a command and stream its output line by line.
+
+    Both stdout and stderr are read as data arrives, without waiting for the
+    command to finish. Only the last `max_lines` lines of each stream are kept
+    for the return value, so memory stays flat for chatty commands.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        command (str): Command to run
+        on_out (callable): Called with each stdout line
+        on_err (callable): Called with each stderr line
+        timeout (float): Overall timeout in seconds. `socket.timeout` is raised
+            if the command does not finish in time.
+        max_lines (int): Number of the last lines of each stream to return.
+            If `None` all lines are kept.
+
+    Returns:
+        Result: Last output lines and the remote exit status
+    """
+    start = time.monotonic()
+    deadline = timeout and time.time() + timeout
+    out = _LineBuffer(on_out, max_lines)
+    err = _LineBuffer(on_err, max_lines)
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(command)
+        while True:
+            idle = True
+            if channel.recv_ready():
+                out.feed(channel.recv(32768))
+                idle = False
+            if channel.recv_stderr_ready():
+                err.feed(channel.recv_stderr(32768))
+                idle = False
+            if idle:
+                if (channel.exit_status_ready() and
+                        not channel.recv_ready() and
+                        not channel.recv_stderr_ready()):
+                    break
+                if deadline and time.time() > deadline:
+                    raise socket.timeout()
+                select.select([channel], [], [], 0.1)
+        out.flush()
+        err.flush()
+        return Result(out.value(), err.value(), channel.recv_exit_status())
+    finally:
+        channel.close()
+        tracing.span('ssh.execute', time.monotonic() - start)
@@ -0,0 +1,259 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import os
+import json
+import time
+import shlex
+import hashlib
+import tarfile
+import posixpath
+import click
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import ssh, tracing, transfer
+from aws_ml_helper.instance import get_instance, _public_ip
+
+
+def local_manifest(path):
+    """Build a manifest of a local directory.
+
+    Args:
+        path (str): Local directory
+
+    Returns:
+        dict: Relative POSIX path to `[size, mtime]`
+    """
+    manifest = {}
+    for root, dirs, names in os.walk(path):
+        rel = os.path.relpath(root, path)
+        for name in names:
+            if name.endswith('.part'):
+                continue
+            st = os.stat(os.path.join(root, name))
+            key = name if rel == '.' else posixpath.join(
+                *rel.split(os.sep), name
+            )
+            manifest[key] = [st.st_size, int(st.st_mtime)]
+    return manifest
+
+
+def remote_manifest(client, path):
+    """Build a manifest of a remote directory with a single `find` command.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        path (str): Remote directory
+
+    Returns:
+        dict: Relative POSIX path to `[size, mtime]`
+    """
+    result = ssh.execute(
+        client,
+        f'test -d {shlex.quote(path)} && '
+        f'find {shlex.quote(path)} -type f -printf "%P\\t%s\\t%T@\\n"',
+        max_lines=None
+    )
+    manifest = {}
+    for line in result.out.splitlines():
+        name, size, mtime = line.rsplit('\t', 2)
+        if not name.endswith('.part'):
+            manifest[name] = [int(size), int(float(mtime))]
+    return manifest
+
+
+class ManifestCache(object):
+    """Destination manifest saved after the last sync.
+
+    With the cached manifest the destination does not have to be walked
+    again, only the source is compared against it. Changes made on the
+    destination outside of `aml sync` are not in the cached manifest, so it
+    is used for at most `sync_cache_ttl` seconds after the last sync.
+    """
+
+    def __init__(self, config, host, source, destination):
+        key = hashlib.sha1(
+            f'{config.profile}:{host}:{source}:{destination}'.encode('utf-8')
+        ).hexdigest()
+        self.path = os.path.join(
+            os.path.dirname(config.config), 'sync', f'{key}.json'
+        )
+        self.ttl = int(config.sync_cache_ttl or 0)
+
+    def load(self):
+        """Returns the cached manifest or `None` if it's missing or expired.
+        """
+        if self.ttl <= 0 or not os.path.isfile(self.path):
+            return None
+        if time.time() - os.path.getmtime(self.path) > self.ttl:
+            return None
+        try:
+            with io.open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    def save(self, manifest):
+        if not os.path.isdir(os.path.dirname(self.path)):
+            os.makedirs(os.path.dirname(self.path))
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with io.open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.path)
+
+
+def _batches(names, manifest, count):
+    """Split names into `count` batches of roughly the same total size."""
+    batches = [[] for _ in range(max(count, 1))]
+    sizes = [0] * len(batches)
+    for name in sorted(names, key=lambda n: -manifest[n][0]):
+        i = sizes.index(min(sizes))
+        batches[i].append(name)
+        sizes[i] += manifest[name][0]
+    return [b for b in batches if len(b) > 0]
+
+
+def _tar_upload(client, local, remote, names):
+    """Upload files as a gzipped tar stream extracted on the remote side."""
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(
+            f'mkdir -p {shlex.quote(remote)} && '
+            f'tar xzf - -C {shlex.quote(remote)}'
+        )
+        with channel.makefile('wb') as stream:
+            with tarfile.open(fileobj=stream, mode='w|gz') as tar:
+                for name in names:
+                    tar.add(os.path.join(local, *name.split('/')),
+                            arcname=name)
+        channel.shutdown_write()
+        if channel.recv_exit_status() != 0:
+            raise IOError(channel.makefile_stderr('rb').read().decode())
+    finally:
+        channel.close()
+
+
+def _tar_download(client, remote, local, names):
+    """Download files as a gzipped tar stream created on the remote side."""
+    channel = client.get_transport().open_session()
+    try:
+        channel.exec_command(
+            f'tar czf - -C {shlex.quote(remote)} --null -T -'
+        )
+        channel.sendall(b''.join(n.encode('utf-8') + b'\0' for n in names))
+        channel.shutdown_write()
+        with channel.makefile('rb') as stream:
+            with tarfile.open(fileobj=stream, mode='r|gz') as tar:
+                tar.extractall(local)
+        if channel.recv_exit_status() != 0:
+            raise IOError(channel.makefile_stderr('rb').read().decode())
+    finally:
+        channel.close()
+
+
+def sync(config, source, destination, workers=4, compress=False,
+         full=False):
+    """Synchronize a directory to or from an instance.
+
+    Only new or changed files (by size and modification time) are
+    transferred. The destination manifest is cached locally after each sync,
+    so the next sync within `sync_cache_ttl` seconds only has to walk the
+    source tree. Use `full` if the destination was changed since the last
+    sync in any other way.
+
+    Usage::
+
+        aml sync /local/path {instance}:/remote/path
+        aml sync {instance}:/remote/path /local/path
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        source (str): Source directory
+        destination (str): Destination directory
+        workers (int): Number of parallel transfers
+        compress (bool): Transfer files as gzipped tar streams
+        full (bool): Ignore the cached manifest and walk the destination
+
+    Returns:
+        aws_ml_helper.transfer.Stats: Transfer statistics or `None` if the
+            instance is not found or can't be reached.
+    """
+    if ':' in source:
+        instance_name, _, source = source.partition(':')
+        upload = False
+    elif ':' in destination:
+        instance_name, _, destination = destination.partition(':')
+        upload = True
+    else:
+        click.secho('Both paths are local paths.', fg='red')
+        return
+
+    instance = get_instance(config, instance_name)
+    if instance is None:
+        return
+    address, error = _public_ip(instance)
+    if address is None:
+        click.secho(f'Instance "{instance_name}": {error}', fg='red')
+        return
+    cache = ManifestCache(config, instance.id, source, destination)
+    with ssh.connect(config, address) as client:
+        stats = _sync(client, cache, source, destination, upload, workers,
+                      compress, full)
+    click.echo(str(stats))
+    return stats
+
+
+def _sync(client, cache, source, destination, upload, workers, compress,
+          full):
+    """Transfer the changed files over a leased connection."""
+    if upload:
+        src = local_manifest(source)
+        dst = None if full else cache.load()
+        if dst is None:
+            dst = remote_manifest(client, destination)
+    else:
+        src = remote_manifest(client, source)
+        dst = None if full else cache.load()
+        if dst is None:
+            dst = local_manifest(destination)
+
+    changed = [name for name, entry in src.items() if dst.get(name) != entry]
+
+    if len(changed) == 0:
+        stats = transfer.Stats()
+    elif compress:
+        stats = transfer.Stats()
+        if upload:
+            def task(names):
+                _tar_upload(client, source, destination, names)
+        else:
+            def task(names):
+                _tar_download(client, source, destination, names)
+        span = 'tar.upload' if upload else 'tar.download'
+        with tracing.timed(span) as transferred:
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                for _ in executor.map(task, _batches(changed, src, workers)):
+                    pass
+            transferred.append(sum(src[name][0] for name in changed))
+        for name in changed:
+            stats.add('copied', src[name][0])
+    elif upload:
+        stats = transfer.upload_files(client, [
+            transfer.File(os.path.join(source, *name.split('/')),
+                          posixpath.join(destination, name), *src[name])
+            for name in changed
+        ], workers)
+    else:
+        stats = transfer.download_files(client, [
+            transfer.File(posixpath.join(source, name),
+                          os.path.join(destination, *name.split('/')),
+                          *src[name])
+            for name in changed
+        ], workers)
+
+    for name in changed:
+        dst[name] = src[name]
+    cache.save(dst)
+    stats.skipped = len(src) - len(changed)
+    return stats
@@ -0,0 +1,243 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import json
+import time
+import bisect
+import threading
+import contextlib
+import click
+
+
+# Upper bounds of the latency histogram buckets in milliseconds
+BUCKETS = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# Active tracer or `None` if tracing is disabled
+_tracer = None
+
+
+class Tracer(object):
+    """Collects API call latencies and timed spans of one command.
+
+    API calls are recorded per service and operation, together with the
+    number of HTTP attempts (retries included) and errors. Spans record
+    everything else that takes time, like SSH connects, transfers, waiter
+    delays and rate limiter delays.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+        # (service, operation) to [latencies, attempts, errors]
+        self._calls = {}
+        # Span name to [count, seconds, bytes]
+        self._spans = {}
+
+    def _call(self, service, operation):
+        return self._calls.setdefault((service, operation), [[], 0, 0])
+
+    def call(self, service, operation, seconds, error=False):
+        """Record a finished API call.
+
+        Args:
+            service (str): Service name
+            operation (str): Operation name
+            seconds (float): Call duration including retries
+            error (bool): The call failed
+        """
+        with self._lock:
+            entry = self._call(service, operation)
+            entry[0].append(seconds)
+            entry[2] += int(error)
+
+    def attempt(self, service, operation):
+        """Record an HTTP attempt of an API call.
+
+        Args:
+            service (str): Service name
+            operation (str): Operation name
+        """
+        with self._lock:
+            self._call(service, operation)[1] += 1
+
+    def span(self, name, seconds, nbytes=0):
+        """Record a timed span.
+
+        Args:
+            name (str): Span name, for example `ssh.connect`
+            seconds (float): Duration
+            nbytes (int): Bytes transferred during the span
+        """
+        with self._lock:
+            entry = self._spans.setdefault(name, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] += nbytes
+
+    def summary(self):
+        """Returns the collected data as a JSON serializable dictionary."""
+        with self._lock:
+            calls = {k: (sorted(v[0]), v[1], v[2])
+                     for k, v in self._calls.items()}
+            spans = {k: list(v) for k, v in self._spans.items()}
+
+        def percentile(values, p):
+            return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+        histogram = [0] * (len(BUCKETS) + 1)
+        operations = []
+        for (service, operation), (latencies, attempts, errors) in sorted(
+                calls.items(), key=lambda c: -sum(c[1][0])):
+            for seconds in latencies:
+                histogram[bisect.bisect_right(BUCKETS, seconds * 1000)] += 1
+            operations.append({
+                'service': service,
+                'operation': operation,
+                'calls': len(latencies),
+                'attempts': attempts,
+                'errors': errors,
+                'total': sum(latencies),
+                'p50': latencies and percentile(latencies, 50),
+                'p95': latencies and percentile(latencies, 95),
+                'max': latencies and latencies[-1],
+            })
+        labels = [f'<{b}ms' for b in BUCKETS] + [f'>={BUCKETS[-1]}ms']
+        return {
+            'wall': time.monotonic() - self.started,
+            'operations': operations,
+            'histogram': dict(zip(labels, histogram)),
+            'spans': {
+                name: {'count': count, 'seconds': seconds, 'bytes': nbytes}
+                for name, (count, seconds, nbytes) in sorted(spans.items())
+            },
+        }
+
+    def report(self, path=None):
+        """Print the summary to stderr and optionally save it as JSON.
+
+        Args:
+            path (str): Path of the JSON export
+        """
+        from tabulate import tabulate
+        summary = self.summary()
+        operations = summary['operations']
+        click.echo(f'\nTrace: {sum(o["calls"] for o in operations)} API '
+                   f'calls in {summary["wall"]:.2f}s', err=True)
+        if operations:
+            click.echo(tabulate(
+                [[o['service'], o['operation'], o['calls'], o['attempts'],
+                  o['errors'], o['total'], o['p50'] * 1000, o['p95'] * 1000,
+                  o['max'] * 1000] for o in operations],
+                ['service', 'operation', 'calls', 'attempts', 'errors',
+                 'total s', 'p50 ms', 'p95 ms', 'max ms'],
+                floatfmt='.1f'
+            ), err=True)
+            # Show the buckets from the first to the last non empty one
+            buckets = list(summary['histogram'].items())
+            used = [i for i, (_, count) in enumerate(buckets) if count]
+            peak = max(count for _, count in buckets)
+            for label, count in buckets[used[0]:used[-1] + 1] if used else []:
+                bar = '#' * round(40 * count / peak)
+                click.echo(f'{label:>9} {count:6} {bar}', err=True)
+        if summary['spans']:
+            click.echo(tabulate(
+                [[name, s['count'], s['seconds'], s['bytes'] / 1024 / 1024]
+                 for name, s in summary['spans'].items()],
+                ['span', 'count', 'seconds', 'MB'], floatfmt='.2f'
+            ), err=True)
+        if path is not None:
+            with io.open(path, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+
+
+def enable():
+    """Start tracing and return the tracer."""
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+
+def tracer():
+    """Returns the active tracer or `None`."""
+    return _tracer
+
+
+def span(name, seconds, nbytes=0):
+    """Record a span if tracing is enabled.
+
+    Args:
+        name (str): Span name
+        seconds (float): Duration
+        nbytes (int): Bytes transferred during the span
+    """
+    if _tracer is not None:
+        _tracer.span(name, seconds, nbytes)
+
+
+@contextlib.contextmanager
+def timed(name):
+    """Record the duration of the block as a span.
+
+    The yielded list can be extended with the number of bytes transferred
+    in the block.
+
+    Args:
+        name (str): Span name
+    """
+    start = time.monotonic()
+    nbytes = []
+    try:
+        yield nbytes
+    finally:
+        span(name, time.monotonic() - start, sum(nbytes))
+
+
+def sleep(seconds, name='wait'):
+    """Sleep and record the delay as a span.
+
+    Args:
+        seconds (float): Delay
+        name (str): Span name
+    """
+    time.sleep(seconds)
+    span(name, seconds)
+
+
+def watch(service, c):
+    """Record the API calls of a client if tracing is enabled.
+
+    Hooks into the botocore event system: the call starts when its
+    parameters are built, every HTTP attempt is counted before it's sent,
+    and the call ends after the response or the error.
+
+    Args:
+        service (str): Service name
+        c: Client
+    """
+    if _tracer is None:
+        return
+    active = _tracer
+    service_id = c.meta.service_model.service_id.hyphenize()
+
+    def operation(event_name):
+        return event_name.rsplit('.', 1)[-1]
+
+    def start(context, **kwargs):
+        context['trace_start'] = time.monotonic()
+
+    def attempt(event_name, **kwargs):
+        active.attempt(service, operation(event_name))
+
+    def end(event_name, context, parsed=None, exception=None, **kwargs):
+        if 'trace_start' in context:
+            active.call(service, operation(event_name),
+                        time.monotonic() - context.pop('trace_start'),
+                        exception is not None or 'Error' in (parsed or {}))
+
+    events = c.meta.events
+    events.register(f'before-parameter-build.{service_id}', start)
+    events.register(f'before-send.{service_id}', attempt)
+    events.register(f'after-call.{service_id}', end)
+    events.register(f'after-call-error.{service_id}', end)
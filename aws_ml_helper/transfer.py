@@ -0,0 +1,393 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import stat
+import time
+import shlex
+import hashlib
+import posixpath
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper import ssh, tracing
+
+
+# Size of the blocks read from the source file
+CHUNK_SIZE = 1024 * 1024
+# SSH channel window size. Larger window keeps more data in flight and gets
+# close to line rate on high latency links.
+WINDOW_SIZE = 64 * 1024 * 1024
+# How to decide that the destination file is already identical
+COMPARE = ['size', 'mtime', 'hash']
+
+
+File = collections.namedtuple(
+    'File', ['source', 'destination', 'size', 'mtime']
+)
+
+
+class Stats(object):
+    """Transfer statistics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.copied = 0
+        self.resumed = 0
+        self.skipped = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def add(self, status, transferred):
+        with self._lock:
+            setattr(self, status, getattr(self, status) + 1)
+            self.bytes += transferred
+
+    def __str__(self):
+        seconds = max(time.time() - self.started, 0.001)
+        mb = self.bytes / 1024 / 1024
+        return (f'{self.copied} copied, {self.resumed} resumed, '
+                f'{self.skipped} skipped, {mb:.1f} MB in {seconds:.1f}s '
+                f'({mb / seconds:.1f} MB/s)')
+
+
+class _SFTPPool(object):
+    """One SFTP channel per worker thread on a shared SSH transport."""
+
+    def __init__(self, client, window_size=WINDOW_SIZE):
+        self.client = client
+        self.window_size = window_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._channels = []
+
+    def get(self):
+        sftp = getattr(self._local, 'sftp', None)
+        if sftp is None:
+            import paramiko
+            sftp = paramiko.SFTPClient.from_transport(
+                self.client.get_transport(), window_size=self.window_size
+            )
+            self._local.sftp = sftp
+            with self._lock:
+                self._channels.append(sftp)
+        return sftp
+
+    def close(self):
+        with self._lock:
+            for sftp in self._channels:
+                sftp.close()
+            self._channels = []
+
+
+def _remote_stat(sftp, path):
+    try:
+        return sftp.stat(path)
+    except IOError:
+        return None
+
+
+def _remote_sha256(client, path):
+    result = ssh.execute(client, f'sha256sum {shlex.quote(path)}')
+    return result.out.split()[0] if result.exit_status == 0 else None
+
+
+def _local_sha256(path, chunk_size=CHUNK_SIZE):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _identical(compare, size, mtime, other_size, other_mtime, hashes):
+    """Check if the destination file is identical to the source file.
+
+    Args:
+        compare (str): One of `COMPARE`
+        size (int): Source file size
+        mtime (float): Source file modification time
+        other_size (int): Destination file size
+        other_mtime (float): Destination file modification time
+        hashes (callable): Returns a pair of source and destination hashes
+    """
+    if size != other_size:
+        return False
+    if compare == 'size':
+        return True
+    elif compare == 'mtime':
+        return int(mtime) == int(other_mtime)
+    source_hash, destination_hash = hashes()
+    return source_hash == destination_hash
+
+
+def _part(f):
+    """Returns the path of the partial file of a transfer.
+
+    The name contains the source size and modification time, so a partial
+    file left by a different version of the source is never resumed.
+
+    Args:
+        f (File): Transferred file
+    """
+    return f'{f.destination}.{f.size}.{int(f.mtime)}.part'
+
+
+def _remote_rename(sftp, source, destination):
+    try:
+        sftp.posix_rename(source, destination)
+    except IOError:
+        if _remote_stat(sftp, destination) is not None:
+            sftp.remove(destination)
+        sftp.rename(source, destination)
+
+
+def _remote_makedirs(sftp, path):
+    if path in ('', '/') or _remote_stat(sftp, path) is not None:
+        return
+    _remote_makedirs(sftp, posixpath.dirname(path))
+    sftp.mkdir(path)
+
+
+def _run(files, worker, workers):
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for _ in executor.map(worker, files):
+            pass
+
+
+def upload(client, local, remote, workers=4, chunk_size=CHUNK_SIZE,
+           resume=True, compare='mtime'):
+    """Upload a file or a directory over SFTP.
+
+    Files are written to `{name}.{size}.{mtime}.part` and renamed when
+    complete, so an interrupted transfer of the same source file is resumed
+    from the size of the partial file.
+    Directories are copied recursively with `workers` files in flight, each
+    on its own SFTP channel.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        local (str): Local file or directory
+        remote (str): Remote destination path
+        workers (int): Number of parallel SFTP channels
+        chunk_size (int): Size of the blocks read from the source
+        resume (bool): Resume partially transferred files
+        compare (str): Skip files that are identical by `size`, `mtime`
+            (size and modification time) or `hash` (size and SHA-256).
+
+    Returns:
+        Stats: Transfer statistics
+    """
+    stats = Stats()
+    pool = _SFTPPool(client)
+    sftp = pool.get()
+
+    files = []
+    if os.path.isdir(local):
+        for root, dirs, names in os.walk(local):
+            rel = os.path.relpath(root, local)
+            target = remote if rel == '.' else posixpath.join(
+                remote, *rel.split(os.sep)
+            )
+            _remote_makedirs(sftp, target)
+            for name in names:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                files.append(File(path, posixpath.join(target, name),
+                                  st.st_size, st.st_mtime))
+    else:
+        attrs = _remote_stat(sftp, remote)
+        if attrs is not None and stat.S_ISDIR(attrs.st_mode):
+            remote = posixpath.join(remote, os.path.basename(local))
+        st = os.stat(local)
+        files.append(File(local, remote, st.st_size, st.st_mtime))
+
+    try:
+        _upload_files(client, pool, files, stats, workers, chunk_size, resume,
+                      compare)
+    finally:
+        pool.close()
+    return stats
+
+
+def upload_files(client, files, workers=4, chunk_size=CHUNK_SIZE,
+                 resume=True, compare=None):
+    """Upload a list of files over SFTP.
+
+    Missing remote directories are created.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        files (list of File): Files to upload
+        workers (int): Number of parallel SFTP channels
+        chunk_size (int): Size of the blocks read from the source
+        resume (bool): Resume partially transferred files
+        compare (str): Skip identical files, see `upload`. If `None` all
+            files are transferred.
+
+    Returns:
+        Stats: Transfer statistics
+    """
+    stats = Stats()
+    pool = _SFTPPool(client)
+    sftp = pool.get()
+    for path in sorted({posixpath.dirname(f.destination) for f in files}):
+        _remote_makedirs(sftp, path)
+    try:
+        _upload_files(client, pool, files, stats, workers, chunk_size, resume,
+                      compare)
+    finally:
+        pool.close()
+    return stats
+
+
+def _upload_files(client, pool, files, stats, workers, chunk_size, resume,
+                  compare):
+    def worker(f):
+        sftp = pool.get()
+        attrs = compare and _remote_stat(sftp, f.destination)
+        if attrs and _identical(
+                compare, f.size, f.mtime, attrs.st_size, attrs.st_mtime,
+                lambda: (_local_sha256(f.source),
+                         _remote_sha256(client, f.destination))):
+            stats.add('skipped', 0)
+            return
+
+        part = _part(f)
+        offset = 0
+        if resume:
+            attrs = _remote_stat(sftp, part)
+            if attrs is not None and attrs.st_size <= f.size:
+                offset = attrs.st_size
+        with open(f.source, 'rb') as src, \
+                sftp.open(part, 'r+b' if offset else 'wb') as dst:
+            dst.set_pipelined(True)
+            src.seek(offset)
+            dst.seek(offset)
+            for chunk in iter(lambda: src.read(chunk_size), b''):
+                dst.write(chunk)
+        sftp.utime(part, (f.mtime, f.mtime))
+        _remote_rename(sftp, part, f.destination)
+        stats.add('resumed' if offset else 'copied', f.size - offset)
+
+    with tracing.timed('sftp.upload') as transferred:
+        before = stats.bytes
+        _run(files, worker, workers)
+        transferred.append(stats.bytes - before)
+
+
+def download(client, remote, local, workers=4, chunk_size=CHUNK_SIZE,
+             resume=True, compare='mtime'):
+    """Download a file or a directory over SFTP.
+
+    Counterpart of `upload` with the same options and behaviour.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        remote (str): Remote file or directory
+        local (str): Local destination path
+        workers (int): Number of parallel SFTP channels
+        chunk_size (int): Size of the blocks read from the source
+        resume (bool): Resume partially transferred files
+        compare (str): Skip files that are identical by `size`, `mtime`
+            (size and modification time) or `hash` (size and SHA-256).
+
+    Returns:
+        Stats: Transfer statistics
+    """
+    stats = Stats()
+    pool = _SFTPPool(client)
+    sftp = pool.get()
+
+    files = []
+    attrs = sftp.stat(remote)
+    if stat.S_ISDIR(attrs.st_mode):
+        pending = [(remote, local)]
+        while pending:
+            source, target = pending.pop()
+            os.makedirs(target, exist_ok=True)
+            for attrs in sftp.listdir_attr(source):
+                path = posixpath.join(source, attrs.filename)
+                destination = os.path.join(target, attrs.filename)
+                if stat.S_ISDIR(attrs.st_mode):
+                    pending.append((path, destination))
+                else:
+                    files.append(File(path, destination, attrs.st_size,
+                                      attrs.st_mtime))
+    else:
+        if os.path.isdir(local):
+            local = os.path.join(local, posixpath.basename(remote))
+        files.append(File(remote, local, attrs.st_size, attrs.st_mtime))
+
+    try:
+        _download_files(client, pool, files, stats, workers, chunk_size,
+                        resume, compare)
+    finally:
+        pool.close()
+    return stats
+
+
+def download_files(client, files, workers=4, chunk_size=CHUNK_SIZE,
+                   resume=True, compare=None):
+    """Download a list of files over SFTP.
+
+    Local directories are created as needed.
+
+    Args:
+        client (paramiko.SSHClient): Connected SSH client
+        files (list of File): Files to download
+        workers (int): Number of parallel SFTP channels
+        chunk_size (int): Size of the blocks read from the source
+        resume (bool): Resume partially transferred files
+        compare (str): Skip identical files, see `download`. If `None` all
+            files are transferred.
+
+    Returns:
+        Stats: Transfer statistics
+    """
+    stats = Stats()
+    pool = _SFTPPool(client)
+    try:
+        _download_files(client, pool, files, stats, workers, chunk_size,
+                        resume, compare)
+    finally:
+        pool.close()
+    return stats
+
+
+def _download_files(client, pool, files, stats, workers, chunk_size, resume,
+                    compare):
+    def worker(f):
+        sftp = pool.get()
+        if compare and os.path.isfile(f.destination):
+            st = os.stat(f.destination)
+            if _identical(compare, f.size, f.mtime, st.st_size, st.st_mtime,
+                          lambda: (_remote_sha256(client, f.source),
+                                   _local_sha256(f.destination))):
+                stats.add('skipped', 0)
+                return
+
+        os.makedirs(os.path.dirname(f.destination) or '.', exist_ok=True)
+        part = _part(f)
+        offset = 0
+        if resume and os.path.isfile(part):
+            offset = os.path.getsize(part)
+            if offset > f.size:
+                offset = 0
+        with sftp.open(f.source, 'rb') as src, \
+                open(part, 'r+b' if offset else 'wb') as dst:
+            src.seek(offset)
+            dst.seek(offset)
+            src.prefetch(f.size)
+            for chunk in iter(lambda: src.read(chunk_size), b''):
+                dst.write(chunk)
+            dst.truncate()
+        os.utime(part, (f.mtime, f.mtime))
+        os.replace(part, f.destination)
+        stats.add('resumed' if offset else 'copied', f.size - offset)
+
+    with tracing.timed('sftp.download') as transferred:
+        before = stats.bytes
+        _run(files, worker, workers)
+        transferred.append(stats.bytes - before)
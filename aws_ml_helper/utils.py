@@ -2,6 +2,14 @@ __author__ = 'Viktor Kerkez <alefnula@gmail.com>'
 __date__ = '21 March 2018'
 __copyright__ = 'Copyright (c)  2018 Viktor Kerkez'
 
+import json
+
+
+# Listing output formats
+OUTPUTS = ['table', 'stream', 'jsonl']
+# Default number of items requested per Describe call
+PAGE_SIZE = 100
+
 
 def name_from_tags(tags):
     """Extract name from tags"""
@@ -10,3 +18,53 @@ def name_from_tags(tags):
     if len(names) == 1:
         return names[0]
     return ''
+
+
+def expand_names(name, count=1):
+    """Expand a name pattern into instance names.
+
+    The pattern can contain `{i}`, replaced by the instance index, for
+    example `worker-{i}` or `worker-{i:02d}`. If it doesn't and more than one
+    name is requested, `-{i}` is appended.
+
+    Args:
+        name (str): Name or name pattern
+        count (int): Number of names
+    """
+    if '{i' not in name:
+        if count == 1:
+            return [name]
+        name += '-{i}'
+    return [name.format(i=i) for i in range(count)]
+
+
+def print_rows(rows, headers, config, output='table', widths=None):
+    """Print listing rows.
+
+    The `table` output collects all rows and prints them with `tabulate`.
+    The `stream` and `jsonl` outputs print every row as soon as it is
+    produced, so the first rows show up after the first page is fetched and
+    memory stays flat.
+
+    Args:
+        rows (iterable): Rows, each one a sequence of values
+        headers (list of str): Column names
+        config (aws_ml_helper.config.Config): Configuration
+        output (str): One of `OUTPUTS`
+        widths (list of int): Column widths for the `stream` output
+    """
+    if output == 'table':
+        from tabulate import tabulate
+        print(tabulate(list(rows), headers, config.table_format))
+    elif output == 'jsonl':
+        for row in rows:
+            print(json.dumps(dict(zip(headers, row)), default=str),
+                  flush=True)
+    else:
+        widths = widths or [20] * len(headers)
+        line = '  '.join(f'{{:<{width}}}' for width in widths)
+        print(line.format(*headers).rstrip())
+        print(line.format(*['-' * width for width in widths]), flush=True)
+        for row in rows:
+            print(line.format(*[str(value) for value in row]).rstrip(),
+                  flush=True)
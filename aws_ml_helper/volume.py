@@ -2,12 +2,44 @@ __author__ = 'Viktor Kerkez <alefnula@gmail.com>'
 __date__ = '21 March 2018'
 __copyright__ = 'Copyright (c)  2018 Viktor Kerkez'
 
-import time
-import click
-from tabulate import tabulate
-from aws_ml_helper import boto
-from aws_ml_helper.utils import name_from_tags
+from aws_ml_helper import boto, describe, inventory
+from aws_ml_helper.utils import name_from_tags, print_rows, PAGE_SIZE
+from aws_ml_helper.names import NameCache, resolve
 from aws_ml_helper.instance import get_instance
+from aws_ml_helper.wait import all_ready, report
+
+
+def get_volumes(config, names, quiet=False):
+    """Returns volume objects for several names with a single describe call.
+
+    Names that are not found or that match several volumes are reported and
+    mapped to `None`.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        names (list of str): Volume names
+        quiet (bool): Don't report names that are not found
+
+    Returns:
+        dict: Volume name to volume or None
+    """
+    def by_ids(volume_ids):
+        return [
+            describe.hydrate(config, 'volume', v)
+            for v in describe.items(config, 'volume', VolumeIds=volume_ids)
+        ]
+
+    def by_names(names):
+        return [
+            describe.hydrate(config, 'volume', v)
+            for v in describe.items(
+                config, 'volume',
+                Filters=[{'Name': 'tag:Name', 'Values': names}]
+            )
+        ]
+
+    return resolve(config, 'volume', names, by_ids, by_names,
+                   lambda v: name_from_tags(v.tags), quiet)
 
 
 def get_volume(config, name):
@@ -21,43 +53,43 @@ def get_volume(config, name):
     Returns:
         Volume if found or None
     """
-    ec2 = boto.resource('ec2', config)
-    volume_list = list(ec2.volumes.filter(
-        Filters=[{'Name': 'tag:Name', 'Values': [name]}]
-    ))
-    if len(volume_list) == 0:
-        click.secho(f'Volume "{name}" not found')
-        return None
-    elif len(volume_list) > 1:
-        click.secho(f'Multiple volumes with name "{name}" found.')
-        return None
-    return volume_list[0]
-
-
-def volumes(config):
+    return get_volumes(config, [name])[name]
+
+
+def volumes(config, output='table', page_size=PAGE_SIZE, all_regions=False):
     """List volumes and their attributes
 
     Args:
         config (aws_ml_helper.config.Config): Configuration
+        output (str): Output format, one of `aws_ml_helper.utils.OUTPUTS`
+        page_size (int): Number of volumes requested per call
+        all_regions (bool): List volumes in all enabled regions, fetched
+            concurrently, with their region.
     """
-    ec2 = boto.resource('ec2', config)
-    data = []
-    for v in ec2.volumes.all():
-        data.append([
-            name_from_tags(v.tags),
-            v.id,
-            v.size,
-            v.state,
-            ', '.join([a['InstanceId'] for a in v.attachments])
-        ])
-
-    print(tabulate(
-        data, ['name', 'id', 'size', 'state', 'attachments'],
-        config.table_format
-    ))
-
-
-def volume_create(config, name, size=256, snapshot_name=None, wait=False):
+    if all_regions:
+        items = inventory.all_regions(config, 'volume', page_size)
+    else:
+        items = ((None, v)
+                 for v in inventory.items(config, 'volume', page_size))
+    rows = (
+        ((region,) if all_regions else ()) + (
+            name_from_tags(v.get('Tags')),
+            v['VolumeId'],
+            v['Size'],
+            v['State'],
+            ', '.join([a['InstanceId'] for a in v['Attachments']])
+        )
+        for region, v in items
+    )
+    headers = ['name', 'id', 'size', 'state', 'attachments']
+    widths = [30, 22, 6, 10, 20]
+    if all_regions:
+        headers, widths = ['region'] + headers, [16] + widths
+    print_rows(rows, headers, config, output, widths)
+
+
+def volume_create(config, name, size=256, snapshot_name=None, wait=False,
+                  availability_zone=None):
     """Create an EBS volume.
 
     Args:
@@ -67,13 +99,15 @@ def volume_create(config, name, size=256, snapshot_name=None, wait=False):
         snapshot_name (str): Name of the snapshot from which the volume should
             be created
         wait (bool): Wait for the volume to become `available`
+        availability_zone (str): Availability zone. Default: from
+            configuration
     """
     ec2 = boto.resource('ec2', config)
     from aws_ml_helper.snapshot import get_snapshot
     snapshot = get_snapshot(config, snapshot_name)
     snapshot_id = (snapshot and snapshot.id) or None
     volume = ec2.create_volume(
-        AvailabilityZone=config.availability_zone,
+        AvailabilityZone=availability_zone or config.availability_zone,
         Size=size,
         SnapshotId=snapshot_id,
         VolumeType='gp2',
@@ -82,10 +116,10 @@ def volume_create(config, name, size=256, snapshot_name=None, wait=False):
             'Tags': [{'Key': 'Name', 'Value': name}]
         }]
     )
+    NameCache(config).set('volume', name, volume.id)
     if wait:
-        while volume.state != 'available':
-            time.sleep(1)
-            volume.reload()
+        all_ready(config, 'volume', [volume.id], {'available'},
+                  failed={'error'}, progress=report(f'Volume {name}'))
 
 
 def volume_attach(config, volume_name, instance_name, device='xvdh'):
@@ -132,3 +166,4 @@ def volume_delete(config, volume_name):
     """
     volume = get_volume(config, volume_name)
     volume.delete()
+    NameCache(config).delete('volume', volume_name)
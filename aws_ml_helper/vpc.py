@@ -4,153 +4,382 @@ __copyright__ = 'Copyright (c) 2010 Viktor Kerkez'
 
 import io
 import os
-import time
-from aws_ml_helper import boto
+import click
+from botocore.exceptions import ClientError
+from aws_ml_helper import boto, dag
+from aws_ml_helper.dag import Step
+from aws_ml_helper.journal import Journal
+from aws_ml_helper.wait import until, retry, report, error_code
 
 
-def create_vpc(config, name, network_range='10.0.0.0/16',
-               allowed_ip='0.0.0.0/32', availability_zone='us-east-1a'):
-    """Creates a VPC
+# Steps that create the network part of the setup
+VPC_STEPS = ['vpc_dns', 'associate_route_table', 'route',
+             'efs_security_group']
+
+# Teardown order, the reverse of the creation dependencies
+TEARDOWN_STEPS = [
+    'mount_target', 'file_system', 'key_pair', 'efs_security_group',
+    'ec2_security_group', 'route', 'associate_route_table', 'route_table',
+    'subnet', 'attach_gateway', 'gateway', 'vpc'
+]
+
+
+def _tags(resource_type, name):
+    """Returns tag specifications that set the resource name."""
+    return [{
+        'ResourceType': resource_type,
+        'Tags': [{'Key': 'Name', 'Value': name}]
+    }]
+
+
+def _checks(ec2, efs, name):
+    """Returns functions that check if a recorded resource still exists.
 
     Args:
-        config (aws_ml_helper.config.Config): Configuration object
+        ec2: EC2 client
+        efs: EFS client
         name (str): VPC name
-        network_range (str): The IPv4 network range for the VPC, in CIDR
-            notation. For example, 10.0.0.0/16
-        allowed_ip (str): Public IP address from which the VPC instances will
-            be accessible in CIDR notation.
-        availability_zone: VPC availability zone
+
+    Returns:
+        dict: Step name to a function that takes the resource id
     """
+    def filtered(method, key, filter_name):
+        def check(resource_id):
+            return bool(method(Filters=[
+                {'Name': filter_name, 'Values': [resource_id]}
+            ])[key])
+        return check
 
-    ec2 = boto.client('ec2', config)
+    def file_system(efs_id):
+        try:
+            efs.describe_file_systems(FileSystemId=efs_id)
+            return True
+        except ClientError as e:
+            if error_code(e) != 'FileSystemNotFound':
+                raise
+            return False
 
-    print('Create VPC')
-    response = ec2.create_vpc(CidrBlock=network_range)
-    vpc_id = response['Vpc']['VpcId']
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    ec2.create_tags(Resources=[vpc_id],
-                    Tags=[{'Key': 'Name', 'Value': name}])
-    ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsHostnames={'Value': True})
-    ec2.modify_vpc_attribute(VpcId=vpc_id, EnableDnsSupport={'Value': True})
-
-    print('Create the gateway')
-    response = ec2.create_internet_gateway()
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    gateway_id = response['InternetGateway']['InternetGatewayId']
-    ec2.create_tags(Resources=[gateway_id],
-                    Tags=[{'Key': 'Name', 'Value': f'{name}-gateway'}])
-    ec2.attach_internet_gateway(VpcId=vpc_id, InternetGatewayId=gateway_id)
-
-    print('Create subnet')
-    response = ec2.create_subnet(VpcId=vpc_id, CidrBlock=network_range,
-                                 AvailabilityZone=availability_zone)
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    subnet_id = response['Subnet']['SubnetId']
-    ec2.create_tags(Resources=[subnet_id],
-                    Tags=[{'Key': 'Name', 'Value': f'{name}-subnet'}])
-
-    print('Create routing table')
-    response = ec2.create_route_table(VpcId=vpc_id)
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    route_table_id = response['RouteTable']['RouteTableId']
-    ec2.create_tags(Resources=[route_table_id],
-                    Tags=[{'Key': 'Name', 'Value': f'{name}-route-table'}])
-    ec2.associate_route_table(RouteTableId=route_table_id, SubnetId=subnet_id)
-    ec2.create_route(RouteTableId=route_table_id, GatewayId=gateway_id,
-                     DestinationCidrBlock='0.0.0.0/0')
-
-    print('Create security group for instances')
-    response = ec2.create_security_group(
-        VpcId=vpc_id, GroupName=f'{name}-ec2-security-group',
-        Description=f'Security Group for {name} VPC instances'
-    )
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    ec2_security_group_id = response['GroupId']
-    # Open port for ssh
-    ec2.authorize_security_group_ingress(
-        GroupId=ec2_security_group_id, IpProtocol='tcp',
-        FromPort=22, ToPort=22,
-        CidrIp=allowed_ip
-    )
-    # Open port for tensorboard
-    ec2.authorize_security_group_ingress(
-        GroupId=ec2_security_group_id, IpProtocol='tcp',
-        FromPort=6006, ToPort=6006,
-        CidrIp=allowed_ip
-    )
-    # Open port for jupyter notebook
-    ec2.authorize_security_group_ingress(
-        GroupId=ec2_security_group_id, IpProtocol='tcp',
-        FromPort=8888, ToPort=8888,
-        CidrIp=allowed_ip
-    )
+    def key_pair(path):
+        return os.path.isfile(path) and filtered(
+            ec2.describe_key_pairs, 'KeyPairs', 'key-name'
+        )(f'access-key-{name}')
 
-    print('Create security group for EFS')
-    response = ec2.create_security_group(
-        VpcId=vpc_id, GroupName=f'{name}-efs-security-group',
-        Description=f'Security Group for {name} VPC EFS'
-    )
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    efs_security_group_id = response['GroupId']
-    ec2.authorize_security_group_ingress(
-        GroupId=efs_security_group_id,
-        IpPermissions=[
+    return {
+        'vpc': filtered(ec2.describe_vpcs, 'Vpcs', 'vpc-id'),
+        'gateway': filtered(ec2.describe_internet_gateways,
+                            'InternetGateways', 'internet-gateway-id'),
+        'subnet': filtered(ec2.describe_subnets, 'Subnets', 'subnet-id'),
+        'route_table': filtered(ec2.describe_route_tables, 'RouteTables',
+                                'route-table-id'),
+        'ec2_security_group': filtered(ec2.describe_security_groups,
+                                       'SecurityGroups', 'group-id'),
+        'efs_security_group': filtered(ec2.describe_security_groups,
+                                       'SecurityGroups', 'group-id'),
+        'key_pair': key_pair,
+        'file_system': file_system,
+    }
+
+
+def _resumable(steps, journal, checks):
+    """Wrap steps so that the steps done in a previous run are skipped.
+
+    A step is skipped if the journal marks it as done, none of the steps it
+    requires had to be run again and its resource still exists.
+
+    Args:
+        steps (dict): Step name to `aws_ml_helper.dag.Step`
+        journal (aws_ml_helper.journal.Journal): Journal
+        checks (dict): Step name to resource existence check
+
+    Returns:
+        dict: Step name to wrapped `aws_ml_helper.dag.Step`
+    """
+    rerun = set()
+
+    def wrap(name, step):
+        def func(**kwargs):
+            check = checks.get(name)
+            if (journal.done(name) and not rerun & set(step.requires) and
+                    (check is None or check(journal.get(name)))):
+                click.echo(f'Skip {name.replace("_", " ")}: already done')
+                return journal.get(name)
+            rerun.add(name)
+            value = step.func(**kwargs)
+            journal.record(name, value)
+            return value
+        return Step(func, step.requires)
+
+    return {name: wrap(name, step) for name, step in steps.items()}
+
+
+def _ignore(error, *codes):
+    """Re-raise a client error unless its code ends with one of the codes."""
+    if not error_code(error).endswith(codes):
+        raise error
+
+
+def _vpc_steps(ec2, name, network_range, allowed_ip, availability_zone,
+               journal, checks):
+    """Returns the steps that create a VPC and its network resources.
+
+    Every resource is tagged on creation and its id is written to the
+    journal right away. A resource created by an interrupted run is reused
+    if it still exists. Calls on a new resource are retried while it's not
+    visible yet, and the VPC and subnet are waited on until they are
+    `available`.
+
+    Args:
+        ec2: EC2 client
+        name (str): VPC name
+        network_range (str): The IPv4 network range for the VPC
+        allowed_ip (str): Public IP address allowed to access the instances
+        availability_zone (str): Subnet availability zone
+        journal (aws_ml_helper.journal.Journal): Journal
+        checks (dict): Step name to resource existence check
+
+    Returns:
+        dict: Step name to `aws_ml_helper.dag.Step`
+    """
+    def create(step, func):
+        resource_id = journal.resource(step)
+        if resource_id is None or not checks[step](resource_id):
+            resource_id = func()
+            journal.created(step, resource_id)
+        return resource_id
+
+    def vpc():
+        click.echo('Create VPC')
+        vpc_id = create('vpc', lambda: ec2.create_vpc(
+            CidrBlock=network_range, TagSpecifications=_tags('vpc', name)
+        )['Vpc']['VpcId'])
+        until(lambda: ec2.describe_vpcs(VpcIds=[vpc_id])['Vpcs'][0]['State'],
+              {'available'}, description=f'VPC {vpc_id}', delay=0.5)
+        return vpc_id
+
+    def vpc_dns(vpc):
+        retry(ec2.modify_vpc_attribute, VpcId=vpc,
+              EnableDnsHostnames={'Value': True})
+        ec2.modify_vpc_attribute(VpcId=vpc, EnableDnsSupport={'Value': True})
+
+    def gateway():
+        click.echo('Create the gateway')
+        return create('gateway', lambda: ec2.create_internet_gateway(
+            TagSpecifications=_tags('internet-gateway', f'{name}-gateway')
+        )['InternetGateway']['InternetGatewayId'])
+
+    def attach_gateway(vpc, gateway):
+        try:
+            retry(ec2.attach_internet_gateway, VpcId=vpc,
+                  InternetGatewayId=gateway)
+        except ClientError as e:
+            _ignore(e, 'Resource.AlreadyAssociated')
+
+    def subnet(vpc):
+        click.echo('Create subnet')
+        subnet_id = create('subnet', lambda: ec2.create_subnet(
+            VpcId=vpc, CidrBlock=network_range,
+            AvailabilityZone=availability_zone,
+            TagSpecifications=_tags('subnet', f'{name}-subnet')
+        )['Subnet']['SubnetId'])
+        until(lambda: ec2.describe_subnets(
+            SubnetIds=[subnet_id]
+        )['Subnets'][0]['State'], {'available'},
+            description=f'Subnet {subnet_id}', delay=0.5)
+        return subnet_id
+
+    def route_table(vpc):
+        click.echo('Create routing table')
+        return create('route_table', lambda: ec2.create_route_table(
+            VpcId=vpc,
+            TagSpecifications=_tags('route-table', f'{name}-route-table')
+        )['RouteTable']['RouteTableId'])
+
+    def associate_route_table(route_table, subnet):
+        response = retry(ec2.associate_route_table, RouteTableId=route_table,
+                         SubnetId=subnet)
+        return response['AssociationId']
+
+    def route(route_table, attach_gateway, gateway):
+        try:
+            retry(ec2.create_route, RouteTableId=route_table,
+                  GatewayId=gateway, DestinationCidrBlock='0.0.0.0/0')
+        except ClientError as e:
+            _ignore(e, 'RouteAlreadyExists')
+
+    def authorize(group_id, permissions):
+        try:
+            retry(ec2.authorize_security_group_ingress, GroupId=group_id,
+                  IpPermissions=permissions)
+        except ClientError as e:
+            _ignore(e, 'InvalidPermission.Duplicate')
+
+    def ec2_security_group(vpc):
+        click.echo('Create security group for instances')
+        group_id = create(
+            'ec2_security_group', lambda: ec2.create_security_group(
+                VpcId=vpc, GroupName=f'{name}-ec2-security-group',
+                Description=f'Security Group for {name} VPC instances'
+            )['GroupId']
+        )
+        # Open ports for ssh, tensorboard and jupyter notebook
+        authorize(group_id, [
+            {
+                'FromPort': port,
+                'IpProtocol': 'tcp',
+                'ToPort': port,
+                'IpRanges': [{'CidrIp': allowed_ip}]
+            }
+            for port in (22, 6006, 8888)
+        ])
+        return group_id
+
+    def efs_security_group(vpc, ec2_security_group):
+        click.echo('Create security group for EFS')
+        group_id = create(
+            'efs_security_group', lambda: ec2.create_security_group(
+                VpcId=vpc, GroupName=f'{name}-efs-security-group',
+                Description=f'Security Group for {name} VPC EFS'
+            )['GroupId']
+        )
+        authorize(group_id, [
             {
                 'FromPort': 2049,
                 'IpProtocol': 'tcp',
                 'ToPort': 2049,
-                'UserIdGroupPairs': [{'GroupId': ec2_security_group_id}]
+                'UserIdGroupPairs': [{'GroupId': ec2_security_group}]
             },
-        ]
-    )
+        ])
+        return group_id
 
-    config.vpc_id = vpc_id
-    config.vpc_name = name
-    config.subnet_id = subnet_id
-    config.ec2_security_group_id = ec2_security_group_id
-    config.efs_security_group_id = efs_security_group_id
-    config.save()
+    return {
+        'vpc': Step(vpc, []),
+        'vpc_dns': Step(vpc_dns, ['vpc']),
+        'gateway': Step(gateway, []),
+        'attach_gateway': Step(attach_gateway, ['vpc', 'gateway']),
+        'subnet': Step(subnet, ['vpc']),
+        'route_table': Step(route_table, ['vpc']),
+        'associate_route_table': Step(associate_route_table,
+                                      ['route_table', 'subnet']),
+        'route': Step(route, ['route_table', 'attach_gateway', 'gateway']),
+        'ec2_security_group': Step(ec2_security_group, ['vpc']),
+        'efs_security_group': Step(efs_security_group,
+                                   ['vpc', 'ec2_security_group']),
+    }
 
+
+def _apply_vpc(config, name, results):
+    """Store the created network resources in the configuration."""
+    config.vpc_id = results['vpc']
+    config.vpc_name = name
+    config.subnet_id = results['subnet']
+    config.ec2_security_group_id = results['ec2_security_group']
+    config.efs_security_group_id = results['efs_security_group']
     return {
-        'vpc_id': vpc_id,
+        'vpc_id': config.vpc_id,
         'vpc_name': name,
-        'subnet': subnet_id,
-        'ec2_security_group': ec2_security_group_id,
-        'efs_security_group': efs_security_group_id
+        'subnet': config.subnet_id,
+        'ec2_security_group': config.ec2_security_group_id,
+        'efs_security_group': config.efs_security_group_id
     }
 
 
-def generate_key_pair(config, path):
-    """Generate key pair and save it to the keys subdirectory
+def _key_pair(ec2, vpc_name, path, journal=None):
+    """Create a key pair and save it. Returns the key path.
 
-    Args:
-        config (aws_ml_helper.config.Config): Configuration
-        path (str): Path to the directory where the access key should be saved
+    If an interrupted run already created the key pair, its private key was
+    lost, so the key pair is created again.
     """
-    ec2 = boto.client('ec2', config)
-
-    print('Generating key-pair')
-    full_name = f'access-key-{config.vpc_name}'
+    click.echo('Generating key-pair')
+    full_name = f'access-key-{vpc_name}'
+    if journal is not None and journal.resource('key_pair'):
+        ec2.delete_key_pair(KeyName=full_name)
     response = ec2.create_key_pair(KeyName=full_name)
+    if journal is not None:
+        journal.created('key_pair', full_name)
     if not os.path.isdir(path):
         os.makedirs(path)
     key_path = os.path.join(path, f'{full_name}.pem')
+    if os.path.isfile(key_path):
+        os.remove(key_path)
     with io.open(key_path, 'w') as f:
         f.write(response['KeyMaterial'])
     os.chmod(key_path, 0o400)
-    config.access_key = key_path
+    return key_path
+
+
+def _file_system(efs, vpc_name, journal=None, check=None):
+    """Create an EFS file system and wait until it's available."""
+    click.echo('Creating EFS')
+    token = f'{vpc_name}-efs'
+    # An empty journal is falsy, so compare it with None
+    efs_id = journal.resource('file_system') if journal is not None else None
+    if efs_id is None or not check(efs_id):
+        response = efs.create_file_system(
+            CreationToken=token, Tags=[{'Key': 'Name', 'Value': token}]
+        )
+        efs_id = response['FileSystemId']
+        if journal is not None:
+            journal.created('file_system', efs_id)
+    # Wait until it's in the available state
+    until(
+        lambda: efs.describe_file_systems(
+            FileSystemId=efs_id
+        )['FileSystems'][0]['LifeCycleState'],
+        {'available'}, failed={'error', 'deleting', 'deleted'},
+        progress=report(f'EFS {efs_id}'), description=f'EFS {efs_id}'
+    )
+    return efs_id
+
+
+def _mount_target(efs, efs_id, subnet_id, security_group_id):
+    """Create the EFS mount target in the subnet."""
+    try:
+        retry(efs.create_mount_target, FileSystemId=efs_id,
+              SubnetId=subnet_id, SecurityGroups=[security_group_id])
+    except ClientError as e:
+        _ignore(e, 'MountTargetConflict')
+
+
+def create_vpc(config, name, network_range='10.0.0.0/16',
+               allowed_ip='0.0.0.0/32', availability_zone='us-east-1a',
+               workers=8):
+    """Creates a VPC
+
+    Independent resources (gateway, subnet, route table and security groups)
+    are created in parallel once the VPC exists. Created resources are
+    recorded in a journal, so running it again continues an interrupted
+    setup instead of starting over.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration object
+        name (str): VPC name
+        network_range (str): The IPv4 network range for the VPC, in CIDR
+            notation. For example, 10.0.0.0/16
+        allowed_ip (str): Public IP address from which the VPC instances will
+            be accessible in CIDR notation.
+        availability_zone: VPC availability zone
+        workers (int): Maximal number of parallel steps
+    """
+    ec2 = boto.client('ec2', config)
+    journal = Journal(config, 'vpc', name)
+    checks = _checks(ec2, boto.client('efs', config), name)
+    steps = _vpc_steps(ec2, name, network_range, allowed_ip,
+                       availability_zone, journal, checks)
+    results = dag.run(_resumable(steps, journal, checks), workers, VPC_STEPS)
+    vpc = _apply_vpc(config, name, results)
+    config.save()
+    return vpc
+
+
+def generate_key_pair(config, path):
+    """Generate key pair and save it to the keys subdirectory
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        path (str): Path to the directory where the access key should be saved
+    """
+    ec2 = boto.client('ec2', config)
+    config.access_key = _key_pair(ec2, config.vpc_name, path)
     config.save()
 
 
@@ -161,26 +390,161 @@ def create_efs(config):
         config (aws_ml_helper.config.Config): Configuration
     """
     efs = boto.client('efs', config)
-
-    print('Creating EFS')
-    token = f'{config.vpc_name}-efs'
-    response = efs.create_file_system(CreationToken=token)
-    efs_id = response['FileSystemId']
-    # Sleep for a second because the the object is created asynchronously. It's
-    # not created when the response comes back from the server.
-    time.sleep(1)
-    efs.create_tags(
-        FileSystemId=efs_id, Tags=[{'Key': 'Name', 'Value': token}]
-    )
-    # Wait until it's in the available state
-    while True:
-        response = efs.describe_file_systems(FileSystemId=efs_id)
-        if response['FileSystems'][0]['LifeCycleState'] == 'available':
-            break
-    efs.create_mount_target(
-        FileSystemId=efs_id,
-        SubnetId=config.subnet_id,
-        SecurityGroups=[config.efs_security_group_id]
-    )
+    efs_id = _file_system(efs, config.vpc_name)
+    _mount_target(efs, efs_id, config.subnet_id,
+                  config.efs_security_group_id)
     config.efs_id = efs_id
     config.save()
+
+
+def setup_vpc(config, name, network_range='10.0.0.0/16',
+              allowed_ip='0.0.0.0/32', availability_zone='us-east-1a',
+              key_dir=None, workers=8):
+    """Create the VPC, the access key and EFS.
+
+    All resources are created by one dependency graph, so the key pair and
+    the EFS file system are created while the network is being set up.
+    Every created resource is recorded in a journal as soon as it exists.
+    Running the setup again checks the recorded resources and continues
+    from the first missing step.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration object
+        name (str): VPC name
+        network_range (str): The IPv4 network range for the VPC
+        allowed_ip (str): Public IP address allowed to access the instances
+        availability_zone (str): VPC availability zone
+        key_dir (str): Path to the directory where the access key should be
+            saved
+        workers (int): Maximal number of parallel steps
+    """
+    ec2 = boto.client('ec2', config)
+    efs = boto.client('efs', config)
+    journal = Journal(config, 'vpc', name)
+    checks = _checks(ec2, efs, name)
+    steps = _vpc_steps(ec2, name, network_range, allowed_ip,
+                       availability_zone, journal, checks)
+    steps.update({
+        'key_pair': Step(lambda: _key_pair(ec2, name, key_dir, journal), []),
+        'file_system': Step(
+            lambda: _file_system(efs, name, journal, checks['file_system']),
+            []
+        ),
+        'mount_target': Step(
+            lambda file_system, subnet, efs_security_group: _mount_target(
+                efs, file_system, subnet, efs_security_group
+            ),
+            ['file_system', 'subnet', 'efs_security_group']
+        ),
+    })
+    results = dag.run(_resumable(steps, journal, checks), workers)
+    vpc = _apply_vpc(config, name, results)
+    config.access_key = results['key_pair']
+    config.efs_id = results['file_system']
+    config.save()
+    return vpc
+
+
+def teardown_vpc(config, name=None):
+    """Delete all resources recorded in the setup journal of a VPC.
+
+    Resources are deleted in the reverse order of their dependencies and
+    removed from the journal one by one, so an interrupted teardown can be
+    run again. Resources that no longer exist are skipped.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        name (str): VPC name. Default: from configuration
+    """
+    name = name or config.vpc_name
+    journal = Journal(config, 'vpc', name)
+    if not journal:
+        click.secho(f'No setup journal found for VPC "{name}"', fg='red')
+        return
+    ec2 = boto.client('ec2', config)
+    efs = boto.client('efs', config)
+
+    def resource(step):
+        return journal.get(step) or journal.resource(step)
+
+    def mount_target(efs_id):
+        for target in efs.describe_mount_targets(
+                FileSystemId=efs_id)['MountTargets']:
+            efs.delete_mount_target(MountTargetId=target['MountTargetId'])
+        until(lambda: len(efs.describe_mount_targets(
+            FileSystemId=efs_id
+        )['MountTargets']), lambda count: count == 0,
+            description=f'Mount targets of {efs_id}')
+
+    def key_pair(path):
+        ec2.delete_key_pair(KeyName=f'access-key-{name}')
+        if path and os.path.isfile(path):
+            os.remove(path)
+
+    def security_group(group_id):
+        # Network interfaces of deleted mount targets take a while to go
+        retry(ec2.delete_security_group, GroupId=group_id, timeout=600,
+              errors=('DependencyViolation',))
+
+    def route(_):
+        if resource('route_table'):
+            ec2.delete_route(RouteTableId=resource('route_table'),
+                             DestinationCidrBlock='0.0.0.0/0')
+
+    def attach_gateway(_):
+        if resource('gateway') and resource('vpc'):
+            ec2.detach_internet_gateway(InternetGatewayId=resource('gateway'),
+                                        VpcId=resource('vpc'))
+
+    deletes = {
+        'mount_target': mount_target,
+        'file_system': lambda efs_id: retry(
+            efs.delete_file_system, FileSystemId=efs_id, timeout=300,
+            errors=('FileSystemInUse',)
+        ),
+        'key_pair': key_pair,
+        'efs_security_group': security_group,
+        'ec2_security_group': security_group,
+        'route': route,
+        'associate_route_table': lambda association_id: (
+            ec2.disassociate_route_table(AssociationId=association_id)
+        ),
+        'route_table': lambda route_table_id: ec2.delete_route_table(
+            RouteTableId=route_table_id
+        ),
+        'subnet': lambda subnet_id: retry(
+            ec2.delete_subnet, SubnetId=subnet_id, timeout=600,
+            errors=('DependencyViolation',)
+        ),
+        'attach_gateway': attach_gateway,
+        'gateway': lambda gateway_id: ec2.delete_internet_gateway(
+            InternetGatewayId=gateway_id
+        ),
+        'vpc': lambda vpc_id: retry(
+            ec2.delete_vpc, VpcId=vpc_id, timeout=600,
+            errors=('DependencyViolation',)
+        ),
+    }
+    vpc_id = resource('vpc')
+    for step in TEARDOWN_STEPS:
+        # Mount targets are found through the file system
+        value = resource('file_system' if step == 'mount_target' else step)
+        if value is None and not journal.done(step):
+            continue
+        click.echo(f'Delete {step.replace("_", " ")}')
+        try:
+            deletes[step](value)
+        except ClientError as e:
+            _ignore(e, 'NotFound', 'NotAttached')
+        journal.delete(step)
+    journal.remove()
+
+    if vpc_id is not None and config.vpc_id == vpc_id:
+        config.vpc_id = ''
+        config.vpc_name = ''
+        config.subnet_id = ''
+        config.ec2_security_group_id = ''
+        config.efs_security_group_id = ''
+        config.efs_id = ''
+        config.access_key = ''
+        config.save()
@@ -0,0 +1,252 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import time
+import click
+import random
+from botocore.exceptions import ClientError
+from aws_ml_helper import describe, tracing
+
+
+# Default backoff: first delay, maximal delay, growth factor and relative
+# jitter. Default overall timeout in seconds.
+DELAY = 1.0
+MAX_DELAY = 30.0
+FACTOR = 1.5
+JITTER = 0.25
+TIMEOUT = 600
+
+
+class WaitError(Exception):
+    pass
+
+
+class WaitTimeout(WaitError):
+    pass
+
+
+def error_code(error):
+    """Returns the AWS error code of a client error.
+
+    Args:
+        error (botocore.exceptions.ClientError): Error
+    """
+    return error.response.get('Error', {}).get('Code', '')
+
+
+def _missing(error):
+    """Is this an error for a resource that doesn't exist (yet)?
+
+    Resources are created asynchronously, so for a short time after the
+    create call they may be reported as missing.
+
+    Args:
+        error (botocore.exceptions.ClientError): Error
+    """
+    return error_code(error).endswith('NotFound')
+
+
+def delays(delay=DELAY, max_delay=MAX_DELAY, factor=FACTOR, jitter=JITTER):
+    """Generate exponentially growing delays with random jitter.
+
+    Args:
+        delay (float): First delay in seconds
+        max_delay (float): Maximal delay in seconds
+        factor (float): Growth factor
+        jitter (float): Relative jitter, every delay is randomly picked from
+            `[delay * (1 - jitter), delay * (1 + jitter)]`.
+    """
+    while True:
+        yield delay * random.uniform(1 - jitter, 1 + jitter)
+        delay = min(delay * factor, max_delay)
+
+
+def until(fetch, ready, failed=(), timeout=TIMEOUT, progress=None,
+          description='resource', **backoff):
+    """Wait until a resource reaches a state.
+
+    `fetch` is called after every delay. Missing resource errors are treated
+    as a `None` state, because new resources may not be visible yet.
+
+    Args:
+        fetch (callable): Returns the current state
+        ready (callable or collection): Predicate on the state or the
+            collection of states in which the wait is over
+        failed (collection): States in which the wait failed
+        timeout (float): Overall timeout in seconds. `None` waits forever.
+        progress (callable): Called with `(state, elapsed)` after every
+            check
+        description (str): Resource description used in errors
+        backoff: Backoff arguments passed to `delays`
+
+    Returns:
+        The final state
+
+    Raises:
+        WaitError: If the resource reaches a failed state
+        WaitTimeout: If the resource is not ready in time
+    """
+    is_ready = ready if callable(ready) else (lambda state: state in ready)
+    start = time.monotonic()
+    for delay in delays(**backoff):
+        try:
+            state = fetch()
+        except ClientError as e:
+            if not _missing(e):
+                raise
+            state = None
+        elapsed = time.monotonic() - start
+        if progress is not None:
+            progress(state, elapsed)
+        if state is not None and is_ready(state):
+            return state
+        if state in failed:
+            raise WaitError(f'{description} is in state "{state}"')
+        if timeout is not None:
+            if elapsed >= timeout:
+                raise WaitTimeout(
+                    f'{description} not ready after {elapsed:.0f}s '
+                    f'(state "{state}")'
+                )
+            delay = min(delay, timeout - elapsed)
+        tracing.sleep(delay)
+
+
+def each(config, kind, ids, ready, failed=(), timeout=TIMEOUT, progress=None,
+         state_of=describe.state_of, **backoff):
+    """Wait for many resources, yielding each one as soon as it's ready.
+
+    Every check makes a single Describe call for all pending resources. The
+    resources are selected with an id filter instead of a list of ids, so
+    resources that are not visible yet are simply missing from the response
+    instead of failing the whole call. Snapshots and images are also
+    limited to the account, so public ones are not scanned.
+
+    Args:
+        config (aws_ml_helper.config.Config): Configuration
+        kind (str): Resource kind (instance, volume, snapshot, image)
+        ids (list of str): Resource ids
+        ready (callable or collection): Predicate on the state or the
+            collection of states in which the wait is over
+        failed (collection): States in which the wait failed
+        timeout (float): Overall timeout in seconds. `None` waits forever.
+        progress (callable): Called with `(state, elapsed, resource_id)`
+            for every pending resource after every check
+        state_of (callable): Returns the state from the kind and the raw
+            Describe item, or `None` if it's not known yet. Default: the
+            resource state.
+        backoff: Backoff arguments passed to `delays`
+
+    Yields:
+        tuple: `(resource_id, item)` where item is the raw Describe item
+
+    Raises:
+        WaitError: If some resources reached a failed state. Raised after
+            all other resources are ready.
+        WaitTimeout: If the resources are not ready in time
+    """
+    is_ready = ready if callable(ready) else (lambda state: state in ready)
+    id_key = describe.KINDS[kind][2]
+    pending = set(ids)
+    failures = {}
+    start = time.monotonic()
+    for delay in delays(**backoff):
+        if not pending:
+            break
+        items = {
+            item[id_key]: item
+            for item in describe.items(
+                config, kind,
+                Filters=[{'Name': f'{kind}-id', 'Values': sorted(pending)}],
+                **describe.account_args(config, kind)
+            )
+        }
+        elapsed = time.monotonic() - start
+        for resource_id in sorted(pending):
+            item = items.get(resource_id)
+            state = item and state_of(kind, item)
+            if progress is not None:
+                progress(state, elapsed, resource_id)
+            if state is not None and is_ready(state):
+                pending.discard(resource_id)
+                yield resource_id, item
+            elif state in failed:
+                pending.discard(resource_id)
+                failures[resource_id] = state
+        if not pending:
+            break
+        if timeout is not None:
+            if elapsed >= timeout:
+                raise WaitTimeout(
+                    f'{kind.capitalize()}s not ready after {elapsed:.0f}s: '
+                    f'{", ".join(sorted(pending))}'
+                )
+            delay = min(delay, timeout - elapsed)
+        tracing.sleep(delay)
+    if failures:
+        raise WaitError(', '.join(
+            f'{kind.capitalize()} {resource_id} is in state "{state}"'
+            for resource_id, state in sorted(failures.items())
+        ))
+
+
+def all_ready(config, kind, ids, ready, failed=(), timeout=TIMEOUT,
+              progress=None, state_of=describe.state_of, **backoff):
+    """Wait for many resources and return them when all are ready.
+
+    Arguments are the same as for `each`.
+
+    Returns:
+        dict: Resource id to raw Describe item
+    """
+    return dict(each(config, kind, ids, ready, failed, timeout, progress,
+                     state_of, **backoff))
+
+
+def retry(func, *args, timeout=60, errors=('NotFound',), **kwargs):
+    """Call a function retrying while the resource it uses is missing.
+
+    Use it for calls made right after a resource is created, instead of
+    sleeping for a fixed time.
+
+    Args:
+        func (callable): Function to call, usually a client method
+        args: Positional arguments
+        timeout (float): Overall timeout in seconds
+        errors (tuple of str): Retry on error codes ending with one of
+            these. Default: missing resource errors
+        kwargs: Keyword arguments
+
+    Returns:
+        The function result
+    """
+    start = time.monotonic()
+    for delay in delays(delay=0.25, max_delay=5):
+        try:
+            return func(*args, **kwargs)
+        except ClientError as e:
+            elapsed = time.monotonic() - start
+            if (not error_code(e).endswith(errors) or
+                    elapsed + delay > timeout):
+                raise
+        tracing.sleep(delay)
+
+
+def report(description):
+    """Returns a progress callback that prints state changes.
+
+    Args:
+        description (str): Resource description
+    """
+    last = {}
+
+    def progress(state, elapsed, resource_id=None):
+        if state is not None and last.get(resource_id) != state:
+            last[resource_id] = state
+            name = description if resource_id is None else (
+                f'{description} {resource_id}'
+            )
+            click.echo(f'{name}: {state} ({elapsed:.0f}s)')
+
+    return progress
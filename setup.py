@@ -35,6 +35,10 @@ setup(
     license='BSD',
     packages=find_packages(),
     install_requires=io.open('requirements.txt').read().splitlines(),
+    extras_require={
+        # Concurrent multi-region listings on one event loop
+        'async': ['aiobotocore'],
+    },
     scripts=[],
     entry_points='''
         [console_scripts]
@@ -0,0 +1,98 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import os
+import pytest
+import paramiko
+from unittest import mock
+from botocore.stub import Stubber
+from aws_ml_helper import boto
+from aws_ml_helper.config import Config
+
+
+# Test profile. Rate limiting and retries are off, so stubbed calls return
+# right away.
+CONFIG = """\
+[default]
+account = 123456789012
+aws_access_key_id = testing
+aws_secret_access_key = testing
+region = us-east-1
+availability_zone = us-east-1a
+vpc_name = test
+ami_username = ubuntu
+access_key = /tmp/test.pem
+retry_mode = standard
+max_attempts = 1
+rate_limits =
+"""
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    """Path to a test configuration file in a temporary directory."""
+    path = tmp_path / 'config.ini'
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(CONFIG)
+    return str(path)
+
+
+@pytest.fixture
+def config(config_path):
+    """Test configuration with an empty client registry."""
+    boto.invalidate()
+    yield Config(config_path)
+    boto.invalidate()
+
+
+@pytest.fixture
+def ec2(config):
+    """Stubber of the registry EC2 client."""
+    with Stubber(boto.client('ec2', config)) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+class LocalFile(io.FileIO):
+    def set_pipelined(self, pipelined=True):
+        pass
+
+    def prefetch(self, file_size=None):
+        pass
+
+
+class LocalSFTP(object):
+    """SFTP client stand-in that works on the local file system."""
+
+    def stat(self, path):
+        return paramiko.SFTPAttributes.from_stat(os.stat(path))
+
+    def listdir_attr(self, path):
+        return [paramiko.SFTPAttributes.from_stat(os.stat(entry.path),
+                                                  entry.name)
+                for entry in os.scandir(path)]
+
+    def open(self, path, mode='r'):
+        return LocalFile(path, mode.replace('b', ''))
+
+    def utime(self, path, times):
+        os.utime(path, times)
+
+    def mkdir(self, path):
+        os.mkdir(path)
+
+    def posix_rename(self, source, destination):
+        os.replace(source, destination)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sftp():
+    """SFTP channels that work on the local file system."""
+    with mock.patch('paramiko.SFTPClient.from_transport',
+                    return_value=LocalSFTP()):
+        yield
@@ -0,0 +1,76 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import collections
+from unittest import mock
+from boto3.session import Session
+from botocore.stub import Stubber
+from click.testing import CliRunner
+from aws_ml_helper import boto
+from aws_ml_helper.commands import cli
+
+
+def tags(name):
+    return [{'Key': 'Name', 'Value': name}]
+
+
+def test_one_client_per_service(config, config_path):
+    """`volume-attach` looks up a volume and an instance and attaches the
+    volume, all through one EC2 client."""
+    constructed = collections.Counter()
+    resources = collections.Counter()
+    stubbers = []
+    client, resource = Session.client, Session.resource
+
+    def build_client(self, service, *args, **kwargs):
+        constructed[service] += 1
+        c = client(self, service, *args, **kwargs)
+        stubber = Stubber(c)
+        stubber.add_response('describe_volumes', {'Volumes': [{
+            'VolumeId': 'vol-1', 'Size': 8, 'State': 'available',
+            'Tags': tags('data')
+        }]})
+        stubber.add_response('describe_instances', {'Reservations': [{
+            'Instances': [{'InstanceId': 'i-1', 'State': {'Name': 'running'},
+                           'Tags': tags('worker')}]
+        }]})
+        stubber.add_response('attach_volume', {}, {
+            'Device': 'xvdh', 'InstanceId': 'i-1', 'VolumeId': 'vol-1'
+        })
+        stubber.activate()
+        stubbers.append(stubber)
+        return c
+
+    def build_resource(self, service, *args, **kwargs):
+        resources[service] += 1
+        return resource(self, service, *args, **kwargs)
+
+    with mock.patch.object(Session, 'client', autospec=True,
+                           side_effect=build_client), \
+            mock.patch.object(Session, 'resource', autospec=True,
+                              side_effect=build_resource):
+        result = CliRunner().invoke(cli, [
+            '--config', config_path, 'volume-attach', 'data', 'worker'
+        ])
+
+    assert result.exit_code == 0, result.output
+    assert constructed == {'ec2': 1}
+    assert resources == {'ec2': 1}
+    for stubber in stubbers:
+        stubber.assert_no_pending_responses()
+
+
+def test_registry(config):
+    ec2 = boto.client('ec2', config)
+    assert boto.client('ec2', config) is ec2
+    assert boto.resource('ec2', config).meta.client is ec2
+    assert boto.client('ec2', config, 'eu-west-1') is not ec2
+    assert boto.session(config) is boto.session(config)
+
+
+def test_set_invalidates(config):
+    ec2 = boto.client('ec2', config)
+    config.set('region', 'eu-west-1')
+    assert boto.client('ec2', config) is not ec2
+    assert boto.client('ec2', config).meta.region_name == 'eu-west-1'
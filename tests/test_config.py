@@ -0,0 +1,28 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper.config import Config
+
+
+def test_lazy_load(config_path):
+    config = Config(config_path)
+    config.region = 'eu-west-1'
+    assert not config._loaded
+    assert config.account == '123456789012'
+    assert config.region == 'eu-west-1'
+
+
+def test_concurrent_first_access(config_path):
+    for _ in range(20):
+        config = Config(config_path)
+        barrier = threading.Barrier(8)
+
+        def read(_):
+            barrier.wait()
+            return config.region
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            assert set(executor.map(read, range(8))) == {'us-east-1'}
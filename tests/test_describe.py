@@ -0,0 +1,83 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import tracemalloc
+from unittest import mock
+from aws_ml_helper import boto, describe
+from aws_ml_helper.utils import name_from_tags
+from aws_ml_helper.volume import volumes
+
+
+COUNT = 10000
+
+
+def stub_pages(ec2, page_size, count=COUNT):
+    """Queue `count` volumes in pages of `page_size`."""
+    for start in range(0, count, page_size):
+        response = {'Volumes': [
+            {'VolumeId': f'vol-{i}', 'Size': 8, 'State': 'available',
+             'Attachments': [], 'Tags': [{'Key': 'Name', 'Value': f'v{i}'}]}
+            for i in range(start, min(start + page_size, count))
+        ]}
+        params = {'MaxResults': page_size}
+        if start > 0:
+            params['NextToken'] = str(start)
+        if start + page_size < count:
+            response['NextToken'] = str(start + page_size)
+        ec2.add_response('describe_volumes', response, params)
+
+
+def test_one_call_per_page(config, ec2):
+    stub_pages(ec2, 100)
+    pages = list(describe.pages(config, 'volume', 100))
+    assert len(pages) == 100
+    assert sum(len(page) for page in pages) == COUNT
+
+
+def test_listing_uses_raw_pages(config, ec2, capsys):
+    stub_pages(ec2, 1000)
+    # No resource objects are built, so nothing can be lazy loaded
+    with mock.patch.object(boto, 'resource', side_effect=AssertionError):
+        volumes(config, output='jsonl', page_size=1000)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == COUNT
+    assert lines[-1] == ('{"name": "v9999", "id": "vol-9999", "size": 8, '
+                         '"state": "available", "attachments": ""}')
+
+
+def measure(rows):
+    """Returns the last row and the peak memory of building the rows one by
+    one."""
+    tracemalloc.start()
+    try:
+        last = None
+        for last in rows:
+            pass
+        return last, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_raw_pages_against_resources(config, ec2):
+    """The resource collection path the listings used before builds a
+    resource object per row, raw pages only the row."""
+    stub_pages(ec2, 1000)
+    raw, raw_peak = measure(
+        (name_from_tags(v.get('Tags')), v['VolumeId'], v['Size'],
+         v['State'], ', '.join(a['InstanceId'] for a in v['Attachments']))
+        for v in describe.items(config, 'volume', 1000)
+    )
+    stub_pages(ec2, 1000)
+    collection = boto.resource('ec2', config).volumes.page_size(1000)
+    with mock.patch.object(ec2.client, 'describe_volumes',
+                           wraps=ec2.client.describe_volumes) as calls:
+        resource, resource_peak = measure(
+            (name_from_tags(v.tags), v.id, v.size, v.state,
+             ', '.join(a['InstanceId'] for a in v.attachments))
+            for v in collection
+        )
+    assert raw == resource == ('v9999', 'vol-9999', 8, 'available', '')
+    # Reading the attributes didn't load any volume one by one
+    assert calls.call_count == 10
+    assert raw_peak * 2 < resource_peak
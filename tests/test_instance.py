@@ -0,0 +1,166 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+from unittest import mock
+from click.testing import CliRunner
+from aws_ml_helper import ssh
+from aws_ml_helper.inventory import Inventory
+from aws_ml_helper.names import NameCache
+from aws_ml_helper.commands import cli
+from aws_ml_helper.instance import (
+    LIVE, get_instances, select_instances, run_many, start
+)
+
+
+def instance(instance_id, name, state='running', ip=None):
+    data = {'InstanceId': instance_id, 'State': {'Name': state},
+            'Tags': [{'Key': 'Name', 'Value': name}]}
+    if ip is not None:
+        data['PublicIpAddress'] = ip
+    return data
+
+
+def reservations(*instances):
+    return {'Reservations': [{'Instances': list(instances)}]}
+
+
+RUNNING = {'Name': 'instance-state-name', 'Values': ['running']}
+
+
+def test_resolve_names_at_once(config, ec2, capsys):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1'),
+        instance('i-2', 'worker-2', state='stopped'),
+        instance('i-3', 'worker-3'),
+        instance('i-4', 'worker-3'),
+    ), {'Filters': [{'Name': 'tag:Name',
+                     'Values': ['worker-1', 'worker-2', 'worker-3',
+                                'worker-4']}, LIVE]})
+    found = get_instances(
+        config, ['worker-1', 'worker-2', 'worker-3', 'worker-4', 'worker-1']
+    )
+    assert {name: i and i.id for name, i in found.items()} == {
+        'worker-1': 'i-1', 'worker-2': 'i-2', 'worker-3': None,
+        'worker-4': None,
+    }
+    out = capsys.readouterr().out
+    assert 'Multiple instances with name "worker-3" found.' in out
+    assert 'Instance "worker-4" not found' in out
+    cache = NameCache(config)
+    assert cache.get('instance', 'worker-1') == 'i-1'
+    assert cache.get('instance', 'worker-3') is None
+
+
+def test_resolve_stale_cache(config, ec2):
+    cache = NameCache(config)
+    cache.update('instance', {'worker-1': 'i-old', 'worker-2': 'i-2'})
+    # i-old is terminated or gone, i-2 still exists
+    ec2.add_response('describe_instances', reservations(
+        instance('i-2', 'worker-2'),
+    ), {'InstanceIds': ['i-old', 'i-2'], 'Filters': [LIVE]})
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1'),
+    ), {'Filters': [{'Name': 'tag:Name', 'Values': ['worker-1']}, LIVE]})
+    found = get_instances(config, ['worker-1', 'worker-2'])
+    assert {name: i.id for name, i in found.items()} == {
+        'worker-1': 'i-1', 'worker-2': 'i-2'
+    }
+    assert NameCache(config).get('instance', 'worker-1') == 'i-1'
+
+
+def test_resolve_from_inventory_skips_terminated(config, ec2):
+    with Inventory.open(config) as store:
+        store.replace('instance', [
+            instance('i-0', 'worker', state='terminated'),
+            instance('i-1', 'worker'),
+        ])
+    config.max_age = float('inf')
+    assert get_instances(config, ['worker'])['worker'].id == 'i-1'
+
+
+def test_select_skips_stopped(config, ec2):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1', ip='10.0.0.1'),
+        instance('i-2', 'worker-2', state='stopped'),
+    ), {'Filters': [{'Name': 'tag:Name',
+                     'Values': ['worker-1', 'worker-2']}, LIVE]})
+    selected = select_instances(config, ['worker-1', 'worker-2'])
+    assert [i.id for i in selected] == ['i-1']
+
+
+def test_select_brackets_locally(config, ec2):
+    # EC2 filters don't understand [...], only the state is filtered
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1'),
+        instance('i-2', 'worker-2'),
+        instance('i-3', 'worker-3'),
+    ), {'Filters': [RUNNING]})
+    selected = select_instances(config, ['worker-[12]'])
+    assert [i.id for i in selected] == ['i-1', 'i-2']
+
+
+def test_select_wildcards_remotely(config, ec2):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1'),
+    ), {'Filters': [RUNNING, {'Name': 'tag:Name', 'Values': ['worker-*']}]})
+    selected = select_instances(config, ['worker-*'])
+    assert [i.id for i in selected] == ['i-1']
+
+
+def test_run_many_exit_code(config, config_path, ec2):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker-1', ip='10.0.0.1'),
+        instance('i-2', 'worker-2'),
+    ), {'Filters': [RUNNING, {'Name': 'tag:Name', 'Values': ['worker-*']}]})
+    with mock.patch.object(ssh, 'connect') as connect, \
+            mock.patch.object(ssh, 'execute',
+                              return_value=ssh.Result('', '', 0)):
+        result = CliRunner().invoke(cli, [
+            '--config', config_path, 'run', 'worker-*', 'true'
+        ])
+    # worker-2 has no public IP, it's reported and never connected to
+    connect.assert_called_once_with(mock.ANY, '10.0.0.1', None)
+    assert 'no public ip' in result.output
+    assert result.exit_code == 1
+
+
+def test_cp_stopped_instance(config, config_path, ec2):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker', state='stopped'),
+    ))
+    with mock.patch.object(ssh, 'connect') as connect:
+        result = CliRunner().invoke(cli, [
+            '--config', config_path, 'cp', 'worker:/data/file.txt', '.'
+        ])
+    connect.assert_not_called()
+    assert 'Instance "worker": instance is stopped' in result.output
+    assert result.exit_code == 1
+
+
+def test_run_many_results(config):
+    instances = [mock.Mock(id='i-1', tags=[], state={'Name': 'running'},
+                           public_ip_address='10.0.0.1'),
+                 mock.Mock(id='i-2', tags=[], state={'Name': 'running'},
+                           public_ip_address=None)]
+    with mock.patch.object(ssh, 'connect'), \
+            mock.patch.object(ssh, 'execute',
+                              return_value=ssh.Result('', '', 3)):
+        results = run_many(config, instances, 'false')
+    assert results == {'i-1': 3, 'i-2': None}
+
+
+def test_start_stopping_instance(config, ec2, capsys):
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker', state='stopping'),
+    ), {'Filters': [{'Name': 'tag:Name', 'Values': ['worker']}, LIVE]})
+    by_id = {'Filters': [{'Name': 'instance-id', 'Values': ['i-1']}]}
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker', state='stopped'),
+    ), by_id)
+    ec2.add_response('start_instances', {}, {'InstanceIds': ['i-1']})
+    ec2.add_response('describe_instances', reservations(
+        instance('i-1', 'worker', ip='10.0.0.1'),
+    ), by_id)
+    start(config, 'worker', None, None)
+    assert 'Instance ID: i-1' in capsys.readouterr().out
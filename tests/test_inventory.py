@@ -0,0 +1,111 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import sqlite3
+import pytest
+from unittest import mock
+from aws_ml_helper import boto, inventory
+from aws_ml_helper.inventory import Inventory
+from aws_ml_helper.volume import get_volumes
+
+
+def volumes(*ids, token=None):
+    response = {'Volumes': [{'VolumeId': i, 'State': 'available',
+                             'Tags': [{'Key': 'Name', 'Value': i}]}
+                            for i in ids]}
+    if token is not None:
+        response['NextToken'] = token
+    return response
+
+
+@pytest.fixture
+def connections():
+    """Track the SQLite connections opened by the inventory."""
+    opened = []
+    connect = sqlite3.connect
+
+    def tracked(*args, **kwargs):
+        opened.append(connect(*args, **kwargs))
+        return opened[-1]
+
+    with mock.patch.object(inventory.sqlite3, 'connect', side_effect=tracked):
+        yield opened
+    for connection in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            connection.execute('SELECT 1')
+
+
+def stored_ids(config):
+    with Inventory.open(config) as store:
+        return [v['VolumeId'] for v in store.items('volume')]
+
+
+def test_disabled_listing_is_not_stored(config, ec2, connections):
+    ec2.add_response('describe_volumes', volumes('vol-1', 'vol-2'))
+    assert [v['VolumeId'] for v in inventory.items(config, 'volume')] == [
+        'vol-1', 'vol-2'
+    ]
+    assert connections == []
+    assert stored_ids(config) == []
+
+
+def test_listing_is_stored_page_by_page(config, ec2, connections):
+    config.inventory_max_age = '3600'
+    ec2.add_response('describe_volumes', volumes('vol-1', 'vol-2', token='2'))
+    ec2.add_response('describe_volumes', volumes('vol-3'))
+    listing = inventory.items(config, 'volume', page_size=2)
+    assert [next(listing), next(listing)] == volumes('vol-1', 'vol-2')[
+        'Volumes'
+    ]
+    # Nothing is replaced before the last page
+    assert stored_ids(config) == []
+    assert [v['VolumeId'] for v in listing] == ['vol-3']
+    assert stored_ids(config) == ['vol-1', 'vol-2', 'vol-3']
+
+    config.max_age = float('inf')
+    assert [v['VolumeId'] for v in inventory.items(config, 'volume')] == [
+        'vol-1', 'vol-2', 'vol-3'
+    ]
+
+
+def test_interrupted_listing_keeps_the_store(config, ec2, connections):
+    # Enabled, but the stored volumes are always too old to be used
+    config.inventory_max_age = '0.000001'
+    with Inventory.open(config) as store:
+        store.replace('volume', volumes('vol-0')['Volumes'])
+    ec2.add_response('describe_volumes', volumes('vol-1', token='1'))
+    listing = inventory.items(config, 'volume', page_size=1)
+    next(listing)
+    listing.close()
+    assert stored_ids(config) == ['vol-0']
+
+    # A new listing doesn't see the items staged by the interrupted one
+    ec2.add_response('describe_volumes', volumes('vol-2'))
+    list(inventory.items(config, 'volume'))
+    assert stored_ids(config) == ['vol-2']
+
+
+def test_mutations_invalidate(config, ec2, connections):
+    with Inventory.open(config) as store:
+        store.replace('volume', volumes('vol-1')['Volumes'])
+        assert store.age('volume') is not None
+    ec2.add_response('delete_volume', {})
+    boto.client('ec2', config).delete_volume(VolumeId='vol-1')
+    with Inventory.open(config) as store:
+        assert store.age('volume') is None
+
+
+def test_refresh(config, ec2, connections):
+    ec2.add_response('describe_volumes', volumes('vol-1', 'vol-2'))
+    assert inventory.refresh(config, ['volume'], workers=1) == {'volume': 2}
+    assert stored_ids(config) == ['vol-1', 'vol-2']
+
+
+def test_names_from_the_store(config, ec2, connections):
+    with Inventory.open(config) as store:
+        store.replace('volume', volumes('vol-1', 'vol-2')['Volumes'])
+    config.max_age = float('inf')
+    found = get_volumes(config, ['vol-2', 'vol-3'], quiet=True)
+    assert found['vol-2'].id == 'vol-2'
+    assert found['vol-3'] is None
@@ -0,0 +1,31 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from aws_ml_helper.names import NameCache
+
+
+def test_cache(config):
+    cache = NameCache(config)
+    cache.set('instance', 'worker', 'i-1')
+    assert NameCache(config).get('instance', 'worker') == 'i-1'
+    cache.delete('instance', 'worker')
+    assert NameCache(config).get('instance', 'worker') is None
+
+
+def test_concurrent_saves(config):
+    def save(i):
+        NameCache(config).set('instance', f'worker-{i}', f'i-{i}')
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        list(executor.map(save, range(200)))
+
+    directory = os.path.dirname(config.config)
+    assert not [f for f in os.listdir(directory) if f.endswith('.tmp')]
+    with open(NameCache(config).path) as f:
+        entries = json.load(f)['default:us-east-1']['instance']
+    assert sorted(entries) == sorted(f'worker-{i}' for i in range(200))
+    assert all(entries[f'worker-{i}'][0] == f'i-{i}' for i in range(200))
@@ -0,0 +1,142 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import pytest
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from aws_ml_helper import prices
+
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+DAY = timedelta(days=1)
+
+
+def price(time, value, zone='us-east-1a'):
+    return {'AvailabilityZone': zone, 'InstanceType': 'p3.2xlarge',
+            'ProductDescription': 'Linux/UNIX', 'SpotPrice': str(value),
+            'Timestamp': time}
+
+
+def expect(ec2, start, end, items):
+    ec2.add_response('describe_spot_price_history',
+                     {'SpotPriceHistory': items},
+                     {'StartTime': start, 'EndTime': end,
+                      'InstanceTypes': ['p3.2xlarge']})
+
+
+def test_only_missing_periods_are_fetched(config, ec2):
+    expect(ec2, START, START + 2 * DAY, [price(START, 1.0),
+                                         price(START + DAY, 2.0)])
+    groups = prices.history(config, ['p3.2xlarge'], START, START + 2 * DAY)
+    times, values = groups[prices.Key('us-east-1', 'us-east-1a',
+                                      'Linux/UNIX', 'p3.2xlarge')]
+    assert list(values) == [1.0, 2.0]
+
+    # A stored period is answered without any calls
+    prices.history(config, ['p3.2xlarge'], START, START + DAY)
+
+    # A longer period fetches only the part before and after the stored one
+    expect(ec2, START - DAY, START, [price(START - DAY, 0.5)])
+    expect(ec2, START + 2 * DAY, START + 3 * DAY,
+           [price(START + 2 * DAY, 3.0)])
+    groups = prices.history(config, ['p3.2xlarge'], START - DAY,
+                            START + 3 * DAY)
+    times, values = groups[prices.Key('us-east-1', 'us-east-1a',
+                                      'Linux/UNIX', 'p3.2xlarge')]
+    assert list(values) == [0.5, 1.0, 2.0, 3.0]
+
+    store = prices.PriceStore.open(config)
+    assert store.coverage('us-east-1', 'p3.2xlarge') == (
+        (START - DAY).timestamp(), (START + 3 * DAY).timestamp()
+    )
+
+
+def test_offline(config, ec2):
+    assert prices.history(config, ['p3.2xlarge'], START, START + DAY,
+                          refresh=False) == {}
+
+
+def test_time_weighted_stats():
+    # 1.0 for 10s, 5.0 for 90s and 2.0 for the last 100s
+    times = np.array([0.0, 10.0, 100.0])
+    values = np.array([1.0, 5.0, 2.0])
+    s = prices.stats(times, values, 0, 200, bid=2.0)
+    assert s['mean'] == pytest.approx(3.3)
+    assert values.mean() == pytest.approx(2.667, abs=1e-3)
+    assert (s['min'], s['median'], s['p90'], s['max']) == (1.0, 2.0, 5.0,
+                                                           5.0)
+    std = np.sqrt((10 * 2.3 ** 2 + 90 * 1.7 ** 2 + 100 * 1.3 ** 2) / 200)
+    assert s['volatility'] == pytest.approx(std / 3.3)
+    assert s['samples'] == 3
+    assert s['under_bid'] == pytest.approx(110 / 200)
+    assert s['mean_under_bid'] == pytest.approx((10 + 200) / 110)
+    assert s['interruptions'] == 1
+
+
+def test_stats_period():
+    times = np.array([0.0, 10.0, 100.0])
+    values = np.array([1.0, 5.0, 2.0])
+    # The price set before the start is in effect at the start
+    s = prices.stats(times, values, 50, 150, percentile=25)
+    assert s['mean'] == pytest.approx((50 * 5.0 + 50 * 2.0) / 100)
+    assert s['p25'] == 2.0
+    assert s['under_bid'] is None
+
+
+def zone(name):
+    return prices.Key('us-east-1', name, 'Linux/UNIX', 'p3.2xlarge')
+
+
+# One day of prices: `a` is 1.0 for half a day and 3.0 for the other half,
+# `b` swings between 0.5 and 4.0 every six hours and `c` is always 5.0
+HOUR = 3600.0
+GROUPS = {
+    zone('us-east-1a'): (np.array([0, 12 * HOUR]), np.array([1.0, 3.0])),
+    zone('us-east-1b'): (np.array([0, 6, 12, 18]) * HOUR,
+                         np.array([0.5, 4.0, 0.5, 4.0])),
+    zone('us-east-1c'): (np.array([0.0]), np.array([5.0])),
+}
+
+
+def test_advise_calculated_bids():
+    candidates = prices.advise(GROUPS, 0, 24 * HOUR, headroom=0.1)
+    # The p90 price with 10% headroom is never exceeded
+    assert [(c['key'].availability_zone, c['bid'], c['availability'],
+             c['interruptions']) for c in candidates] == [
+        ('us-east-1a', 3.3, 1.0, 0), ('us-east-1b', 4.4, 1.0, 0),
+        ('us-east-1c', 5.5, 1.0, 0)
+    ]
+    assert [c['price'] for c in candidates] == pytest.approx([2.0, 2.25, 5.0])
+    assert [c['score'] for c in candidates] == pytest.approx([2.0, 2.25, 5.0])
+
+
+def test_advise_fixed_bid():
+    candidates = prices.advise(GROUPS, 0, 24 * HOUR, bid=2.0)
+    # `b` is interrupted twice a day but it's so cheap while running that
+    # it's still the best, `c` is never under the bid
+    assert [c['key'].availability_zone for c in candidates] == [
+        'us-east-1b', 'us-east-1a'
+    ]
+    b, a = candidates
+    assert (b['bid'], b['price'], b['availability'], b['interruptions'],
+            b['score']) == (2.0, 0.5, 0.5, 2.0, 1.0)
+    assert (a['bid'], a['price'], a['availability'], a['interruptions'],
+            a['score']) == (2.0, 1.0, 0.5, 1.0, 2.0)
+
+
+def test_advise_interruptions_per_day():
+    # Four days of `b` are interrupted twice a day
+    times = np.arange(16) * 6 * HOUR
+    values = np.tile([0.5, 4.0], 8)
+    candidate, = prices.advise({zone('us-east-1b'): (times, values)},
+                               0, 96 * HOUR, bid=2.0)
+    assert candidate['interruptions'] == 2.0
+
+
+def test_summarize():
+    summary = prices.summarize(GROUPS, 0, 24 * HOUR, bid=2.0)
+    assert summary[zone('us-east-1a')]['mean'] == 2.0
+    assert summary[zone('us-east-1b')]['under_bid'] == 0.5
+    assert summary[zone('us-east-1c')]['under_bid'] == 0.0
+    assert summary[zone('us-east-1c')]['mean_under_bid'] is None
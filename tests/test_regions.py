@@ -0,0 +1,175 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import sys
+import time
+import types
+import pytest
+import asyncio
+from unittest import mock
+from botocore.stub import Stubber
+from aws_ml_helper import boto, describe
+from aws_ml_helper.instance import instances
+
+
+REGIONS = ['eu-west-1', 'us-east-1', 'us-west-2']
+
+
+def reservations(region, count):
+    return {'Reservations': [{'Instances': [
+        {'InstanceId': f'i-{region}-{i}', 'InstanceType': 'p3.2xlarge',
+         'State': {'Name': 'running'},
+         'Tags': [{'Key': 'Name', 'Value': f'{region}-{i}'}]}
+        for i in range(count)
+    ]}]}
+
+
+@pytest.fixture
+def regional(config, ec2):
+    """Stubbers of the EC2 clients of all regions, the default region
+    client is shared with the `ec2` fixture."""
+    stubbers = {'us-east-1': ec2}
+    for region in REGIONS:
+        if region not in stubbers:
+            stubbers[region] = Stubber(boto.client('ec2', config, region))
+            stubbers[region].activate()
+    yield stubbers
+    for region, stubber in stubbers.items():
+        if region != 'us-east-1':
+            stubber.assert_no_pending_responses()
+            stubber.deactivate()
+
+
+def test_threads_backend(config, regional):
+    for i, region in enumerate(REGIONS):
+        regional[region].add_response('describe_instances',
+                                      reservations(region, i),
+                                      {'MaxResults': 50})
+    items = describe.regional_items(config, 'instance', REGIONS, 50,
+                                    backend='threads')
+    assert {region: len(i) for region, i in items.items()} == {
+        'eu-west-1': 0, 'us-east-1': 1, 'us-west-2': 2
+    }
+
+
+def test_all_regions_listing(config, regional, capsys):
+    regional['us-east-1'].add_response('describe_regions', {'Regions': [
+        {'RegionName': region} for region in reversed(REGIONS)
+    ]})
+    for region in REGIONS:
+        regional[region].add_response('describe_instances',
+                                      reservations(region, 1),
+                                      {'MaxResults': 100})
+    # Without aiobotocore the threads backend is used
+    with mock.patch.dict(sys.modules, {'aiobotocore': None}):
+        instances(config, output='jsonl', all_regions=True)
+    rows = capsys.readouterr().out.splitlines()
+    assert [row.split('"')[3] for row in rows] == REGIONS
+
+
+# Region to the latency of every page of the fake async clients
+LATENCY = {'eu-west-1': 0.2, 'us-east-1': 0.05, 'us-west-2': 0.1}
+sleep = asyncio.sleep
+
+
+class AsyncClient(object):
+    """aiobotocore client stand-in. Every page takes the region latency and
+    the before-send handlers are awaited before every page, like
+    aiobotocore does."""
+
+    def __init__(self, fake, region_name, **kwargs):
+        self.fake = fake
+        self.region = region_name
+        self.kwargs = kwargs
+        self.handlers = []
+        self.meta = mock.Mock()
+        self.meta.service_model.service_id.hyphenize.return_value = 'ec2'
+        self.meta.events.register.side_effect = (
+            lambda event, handler: self.handlers.append((event, handler))
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def can_paginate(self, operation):
+        return True
+
+    def get_paginator(self, operation):
+        return mock.Mock(paginate=lambda **kwargs: self.pages(kwargs))
+
+    async def pages(self, kwargs):
+        for page in range(2):
+            for event, handler in self.handlers:
+                await handler(event_name=f'{event}.DescribeInstances')
+            self.fake.in_flight += 1
+            self.fake.peak = max(self.fake.peak, self.fake.in_flight)
+            await sleep(LATENCY[self.region])
+            self.fake.in_flight -= 1
+            yield reservations(f'{self.region}-{page}', 1)
+
+
+@pytest.fixture
+def aiobotocore():
+    """Fake aiobotocore modules."""
+    fake = types.SimpleNamespace(clients=[], in_flight=0, peak=0)
+
+    def create_client(service, **kwargs):
+        fake.clients.append(AsyncClient(fake, **kwargs))
+        return fake.clients[-1]
+
+    modules = {
+        'aiobotocore': types.ModuleType('aiobotocore'),
+        'aiobotocore.session': types.ModuleType('aiobotocore.session'),
+        'aiobotocore.config': types.ModuleType('aiobotocore.config'),
+    }
+    modules['aiobotocore.session'].get_session = lambda: mock.Mock(
+        create_client=create_client
+    )
+    modules['aiobotocore.config'].AioConfig = mock.Mock(
+        side_effect=lambda **kwargs: kwargs
+    )
+    with mock.patch.dict(sys.modules, modules):
+        yield fake
+
+
+def test_async_backend(config, aiobotocore):
+    config.endpoint_url = 'http://localhost:5000'
+    start = time.monotonic()
+    items = describe.regional_items(config, 'instance', REGIONS, 50)
+    elapsed = time.monotonic() - start
+    # Results are in the order of the regions, not of completion
+    assert list(items) == REGIONS
+    assert {region: [i['InstanceId'] for i in region_items]
+            for region, region_items in items.items()} == {
+        region: [f'i-{region}-0-0', f'i-{region}-1-0'] for region in REGIONS
+    }
+    # All regions were fetched at the same time, two pages of the slowest
+    # region take 0.4s, one after another all pages would take 0.7s
+    assert aiobotocore.peak == 3
+    assert elapsed < 0.6
+    client = aiobotocore.clients[0]
+    assert client.kwargs['endpoint_url'] == 'http://localhost:5000'
+    assert client.kwargs['aws_access_key_id'] == 'testing'
+    assert client.kwargs['config'] == {
+        'retries': {'mode': 'standard', 'max_attempts': 1}
+    }
+
+
+def test_async_rate_limit(config, aiobotocore):
+    config.rate_limits = 'describe=5/1'
+    waits = []
+
+    async def throttle(seconds):
+        waits.append(seconds)
+
+    with mock.patch.object(boto.asyncio, 'sleep', side_effect=throttle):
+        describe.regional_items(config, 'instance', ['us-east-1'])
+    # The first page takes the only token, the second one waits for it to
+    # be refilled, at most 0.2s, without blocking the event loop
+    assert len(waits) == 1
+    assert 0 < waits[0] <= 0.2
+    boto._buckets.clear()
@@ -0,0 +1,129 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import pytest
+import threading
+from botocore.stub import Stubber
+from click.testing import CliRunner
+from datetime import datetime, timedelta, timezone
+from aws_ml_helper import boto, describe, spot
+from aws_ml_helper.commands import cli
+from aws_ml_helper.spot import Volume
+
+
+def tags(name):
+    return [{'Key': 'Name', 'Value': name}]
+
+
+def test_default_plan(config):
+    assert spot._volume_plan(config, ['w-0', 'w-1'], [], None, '/data') == {
+        'w-0': [Volume('w-0', '/data', None)],
+        'w-1': [Volume('w-1', '/data', None)],
+    }
+    config.mount_point = ''
+    assert spot._volume_plan(config, ['w-0'], [], None, None) == {}
+
+
+def test_fleet_plan(config):
+    plan = spot._volume_plan(config, ['w-0', 'w-1'], [
+        Volume('data-{i}', '/data', None),
+        Volume('shared', '/shared', 'base'),
+    ], 'default', None)
+    assert plan == {
+        'w-0': [Volume('data-0', '/data', 'default'),
+                Volume('shared-0', '/shared', 'base')],
+        'w-1': [Volume('data-1', '/data', 'default'),
+                Volume('shared-1', '/shared', 'base')],
+    }
+
+
+def test_sources_and_creation(config, ec2):
+    plan = spot._volume_plan(config, ['w-0', 'w-1'],
+                             [Volume('data-{i}', '/data', 'base')], None,
+                             None)
+    existing = {
+        'data-0': describe.hydrate(config, 'volume', {
+            'VolumeId': 'vol-0', 'AvailabilityZone': 'us-east-1a',
+            'State': 'available', 'Tags': tags('data-0')
+        }),
+        'data-1': None,
+    }
+    # One snapshot lookup for all missing volumes
+    ec2.add_response('describe_snapshots', {'Snapshots': [{
+        'SnapshotId': 'snap-1', 'VolumeSize': 64, 'Tags': tags('base')
+    }]}, {'Filters': [{'Name': 'tag:Name', 'Values': ['base']}]})
+    sources = spot._volume_sources(config, plan, existing, 'us-east-1a')
+    assert {name: s.id for name, s in sources.items()} == {'data-1': 'snap-1'}
+
+    ec2.add_response('create_volume', {'VolumeId': 'vol-1'}, {
+        'AvailabilityZone': 'us-east-1a', 'Size': 64, 'SnapshotId': 'snap-1',
+        'VolumeType': 'gp2', 'TagSpecifications': [
+            {'ResourceType': 'volume', 'Tags': tags('data-1')}
+        ]
+    })
+    assert spot._create_volumes(config, sources, 'us-east-1a') == {
+        'data-1': 'vol-1'
+    }
+
+
+def test_volume_in_other_zone(config):
+    plan = {'w-0': [Volume('data', '/data', None)]}
+    existing = {'data': describe.hydrate(config, 'volume', {
+        'VolumeId': 'vol-0', 'AvailabilityZone': 'us-east-1b',
+        'State': 'available', 'Tags': tags('data')
+    })}
+    assert spot._volume_sources(config, plan, existing, 'us-east-1a') is None
+
+
+def history(price, zone):
+    return {'SpotPriceHistory': [{
+        'AvailabilityZone': zone, 'InstanceType': 'p3.2xlarge',
+        'ProductDescription': 'Linux/UNIX', 'SpotPrice': str(price),
+        'Timestamp': datetime.now(timezone.utc) - timedelta(days=1)
+    }]}
+
+
+def test_compare_regions(config, ec2, capsys):
+    other = Stubber(boto.client('ec2', config, 'eu-west-1'))
+    ec2.add_response('describe_spot_price_history',
+                     history(1.5, 'us-east-1a'))
+    other.add_response('describe_spot_price_history',
+                       history(0.9, 'eu-west-1b'))
+    # Both regions are fetched at the same time, or the barrier times out
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fetched(**kwargs):
+        barrier.wait()
+
+    for stubber in (ec2, other):
+        stubber.client.meta.events.register(
+            'before-parameter-build.ec2.DescribeSpotPriceHistory', fetched
+        )
+    config.table_format = 'plain'
+    with other:
+        spot.spot_price(config, instance_type='p3.2xlarge', bid=1.0,
+                        regions=['us-east-1', 'eu-west-1'])
+        other.assert_no_pending_responses()
+    rows = [line.split() for line in capsys.readouterr().out.splitlines()]
+    assert rows[0][-2:] == ['under', 'bid']
+    assert rows[1:] == [
+        ['eu-west-1', 'eu-west-1b', 'Linux/UNIX', 'p3.2xlarge', '0.9000',
+         '0.9000', '0.9000', '0.1125', '100%'],
+        ['us-east-1', 'us-east-1a', 'Linux/UNIX', 'p3.2xlarge', '1.5000',
+         '1.5000', '1.5000', '0.1875', '0%'],
+    ]
+
+
+@pytest.mark.parametrize('args', [
+    ['--instance-type', 'p3.2xlarge', '--instance-type', 'p3.8xlarge',
+     '--value', 'mean'],
+    ['--region', 'us-east-1', '--region', 'eu-west-1', '--value', 'min'],
+    ['--region', 'us-east-1', '--region', 'eu-west-1',
+     '--availability-zone', 'us-east-1a'],
+])
+def test_compare_rejects_single_series_options(config_path, args):
+    result = CliRunner().invoke(cli, ['--config', config_path, 'spot-price']
+                                + args)
+    assert result.exit_code == 2
+    assert 'can only be used with a single' in result.output
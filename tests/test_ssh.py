@@ -0,0 +1,179 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import socket
+import pytest
+import collections
+from unittest import mock
+from aws_ml_helper import ssh
+from aws_ml_helper.sync import sync
+from aws_ml_helper.instance import run, cp
+
+
+@pytest.fixture
+def paramiko():
+    """Paramiko with connects, sessions and SFTP channels mocked out."""
+    channel = mock.MagicMock()
+    channel.recv_ready.return_value = False
+    channel.recv_stderr_ready.return_value = False
+    channel.exit_status_ready.return_value = True
+    channel.recv_exit_status.return_value = 0
+    transport = mock.MagicMock()
+    transport.is_active.return_value = True
+    transport.open_session.return_value = channel
+    sftp = mock.MagicMock()
+    sftp.stat.side_effect = IOError
+    ssh.pool.close_all()
+    with mock.patch('paramiko.SSHClient.connect') as connect, \
+            mock.patch('paramiko.SSHClient.get_transport',
+                       return_value=transport), \
+            mock.patch('paramiko.SFTPClient.from_transport',
+                       return_value=sftp):
+        yield connect
+    ssh.pool.close_all()
+
+
+def test_one_connect_per_host(config, ec2, paramiko, tmp_path):
+    response = {'Reservations': [{'Instances': [{
+        'InstanceId': 'i-1', 'State': {'Name': 'running'},
+        'PublicIpAddress': '10.0.0.1',
+        'Tags': [{'Key': 'Name', 'Value': 'worker'}]
+    }]}]}
+    for _ in range(3):
+        ec2.add_response('describe_instances', response)
+    local = tmp_path / 'data'
+    local.mkdir()
+    (local / 'file.txt').write_text('data')
+
+    assert run(config, 'worker', 'true', silent=True).exit_status == 0
+    cp(config, str(local / 'file.txt'), 'worker:/data/file.txt')
+    sync(config, str(local), 'worker:/data')
+
+    paramiko.assert_called_once_with('10.0.0.1', username='ubuntu',
+                                     key_filename='/tmp/test.pem',
+                                     timeout=None)
+
+
+def test_dead_transport_reconnects(config, paramiko):
+    with ssh.connect(config, '10.0.0.1') as client:
+        pass
+    with ssh.connect(config, '10.0.0.1') as other:
+        assert other is client
+    client.get_transport().is_active.return_value = False
+    with ssh.connect(config, '10.0.0.1') as other:
+        assert other is not client
+    assert paramiko.call_count == 2
+
+
+def test_leased_connections_are_not_evicted(config, paramiko):
+    clock = mock.Mock(return_value=1000.0)
+    with mock.patch.object(ssh.time, 'time', clock), \
+            mock.patch('paramiko.SSHClient.close', autospec=True) as close:
+        with ssh.connect(config, '10.0.0.1') as busy:
+            # A long command runs on the first host while another host is
+            # fetched after the idle timeout
+            clock.return_value += ssh.pool.idle_timeout + 1
+            with ssh.connect(config, '10.0.0.2'):
+                pass
+            assert close.call_count == 0
+        # Released now, idle from this moment on
+        with ssh.connect(config, '10.0.0.2'):
+            pass
+        assert close.call_count == 0
+        clock.return_value += ssh.pool.idle_timeout + 1
+        with ssh.connect(config, '10.0.0.3'):
+            pass
+        closed = {c[0][0] for c in close.call_args_list}
+        assert busy in closed and len(closed) == 2
+
+
+class Channel(object):
+    """Session channel that returns scripted `('out' | 'err', data)` chunks
+    and finishes with `exit_status` after the last one."""
+
+    def __init__(self, chunks, exit_status=0, finishes=True):
+        self.chunks = collections.deque(chunks)
+        self.exit_status = exit_status
+        self.finishes = finishes
+        self.closed = False
+
+    def exec_command(self, command):
+        self.command = command
+
+    def _ready(self, stream):
+        return len(self.chunks) > 0 and self.chunks[0][0] == stream
+
+    def recv_ready(self):
+        return self._ready('out')
+
+    def recv_stderr_ready(self):
+        return self._ready('err')
+
+    def recv(self, size):
+        return self.chunks.popleft()[1]
+
+    recv_stderr = recv
+
+    def exit_status_ready(self):
+        return self.finishes and len(self.chunks) == 0
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def close(self):
+        self.closed = True
+
+
+def execute(channel, **kwargs):
+    client = mock.Mock()
+    client.get_transport.return_value.open_session.return_value = channel
+    with mock.patch.object(ssh.select, 'select'):
+        return ssh.execute(client, 'train', **kwargs)
+
+
+def test_execute_streams_lines():
+    channel = Channel([('out', b'epoch 1\nepo'), ('err', b'warning\n'),
+                       ('out', b'ch 2\n'), ('err', b'no newline')],
+                      exit_status=3)
+    lines = []
+
+    def on(stream):
+        # Remember how many chunks the command still had to send
+        return lambda line: lines.append(
+            (stream, line, len(channel.chunks))
+        )
+
+    result = execute(channel, on_out=on('out'), on_err=on('err'))
+    assert lines == [('out', 'epoch 1', 3), ('err', 'warning', 2),
+                     ('out', 'epoch 2', 1), ('err', 'no newline', 0)]
+    assert result == ssh.Result('epoch 1\nepoch 2\n', 'warning\nno newline',
+                                3)
+    assert channel.command == 'train' and channel.closed
+
+
+def test_execute_keeps_last_lines():
+    channel = Channel([('out', b''.join(b'%d\n' % i for i in range(1000))),
+                       ('out', b'last')])
+    result = execute(channel, max_lines=3)
+    assert result.out == '998\n999\nlast'
+    assert result.exit_status == 0
+
+
+def test_execute_timeout():
+    channel = Channel([('out', b'started\n')], finishes=False)
+    clock = mock.Mock(return_value=1000.0)
+
+    def tick(*args):
+        clock.return_value += 1
+
+    with mock.patch.object(ssh.time, 'time', clock), \
+            mock.patch.object(ssh.select, 'select', side_effect=tick):
+        client = mock.Mock()
+        client.get_transport.return_value.open_session.return_value = (
+            channel
+        )
+        with pytest.raises(socket.timeout):
+            ssh.execute(client, 'sleep infinity', timeout=5)
+    assert clock.return_value == 1006.0
+    assert channel.closed
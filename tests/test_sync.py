@@ -0,0 +1,180 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import pytest
+import contextlib
+import subprocess
+from unittest import mock
+from aws_ml_helper import ssh
+from aws_ml_helper.sync import sync, remote_manifest, ManifestCache, _batches
+
+
+class Process(object):
+    """Session channel stand-in that runs the command in a local shell."""
+
+    def exec_command(self, command):
+        self.process = subprocess.Popen(
+            command, shell=True, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+
+    def makefile(self, mode):
+        return self.process.stdin if 'w' in mode else self.process.stdout
+
+    def makefile_stderr(self, mode):
+        return self.process.stderr
+
+    def sendall(self, data):
+        self.process.stdin.write(data)
+
+    def shutdown_write(self):
+        self.process.stdin.close()
+
+    def recv_exit_status(self):
+        return self.process.wait()
+
+    def close(self):
+        self.process.stdout.close()
+        self.process.stderr.close()
+
+
+class Shell(object):
+    """SSH client stand-in whose commands run locally."""
+
+    def __init__(self):
+        self.commands = []
+
+    def get_transport(self):
+        return mock.Mock(open_session=Process)
+
+    def execute(self, client, command, **kwargs):
+        self.commands.append(command)
+        result = subprocess.run(command, shell=True, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        return ssh.Result(result.stdout.decode(), result.stderr.decode(),
+                          result.returncode)
+
+
+def running(ec2, syncs):
+    """Describe responses of the running instance `worker` for `syncs`
+    syncs."""
+    response = {'Reservations': [{'Instances': [{
+        'InstanceId': 'i-1', 'State': {'Name': 'running'},
+        'PublicIpAddress': '10.0.0.1',
+        'Tags': [{'Key': 'Name', 'Value': 'worker'}]
+    }]}]}
+    for _ in range(syncs):
+        ec2.add_response('describe_instances', response)
+
+
+@pytest.fixture
+def shell(config, sftp):
+    """Connections to instances run commands in a local shell and SFTP on
+    the local file system."""
+    client = Shell()
+    with mock.patch.object(ssh, 'connect',
+                           return_value=contextlib.nullcontext(client)), \
+            mock.patch.object(ssh, 'execute', side_effect=client.execute):
+        yield client
+
+
+def tree(path, files):
+    for name, (data, mtime) in files.items():
+        path.joinpath(*name.split('/')).parent.mkdir(parents=True,
+                                                     exist_ok=True)
+        path.joinpath(*name.split('/')).write_text(data)
+        os.utime(path.joinpath(*name.split('/')), (mtime, mtime))
+    return str(path)
+
+
+def contents(path):
+    return {
+        os.path.relpath(os.path.join(root, name), path).replace(os.sep, '/'):
+            open(os.path.join(root, name)).read()
+        for root, _, names in os.walk(path) for name in names
+    }
+
+
+FILES = {'a.txt': ('a', 1000), 'sub/b.txt': ('bb', 2000),
+         'sub/deep/c.txt': ('ccc', 3000)}
+
+
+def test_remote_manifest(tmp_path):
+    path = tree(tmp_path / 'data', dict(FILES, **{'d.part': ('d', 10)}))
+    with mock.patch.object(ssh, 'execute', side_effect=Shell().execute):
+        assert remote_manifest(Shell(), path) == {
+            'a.txt': [1, 1000], 'sub/b.txt': [2, 2000],
+            'sub/deep/c.txt': [3, 3000]
+        }
+        assert remote_manifest(Shell(), str(tmp_path / 'missing')) == {}
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_upload_uses_cached_manifest(config, ec2, shell, tmp_path,
+                                     compress):
+    running(ec2, 2)
+    local = tree(tmp_path / 'local', FILES)
+    remote = str(tmp_path / 'remote')
+    stats = sync(config, local, f'worker:{remote}', compress=compress)
+    assert (stats.copied, stats.skipped) == (3, 0)
+    assert contents(remote) == contents(local)
+    assert len(shell.commands) == 1
+
+    tree(tmp_path / 'local', {'a.txt': ('changed', 4000)})
+    stats = sync(config, local, f'worker:{remote}', compress=compress)
+    assert (stats.copied, stats.skipped) == (1, 2)
+    assert contents(remote) == contents(local)
+    # The destination was not walked again
+    assert len(shell.commands) == 1
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_download(config, ec2, shell, tmp_path, compress):
+    running(ec2, 2)
+    remote = tree(tmp_path / 'remote', FILES)
+    local = str(tmp_path / 'local')
+    stats = sync(config, f'worker:{remote}', local, compress=compress)
+    assert (stats.copied, stats.skipped) == (3, 0)
+    assert contents(local) == contents(remote)
+    stats = sync(config, f'worker:{remote}', local, compress=compress)
+    assert (stats.copied, stats.skipped) == (0, 3)
+
+
+def test_remote_changes(config, ec2, shell, tmp_path):
+    running(ec2, 4)
+    local = tree(tmp_path / 'local', FILES)
+    remote = str(tmp_path / 'remote')
+    sync(config, local, f'worker:{remote}')
+    os.remove(os.path.join(remote, 'a.txt'))
+
+    # Deleted outside of aml sync, the cached manifest doesn't know
+    assert sync(config, local, f'worker:{remote}').copied == 0
+    assert sync(config, local, f'worker:{remote}', full=True).copied == 1
+    os.remove(os.path.join(remote, 'a.txt'))
+
+    # The cached manifest is used only for sync_cache_ttl seconds
+    config.sync_cache_ttl = '60'
+    path = ManifestCache(config, 'i-1', local, remote).path
+    os.utime(path, (os.path.getmtime(path) - 61,) * 2)
+    assert sync(config, local, f'worker:{remote}').copied == 1
+
+
+def test_stopped_instance(config, ec2, capsys):
+    ec2.add_response('describe_instances', {'Reservations': [{
+        'Instances': [{'InstanceId': 'i-1', 'State': {'Name': 'stopped'},
+                       'Tags': [{'Key': 'Name', 'Value': 'worker'}]}]
+    }]})
+    with mock.patch.object(ssh, 'connect') as connect:
+        assert sync(config, '/data', 'worker:/data') is None
+    connect.assert_not_called()
+    assert 'Instance "worker": instance is stopped' in capsys.readouterr().out
+
+
+def test_batches():
+    manifest = {'a': [100, 0], 'b': [60, 0], 'c': [50, 0], 'd': [10, 0]}
+    batches = _batches(list(manifest), manifest, 2)
+    # The largest files first, each to the smallest batch
+    assert batches == [['a', 'd'], ['b', 'c']]
+    assert _batches(['a'], manifest, 4) == [['a']]
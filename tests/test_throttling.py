@@ -0,0 +1,109 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import pytest
+from unittest import mock
+from botocore.awsrequest import AWSResponse
+from botocore.exceptions import ClientError
+from aws_ml_helper import boto, tracing
+
+
+THROTTLED = b'''<Response><Errors><Error><Code>{code}</Code>
+<Message>Rate exceeded</Message></Error></Errors>
+<RequestID>1</RequestID></Response>'''
+
+REGIONS = b'''<DescribeRegionsResponse>
+<requestId>1</requestId><regionInfo><item>
+<regionName>us-east-1</regionName></item></regionInfo>
+</DescribeRegionsResponse>'''
+
+
+class Raw(object):
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+class Endpoint(object):
+    """Stubbed endpoint that throttles the first requests."""
+
+    def __init__(self, throttled, code='RequestLimitExceeded'):
+        self.throttled = throttled
+        self.code = code
+        self.requests = 0
+
+    def __call__(self, request, **kwargs):
+        self.requests += 1
+        if self.requests <= self.throttled:
+            body = THROTTLED.replace(b'{code}', self.code.encode())
+            return AWSResponse(request.url, 503, {}, Raw(body))
+        return AWSResponse(request.url, 200, {}, Raw(REGIONS))
+
+
+@pytest.fixture
+def throttled(config):
+    """Build a client with retries and a 20 per second describe limit
+    without burst. Time stands still and nothing really waits, so the
+    limiter delays are exact."""
+    config.retry_mode = 'standard'
+    config.max_attempts = '4'
+    config.rate_limits = 'describe=20/1'
+    waits = []
+
+    def endpoint(*args, **kwargs):
+        e = Endpoint(*args, **kwargs)
+        c = boto.client('ec2', config)
+        c.meta.events.register('before-send.ec2', e)
+        return c, e, waits
+
+    clock = mock.Mock(monotonic=mock.Mock(return_value=0.0))
+    with mock.patch.object(boto, 'time', clock), \
+            mock.patch.object(tracing, 'sleep',
+                              side_effect=lambda s, name: waits.append(s)), \
+            mock.patch('botocore.retries.standard.ExponentialBackoff.'
+                       'delay_amount', return_value=0):
+        yield endpoint
+    boto._buckets.clear()
+
+
+@pytest.mark.parametrize('code', ['RequestLimitExceeded', 'Throttling'])
+def test_retries_are_paced(throttled, code):
+    c, endpoint, waits = throttled(3, code)
+    response = c.describe_regions()
+    assert response['ResponseMetadata']['RetryAttempts'] == 3
+    assert endpoint.requests == 4
+    # Every attempt took a token, the first one from the burst
+    assert waits == pytest.approx([0.05, 0.10, 0.15])
+
+
+def test_retries_give_up(throttled):
+    c, endpoint, waits = throttled(10)
+    with pytest.raises(ClientError, match='RequestLimitExceeded'):
+        c.describe_regions()
+    # botocore's max_attempts counts the retries after the first request
+    assert endpoint.requests == 5
+    assert len(waits) == 4
+
+
+def test_unlimited_families_are_not_paced(throttled):
+    c, endpoint, waits = throttled(0)
+    for _ in range(3):
+        c.create_tags(Resources=['i-1'], Tags=[])
+    assert waits == []
+
+
+def test_client_config(config):
+    config.retry_mode = 'adaptive'
+    config.max_attempts = '10'
+    assert boto.client_config(config).retries == {
+        'mode': 'adaptive', 'max_attempts': 10
+    }
+    # Cleared values fall back to the configuration defaults
+    config.retry_mode = ''
+    config.max_attempts = ''
+    assert boto.client_config(config).retries == {
+        'mode': 'adaptive', 'max_attempts': 10
+    }
@@ -0,0 +1,65 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import io
+import json
+import pytest
+from unittest import mock
+from botocore.stub import Stubber
+from botocore.exceptions import ClientError
+from aws_ml_helper import boto, tracing
+
+
+@pytest.fixture
+def tracer():
+    """Enabled tracer, disabled again after the test."""
+    yield tracing.enable()
+    tracing._tracer = None
+
+
+def test_histogram_bounds(tracer):
+    # Bucket upper bounds are exclusive, a call of exactly 10ms isn't <10ms
+    for seconds in [0.005, 0.010, 0.0249, 0.025, 5.0]:
+        tracer.call('ec2', 'DescribeRegions', seconds)
+    histogram = tracer.summary()['histogram']
+    assert histogram['<10ms'] == 1
+    assert histogram['<25ms'] == 2
+    assert histogram['<50ms'] == 1
+    assert histogram['>=5000ms'] == 1
+    assert sum(histogram.values()) == 5
+
+
+def test_client_calls(config, tracer, tmp_path):
+    c = boto.client('ec2', config)
+    with Stubber(c) as stubber:
+        stubber.add_response('describe_regions', {'Regions': []})
+        stubber.add_response('describe_regions', {'Regions': []})
+        stubber.add_client_error('describe_regions', 'UnauthorizedOperation')
+        c.describe_regions()
+        c.describe_regions()
+        with pytest.raises(ClientError):
+            c.describe_regions()
+
+    path = str(tmp_path / 'trace.json')
+    with mock.patch.object(tracing.click, 'echo') as echo:
+        tracer.report(path)
+    assert 'Trace: 3 API calls' in echo.call_args_list[0][0][0]
+    with io.open(path, encoding='utf-8') as f:
+        summary = json.load(f)
+    operation, = summary['operations']
+    assert operation['service'] == 'ec2'
+    assert operation['operation'] == 'DescribeRegions'
+    assert operation['calls'] == 3
+    assert operation['errors'] == 1
+    assert sum(summary['histogram'].values()) == 3
+
+
+def test_disabled(config):
+    assert tracing.tracer() is None
+    with mock.patch.object(tracing.time, 'sleep') as sleep:
+        tracing.sleep(1.5)
+    sleep.assert_called_once_with(1.5)
+    with tracing.timed('ssh.connect') as transferred:
+        transferred.append(10)
+    assert tracing.tracer() is None
@@ -0,0 +1,51 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import os
+import pytest
+from unittest import mock
+from aws_ml_helper import transfer
+
+
+def source(tmp_path, data, mtime):
+    path = tmp_path / 'source.bin'
+    path.write_bytes(data)
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def part(path, destination, data):
+    st = os.stat(path)
+    with open(transfer._part(transfer.File(path, destination, st.st_size,
+                                           st.st_mtime)), 'wb') as f:
+        f.write(data)
+
+
+@pytest.mark.parametrize('copy', [transfer.upload, transfer.download])
+def test_resume(tmp_path, sftp, copy):
+    path = source(tmp_path, b'0123456789', 1000)
+    destination = str(tmp_path / 'destination.bin')
+    part(path, destination, b'01234')
+
+    stats = copy(mock.Mock(), path, destination)
+
+    assert (stats.resumed, stats.bytes) == (1, 5)
+    with open(destination, 'rb') as f:
+        assert f.read() == b'0123456789'
+
+
+@pytest.mark.parametrize('copy', [transfer.upload, transfer.download])
+def test_stale_part_is_not_resumed(tmp_path, sftp, copy):
+    path = source(tmp_path, b'old-version', 1000)
+    destination = str(tmp_path / 'destination.bin')
+    part(path, destination, b'old-')
+    # The source changes before the transfer is resumed
+    source(tmp_path, b'new-version', 2000)
+
+    stats = copy(mock.Mock(), path, destination)
+
+    assert (stats.copied, stats.resumed) == (1, 0)
+    with open(destination, 'rb') as f:
+        assert f.read() == b'new-version'
+    assert os.stat(destination).st_mtime == 2000
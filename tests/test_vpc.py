@@ -0,0 +1,211 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import time
+from unittest import mock
+from botocore.stub import Stubber
+from aws_ml_helper import boto, dag
+from aws_ml_helper.dag import Step
+from aws_ml_helper.journal import Journal
+from aws_ml_helper.vpc import create_vpc, setup_vpc
+
+
+def stub_network(ec2, key_pair=False):
+    """Queue the EC2 responses of the network steps in the order a single
+    worker runs them."""
+    ec2.add_response('create_internet_gateway', {
+        'InternetGateway': {'InternetGatewayId': 'igw-1'}
+    })
+    if key_pair:
+        ec2.add_response('create_key_pair', {
+            'KeyName': 'access-key-test', 'KeyFingerprint': 'ff',
+            'KeyMaterial': 'KEY'
+        }, {'KeyName': 'access-key-test'})
+    ec2.add_response('create_vpc', {'Vpc': {'VpcId': 'vpc-1'}})
+    ec2.add_response('describe_vpcs', {
+        'Vpcs': [{'VpcId': 'vpc-1', 'State': 'available'}]
+    }, {'VpcIds': ['vpc-1']})
+    # Steps that only need the VPC
+    ec2.add_response('attach_internet_gateway', {}, {
+        'VpcId': 'vpc-1', 'InternetGatewayId': 'igw-1'
+    })
+    ec2.add_response('create_security_group', {'GroupId': 'sg-0c0c0c0c'})
+    ec2.add_response('authorize_security_group_ingress', {})
+    ec2.add_response('create_route_table', {
+        'RouteTable': {'RouteTableId': 'rtb-1'}
+    })
+    ec2.add_response('create_subnet', {
+        'Subnet': {'SubnetId': 'subnet-12345678'}
+    })
+    ec2.add_response('describe_subnets', {
+        'Subnets': [{'SubnetId': 'subnet-12345678', 'State': 'available'}]
+    }, {'SubnetIds': ['subnet-12345678']})
+    ec2.add_response('modify_vpc_attribute', {})
+    ec2.add_response('modify_vpc_attribute', {})
+    # Steps that need the route table, subnet and instance security group
+    ec2.add_response('associate_route_table', {
+        'AssociationId': 'rtbassoc-1'
+    }, {'RouteTableId': 'rtb-1', 'SubnetId': 'subnet-12345678'})
+    ec2.add_response('create_security_group', {'GroupId': 'sg-0e0f0e0f'})
+    ec2.add_response('authorize_security_group_ingress', {}, {
+        'GroupId': 'sg-0e0f0e0f',
+        'IpPermissions': [{
+            'FromPort': 2049, 'IpProtocol': 'tcp', 'ToPort': 2049,
+            'UserIdGroupPairs': [{'GroupId': 'sg-0c0c0c0c'}]
+        }]
+    })
+    ec2.add_response('create_route', {'Return': True}, {
+        'RouteTableId': 'rtb-1', 'GatewayId': 'igw-1',
+        'DestinationCidrBlock': '0.0.0.0/0'
+    })
+
+
+def test_dag_order():
+    order = []
+
+    def step(name):
+        return lambda **kwargs: order.append(name) or name
+
+    steps = {
+        'c': Step(step('c'), ['a', 'b']),
+        'b': Step(step('b'), ['a']),
+        'a': Step(step('a'), []),
+        'd': Step(step('d'), []),
+    }
+    assert dag.run(steps, workers=1) == {n: n for n in 'abcd'}
+    assert order == ['a', 'd', 'b', 'c']
+    assert sorted(dag.run(steps, workers=4)) == ['a', 'b', 'c', 'd']
+
+
+def test_create_vpc(config, ec2):
+    stub_network(ec2)
+    vpc = create_vpc(config, 'test', workers=1)
+    assert vpc == {
+        'vpc_id': 'vpc-1',
+        'vpc_name': 'test',
+        'subnet': 'subnet-12345678',
+        'ec2_security_group': 'sg-0c0c0c0c',
+        'efs_security_group': 'sg-0e0f0e0f'
+    }
+    journal = Journal(config, 'vpc', 'test')
+    assert journal.get('associate_route_table') == 'rtbassoc-1'
+    assert journal.resource('gateway') == 'igw-1'
+
+
+def test_create_vpc_resumes(config, ec2):
+    stub_network(ec2)
+    create_vpc(config, 'test', workers=1)
+    # Every recorded resource is checked once, nothing is created again
+    for method, key, resource_id in [
+            ('describe_internet_gateways', 'InternetGateways', 'igw-1'),
+            ('describe_vpcs', 'Vpcs', 'vpc-1'),
+            ('describe_security_groups', 'SecurityGroups', 'sg-0c0c0c0c'),
+            ('describe_route_tables', 'RouteTables', 'rtb-1'),
+            ('describe_subnets', 'Subnets', 'subnet-12345678'),
+            ('describe_security_groups', 'SecurityGroups', 'sg-0e0f0e0f')]:
+        ec2.add_response(method, {key: [{}]})
+    create_vpc(config, 'test', workers=1)
+
+
+def test_setup_vpc_from_scratch(config, ec2, tmp_path):
+    assert not Journal(config, 'vpc', 'test')
+    stub_network(ec2, key_pair=True)
+    with Stubber(boto.client('efs', config)) as efs:
+        efs.add_response('create_file_system', {
+            'FileSystemId': 'fs-12345678', 'OwnerId': '123456789012',
+            'CreationToken': 'test-efs', 'CreationTime': 0,
+            'LifeCycleState': 'creating', 'NumberOfMountTargets': 0,
+            'SizeInBytes': {'Value': 0}, 'PerformanceMode': 'generalPurpose',
+            'Tags': []
+        }, {'CreationToken': 'test-efs',
+            'Tags': [{'Key': 'Name', 'Value': 'test-efs'}]})
+        efs.add_response('describe_file_systems', {'FileSystems': [{
+            'FileSystemId': 'fs-12345678', 'OwnerId': '123456789012',
+            'CreationToken': 'test-efs', 'CreationTime': 0,
+            'LifeCycleState': 'available', 'NumberOfMountTargets': 0,
+            'SizeInBytes': {'Value': 0}, 'PerformanceMode': 'generalPurpose',
+            'Tags': []
+        }]}, {'FileSystemId': 'fs-12345678'})
+        efs.add_response('create_mount_target', {
+            'MountTargetId': 'fsmt-12345678', 'FileSystemId': 'fs-12345678',
+            'SubnetId': 'subnet-12345678', 'LifeCycleState': 'creating'
+        }, {'FileSystemId': 'fs-12345678', 'SubnetId': 'subnet-12345678',
+            'SecurityGroups': ['sg-0e0f0e0f']})
+        setup_vpc(config, 'test', key_dir=str(tmp_path / 'keys'), workers=1)
+        efs.assert_no_pending_responses()
+
+    assert config.efs_id == 'fs-12345678'
+    assert config.access_key == str(tmp_path / 'keys' / 'access-key-test.pem')
+    with open(config.access_key) as f:
+        assert f.read() == 'KEY'
+    assert Journal(config, 'vpc', 'test').done('mount_target')
+
+
+class SlowClient(object):
+    """Client stand-in that answers every call after `latency` seconds, in
+    any order, and records when the calls were made."""
+
+    RESPONSES = {
+        'create_internet_gateway': {
+            'InternetGateway': {'InternetGatewayId': 'igw-1'}
+        },
+        'create_key_pair': {'KeyMaterial': 'KEY'},
+        'create_vpc': {'Vpc': {'VpcId': 'vpc-1'}},
+        'describe_vpcs': {'Vpcs': [{'State': 'available'}]},
+        'create_security_group': {'GroupId': 'sg-1'},
+        'create_route_table': {'RouteTable': {'RouteTableId': 'rtb-1'}},
+        'create_subnet': {'Subnet': {'SubnetId': 'subnet-1'}},
+        'describe_subnets': {'Subnets': [{'State': 'available'}]},
+        'associate_route_table': {'AssociationId': 'rtbassoc-1'},
+        'create_file_system': {'FileSystemId': 'fs-1'},
+        'describe_file_systems': {
+            'FileSystems': [{'LifeCycleState': 'available'}]
+        },
+    }
+
+    def __init__(self, latency, calls):
+        self.latency = latency
+        self.calls = calls
+
+    def __getattr__(self, name):
+        def call(**kwargs):
+            start = time.monotonic()
+            time.sleep(self.latency)
+            self.calls.append((start, time.monotonic()))
+            return self.RESPONSES.get(name, {})
+        return call
+
+
+def concurrency(calls):
+    """Returns the maximal number of calls in flight at the same time."""
+    events = sorted([(start, 1) for start, _ in calls] +
+                    [(end, -1) for _, end in calls])
+    current = peak = 0
+    for _, change in events:
+        current += change
+        peak = max(peak, current)
+    return peak
+
+
+def test_setup_vpc_in_parallel(config, tmp_path):
+    def setup(name, workers):
+        calls = []
+        clients = {'ec2': SlowClient(0.05, calls),
+                   'efs': SlowClient(0.05, calls)}
+        with mock.patch.object(boto, 'client',
+                               side_effect=lambda s, c, *a: clients[s]):
+            start = time.monotonic()
+            setup_vpc(config, name, key_dir=str(tmp_path / name),
+                      workers=workers)
+            return time.monotonic() - start, calls
+
+    serial, serial_calls = setup('serial', 1)
+    parallel, parallel_calls = setup('parallel', 8)
+    assert len(parallel_calls) == len(serial_calls)
+    assert concurrency(serial_calls) == 1
+    assert concurrency(parallel_calls) > 1
+    # Only the longest chain of dependent calls is waited on: create and
+    # wait for the VPC, create the instance and EFS security groups with
+    # their rules and create the mount target
+    assert parallel < 12 * 0.05 < serial
@@ -0,0 +1,183 @@
+__author__ = 'Viktor Kerkez <alefnula@gmail.com>'
+__date__ = '17 October 2026'
+__copyright__ = 'Copyright (c) 2026 Viktor Kerkez'
+
+import random
+import pytest
+from unittest import mock
+from botocore.exceptions import ClientError
+from aws_ml_helper import tracing, wait
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with mock.patch.object(tracing, 'sleep') as sleep:
+        yield sleep
+
+
+@pytest.fixture
+def clock(no_sleep):
+    """Monotonic clock that only moves when the waits sleep."""
+    clock = mock.Mock(monotonic=mock.Mock(return_value=100.0))
+
+    def sleep(seconds, name='wait'):
+        clock.monotonic.return_value += seconds
+
+    no_sleep.side_effect = sleep
+    with mock.patch.object(wait, 'time', clock):
+        yield clock
+
+
+def error(code):
+    return ClientError({'Error': {'Code': code}}, 'DescribeVolumes')
+
+
+def states(*values):
+    """Returns a fetch function that returns or raises the values in
+    order."""
+    values = list(values)
+
+    def fetch():
+        value = values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return fetch
+
+
+def slept(no_sleep):
+    return [c[0][0] for c in no_sleep.call_args_list]
+
+
+def volumes(**states):
+    return {'Volumes': [{'VolumeId': volume_id, 'State': state}
+                        for volume_id, state in states.items()]}
+
+
+def expect(ec2, response, *ids):
+    ec2.add_response('describe_volumes', response, {
+        'Filters': [{'Name': 'volume-id', 'Values': list(ids)}]
+    })
+
+
+def test_one_call_per_tick(config, ec2, no_sleep):
+    ids = ['vol-1', 'vol-2', 'vol-3']
+    # vol-3 is not visible yet in the first response
+    expect(ec2, volumes(**{'vol-1': 'available', 'vol-2': 'creating'}), *ids)
+    expect(ec2, volumes(**{'vol-2': 'creating', 'vol-3': 'available'}),
+           'vol-2', 'vol-3')
+    expect(ec2, volumes(**{'vol-2': 'available'}), 'vol-2')
+
+    ready = [resource_id for resource_id, _ in wait.each(
+        config, 'volume', ids, {'available'}
+    )]
+
+    assert ready == ['vol-1', 'vol-3', 'vol-2']
+    assert no_sleep.call_count == 2
+
+
+def test_failures_are_raised_last(config, ec2):
+    expect(ec2, volumes(**{'vol-1': 'error', 'vol-2': 'creating'}),
+           'vol-1', 'vol-2')
+    expect(ec2, volumes(**{'vol-2': 'available'}), 'vol-2')
+
+    with pytest.raises(wait.WaitError, match='vol-1 is in state "error"'):
+        wait.all_ready(config, 'volume', ['vol-1', 'vol-2'], {'available'},
+                       failed={'error'})
+
+
+def test_snapshots_of_the_account(config, ec2):
+    # Without the owner every tick would scan all public snapshots
+    ec2.add_response('describe_snapshots', {'Snapshots': [
+        {'SnapshotId': 'snap-1', 'State': 'pending'}
+    ]}, {'Filters': [{'Name': 'snapshot-id', 'Values': ['snap-1']}],
+         'OwnerIds': ['123456789012']})
+    ec2.add_response('describe_snapshots', {'Snapshots': [
+        {'SnapshotId': 'snap-1', 'State': 'completed'}
+    ]}, {'Filters': [{'Name': 'snapshot-id', 'Values': ['snap-1']}],
+         'OwnerIds': ['123456789012']})
+    assert list(wait.all_ready(config, 'snapshot', ['snap-1'],
+                               {'completed'})) == ['snap-1']
+
+
+def test_images_of_the_account(config, ec2):
+    ec2.add_response('describe_images', {'Images': [
+        {'ImageId': 'ami-12345678', 'State': 'available'}
+    ]}, {'Filters': [{'Name': 'image-id', 'Values': ['ami-12345678']}],
+         'Owners': ['123456789012']})
+    assert list(wait.all_ready(config, 'image', ['ami-12345678'],
+                               {'available'})) == ['ami-12345678']
+
+
+def test_timeout(config, ec2):
+    expect(ec2, volumes(**{'vol-1': 'creating'}), 'vol-1')
+    with pytest.raises(wait.WaitTimeout):
+        wait.all_ready(config, 'volume', ['vol-1'], {'available'},
+                       timeout=0)
+
+
+def test_delays():
+    random.seed(15)
+    nominal = [1.0, 1.5, 2.25, 3.375, 5.0625, 7.59375, 10.0, 10.0]
+    for d, delay in zip(nominal, wait.delays(max_delay=10, jitter=0.25)):
+        assert d * 0.75 <= delay <= d * 1.25
+    assert list(zip(range(3), wait.delays(jitter=0))) == [
+        (0, 1.0), (1, 1.5), (2, 2.25)
+    ]
+
+
+def test_until(clock, no_sleep):
+    progress = mock.Mock()
+    # Missing resources are not visible yet
+    state = wait.until(
+        states(error('InvalidVolume.NotFound'), 'creating', 'available'),
+        {'available'}, progress=progress, jitter=0
+    )
+    assert state == 'available'
+    assert slept(no_sleep) == [1.0, 1.5]
+    assert progress.call_args_list == [
+        mock.call(None, 0.0), mock.call('creating', 1.0),
+        mock.call('available', 2.5)
+    ]
+
+
+def test_until_failures(clock):
+    with pytest.raises(wait.WaitError, match='volume is in state "error"'):
+        wait.until(states('creating', 'error'), {'available'},
+                   failed={'error'}, description='volume')
+    with pytest.raises(ClientError):
+        wait.until(states(error('UnauthorizedOperation')), {'available'})
+
+
+def test_until_timeout(clock, no_sleep):
+    with pytest.raises(wait.WaitTimeout,
+                       match=r'not ready after 10s \(state "creating"\)'):
+        wait.until(states(*['creating'] * 10), {'available'}, timeout=10,
+                   delay=4, factor=1, jitter=0)
+    # The last delay is cut to the remaining time
+    assert slept(no_sleep) == [4, 4, 2]
+
+
+def test_retry(clock, no_sleep):
+    func = mock.Mock(side_effect=[error('InvalidVolume.NotFound'),
+                                  error('InvalidInstanceID.NotFound'), 'ok'])
+    assert wait.retry(func, 1, key='value') == 'ok'
+    assert func.call_args_list == [mock.call(1, key='value')] * 3
+    assert len(slept(no_sleep)) == 2
+
+
+def test_retry_other_errors(clock):
+    func = mock.Mock(side_effect=error('UnauthorizedOperation'))
+    with pytest.raises(ClientError):
+        wait.retry(func)
+    assert func.call_count == 1
+    func = mock.Mock(side_effect=[error('IncorrectState'), 'ok'])
+    assert wait.retry(func, errors=('IncorrectState',)) == 'ok'
+
+
+def test_retry_timeout(clock):
+    func = mock.Mock(side_effect=error('InvalidVolume.NotFound'))
+    with pytest.raises(ClientError):
+        wait.retry(func, timeout=10)
+    assert clock.monotonic.return_value - 100.0 <= 10
+    assert func.call_count > 2